@@ -0,0 +1,512 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+import pytest
+import rsa
+from jose import jwt
+
+# noinspection PyUnresolvedReferences
+from api._tests.fixtures import test_client
+from api.entities.film import Film
+from api.handlers import film_v1
+from api.handlers.film_v1 import authenticate_jwt, film_repository
+from api.repository.film.memory import MemoryFilmRepository
+
+
+@pytest.fixture()
+def memory_repo(test_client):
+    repo = MemoryFilmRepository()
+    test_client.app.dependency_overrides[film_repository] = lambda: repo
+    test_client.app.dependency_overrides[authenticate_jwt] = lambda: None
+    return repo
+
+
+async def seed(repo, count, title="My Film", prefix="my-id"):
+    for i in range(count):
+        await repo.create(
+            Film(
+                film_id=f"{prefix}-{i}",
+                title=title,
+                description="My description",
+                release_year=1990 + i,
+            )
+        )
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_json_array(test_client, memory_repo):
+    response = test_client.post(
+        "/api/v1/films/bulk",
+        json=[
+            {"title": "My Film", "description": "My description", "release_year": 1990},
+            {"title": "Bad", "description": "My description", "release_year": 1990},
+            {"title": "My Film", "description": "My description", "release_year": 2000},
+        ],
+    )
+    assert response.status_code == 201
+    body = response.json()
+    assert body["ids"][1] is None
+    assert [error["index"] for error in body["errors"]] == [1]
+    assert "title" in body["errors"][0]["message"]
+    films = await memory_repo.get_by_title("My Film")
+    assert sorted(film.id for film in films) == sorted([body["ids"][0], body["ids"][2]])
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_ndjson(test_client, memory_repo):
+    lines = [
+        orjson.dumps(
+            {"title": "My Film", "description": "My description", "release_year": 1990}
+        ),
+        b"{not json",
+        b"",
+        orjson.dumps(
+            {"title": "My Film", "description": "My description", "release_year": 1800}
+        ),
+    ]
+    response = test_client.post(
+        "/api/v1/films/bulk",
+        content=b"\n".join(lines),
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 201
+    body = response.json()
+    assert len(body["ids"]) == 3
+    assert body["ids"][0] is not None
+    assert [error["index"] for error in body["errors"]] == [1, 2]
+    assert len(await memory_repo.get_by_title("My Film")) == 1
+
+
+def test_bulk_create_invalid_body(test_client, memory_repo):
+    response = test_client.post("/api/v1/films/bulk", json={"title": "My Film"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_films_by_title_ndjson(test_client, memory_repo):
+    await seed(memory_repo, 3)
+    await seed(memory_repo, 1, title="Other Film", prefix="other")
+
+    response = test_client.get(
+        "/api/v1/films/",
+        params={"title": "My Film", "skip": 1},
+        headers={"accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [orjson.loads(line) for line in response.text.splitlines()]
+    assert lines == [
+        {
+            "id": f"my-id-{i}",
+            "title": "My Film",
+            "description": "My description",
+            "release_year": 1990 + i,
+            "watched": False,
+            "version": 1,
+        }
+        for i in (1, 2)
+    ]
+
+    # Without the NDJSON accept header the handler keeps returning a JSON list.
+    response = test_client.get("/api/v1/films/", params={"title": "My Film"})
+    assert [film["id"] for film in response.json()] == [
+        "my-id-0",
+        "my-id-1",
+        "my-id-2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_all_films_ndjson(test_client, memory_repo):
+    await seed(memory_repo, 2)
+    await seed(memory_repo, 1, title="Other Film", prefix="other")
+
+    response = test_client.get(
+        "/api/v1/films/all",
+        params={"limit": 0},
+        headers={"accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    ids = [orjson.loads(line)["id"] for line in response.text.splitlines()]
+    assert ids == ["my-id-0", "my-id-1", "other-0"]
+
+
+@pytest.mark.asyncio
+async def test_get_all_films_cursor(test_client, memory_repo):
+    await seed(memory_repo, 3)
+    await seed(memory_repo, 2, title="Other Film", prefix="other")
+
+    pages = []
+    params = {"limit": 2}
+    while True:
+        response = test_client.get("/api/v1/films/all", params=params)
+        assert response.status_code == 200
+        pages.append([film["id"] for film in response.json()])
+        if "x-next-cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["x-next-cursor"]
+
+    assert pages == [["my-id-0", "my-id-1"], ["my-id-2", "other-0"], ["other-1"]]
+
+
+@pytest.mark.asyncio
+async def test_get_films_by_title_cursor(test_client, memory_repo):
+    await seed(memory_repo, 3)
+
+    response = test_client.get(
+        "/api/v1/films/", params={"title": "My Film", "limit": 2}
+    )
+    assert [film["id"] for film in response.json()] == ["my-id-0", "my-id-1"]
+
+    response = test_client.get(
+        "/api/v1/films/",
+        params={
+            "title": "My Film",
+            "limit": 2,
+            "cursor": response.headers["x-next-cursor"],
+        },
+    )
+    assert [film["id"] for film in response.json()] == ["my-id-2"]
+    assert "x-next-cursor" not in response.headers
+
+    response = test_client.get(
+        "/api/v1/films/", params={"title": "My Film", "cursor": "not-a-cursor"}
+    )
+    assert response.status_code == 400
+
+
+@pytest.fixture()
+def jwt_private_key(monkeypatch):
+    public_key, private_key = rsa.newkeys(1024)
+    monkeypatch.setattr(film_v1, "JWT_PUBLIC_KEY", public_key.save_pkcs1().decode())
+    film_v1.jwt_public_key.cache_clear()
+    film_v1.verified_tokens.cache_clear()
+    yield private_key.save_pkcs1().decode()
+    film_v1.jwt_public_key.cache_clear()
+    film_v1.verified_tokens.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_authenticate_jwt_cache(jwt_private_key):
+    token = jwt.encode(
+        {"name": "John Doe", "exp": time.time() + 60}, jwt_private_key, "RS256"
+    )
+
+    first = await authenticate_jwt(authorization=f"Bearer {token}")
+    second = await authenticate_jwt(authorization=f"Bearer {token}")
+
+    assert first == second == film_v1.Token(name="John Doe", admin=False)
+    stats = film_v1.verified_tokens().stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_authenticate_jwt_expired_token(jwt_private_key):
+    token = jwt.encode(
+        {"name": "John Doe", "exp": time.time() - 1}, jwt_private_key, "RS256"
+    )
+
+    with pytest.raises(film_v1.HTTPException) as e:
+        await authenticate_jwt(authorization=f"Bearer {token}")
+    assert e.value.status_code == 401
+    assert len(film_v1.verified_tokens()) == 0
+
+
+def test_authenticate_jwt_concurrently(
+    jwt_private_key, monkeypatch, test_client, memory_repo
+):
+    settings = film_v1.settings_instance()
+    monkeypatch.setattr(settings, "jwt_cache_size", 2)
+    monkeypatch.setattr(settings, "film_repository_backend", "memory")
+    test_client.app.dependency_overrides.pop(authenticate_jwt, None)
+    tokens = [
+        jwt.encode({"name": f"user {i}"}, jwt_private_key, "RS256") for i in range(8)
+    ]
+
+    def get(token):
+        return test_client.get(
+            "/api/v1/films/?title=missing",
+            headers={"Authorization": f"Bearer {token}"},
+        ).status_code
+
+    cache = film_v1.verified_tokens()
+    threads = set()
+    for name in ("get", "set"):
+        method = getattr(cache, name)
+
+        def record(*args, method=method, **kwargs):
+            threads.add(threading.get_ident())
+            return method(*args, **kwargs)
+
+        monkeypatch.setattr(cache, name, record)
+
+    # A small cache keeps evicting while the requests verify their tokens.
+    with test_client, ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = list(executor.map(get, tokens * 25))
+    assert statuses == [200] * 200
+    assert len(cache) <= 2
+    # Only the event loop's thread ever touches the cache.
+    assert len(threads) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_films_by_ids(test_client, memory_repo):
+    await seed(memory_repo, 3)
+    response = test_client.get(
+        "/api/v1/films/batch",
+        params=[
+            ("id", "my-id-2"),
+            ("id", "unknown"),
+            ("id", "my-id-0"),
+            ("id", "my-id-2"),
+        ],
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [film["id"] for film in body["films"]] == ["my-id-2", "my-id-0"]
+    assert body["films"][0]["release_year"] == 1992
+    assert body["missing"] == ["unknown"]
+
+
+def test_get_films_by_ids_requires_ids(test_client, memory_repo):
+    assert test_client.get("/api/v1/films/batch").status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_search_films(test_client, memory_repo):
+    await seed(memory_repo, 3, title="My Film")
+    await seed(memory_repo, 1, title="Other Film", prefix="other")
+
+    response = test_client.get(
+        "/api/v1/films/search", params={"q": "my f", "mode": "prefix", "limit": 2}
+    )
+    assert response.status_code == 200
+    assert [film["id"] for film in response.json()] == ["my-id-0", "my-id-1"]
+
+    response = test_client.get("/api/v1/films/search", params={"q": "other"})
+    assert [film["id"] for film in response.json()] == ["other-0"]
+
+    response = test_client.get("/api/v1/films/search", params={"q": "x", "mode": "?"})
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_filter_films(test_client, memory_repo):
+    await seed(memory_repo, 5, title="My Film")
+    await seed(memory_repo, 1, title="Other Film", prefix="other")
+    await memory_repo.update("my-id-3", {"watched": True})
+
+    rule = 'not watched and (release_year >= 1992 or title =~ "^Other")'
+    response = test_client.get("/api/v1/films/filter", params={"rule": rule})
+    assert response.status_code == 200
+    assert [film["id"] for film in response.json()] == [
+        "my-id-2",
+        "my-id-4",
+        "other-0",
+    ]
+
+    response = test_client.get(
+        "/api/v1/films/filter",
+        params={"rule": 'title =~ "^Other"', "limit": 0},
+        headers={"Accept": "application/x-ndjson"},
+    )
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [orjson.loads(line)["id"] for line in response.content.splitlines()] == [
+        "other-0"
+    ]
+
+    response = test_client.get(
+        "/api/v1/films/filter", params={"rule": rule, "skip": 1, "limit": 1}
+    )
+    assert [film["id"] for film in response.json()] == ["my-id-4"]
+    cursor = response.headers["x-next-cursor"]
+    response = test_client.get(
+        "/api/v1/films/filter", params={"rule": rule, "cursor": cursor}
+    )
+    assert [film["id"] for film in response.json()] == ["other-0"]
+
+
+@pytest.mark.parametrize("rule", ["release_year >=", "rating > 3"])
+def test_filter_films_invalid_rule(test_client, memory_repo, rule):
+    response = test_client.get("/api/v1/films/filter", params={"rule": rule})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("invalid rule")
+
+
+@pytest.mark.asyncio
+async def test_count_filter(test_client, memory_repo):
+    await seed(memory_repo, 5, title="My Film")
+
+    response = test_client.get(
+        "/api/v1/films/filter/count", params={"rule": "release_year >= 1991"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"count": 4}
+
+
+@pytest.mark.asyncio
+async def test_statistics(test_client, memory_repo):
+    response = test_client.get("/api/v1/films/statistics/watched")
+    assert response.json() == {"watched": 0, "unwatched": 0, "watched_ratio": 0.0}
+
+    await seed(memory_repo, 3, title="My Film")
+    await seed(memory_repo, 1, title="Other Film", prefix="other")
+    await memory_repo.update("my-id-1", {"watched": True})
+
+    response = test_client.get("/api/v1/films/statistics/release-years")
+    assert response.status_code == 200
+    assert response.json() == [
+        {"release_year": 1990, "films": 2, "titles": 2},
+        {"release_year": 1991, "films": 1, "titles": 1},
+        {"release_year": 1992, "films": 1, "titles": 1},
+    ]
+    response = test_client.get("/api/v1/films/statistics/watched")
+    assert response.json() == {"watched": 1, "unwatched": 3, "watched_ratio": 0.25}
+
+
+def test_explain_filter(test_client, memory_repo):
+    # The memory repository evaluates every rule in process.
+    response = test_client.get(
+        "/api/v1/films/filter/explain", params={"rule": "not  watched"}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"filter": None, "residual": "not watched"}
+
+    response = test_client.get(
+        "/api/v1/films/filter/explain", params={"rule": "rating > 3"}
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_film_by_id_etag(test_client, memory_repo):
+    await seed(memory_repo, 1)
+
+    response = test_client.get("/api/v1/films/my-id-0")
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+    etag = response.headers["etag"]
+
+    response = test_client.get(
+        "/api/v1/films/my-id-0", headers={"If-None-Match": f'"0", W/{etag}'}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    # The tag of the compressed response matches as well, and is sent back.
+    gzip_etag = f'{etag[:-1]}-gzip"'
+    response = test_client.get(
+        "/api/v1/films/my-id-0", headers={"If-None-Match": gzip_etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["etag"] == gzip_etag
+
+    await memory_repo.update("my-id-0", {"watched": True})
+    response = test_client.get("/api/v1/films/my-id-0", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["watched"] is True
+    assert response.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_patch_film_if_match(test_client, memory_repo):
+    await seed(memory_repo, 1)
+    etag = test_client.get("/api/v1/films/my-id-0").headers["etag"]
+
+    response = test_client.patch(
+        "/api/v1/films/my-id-0", json={"watched": True}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 200
+    new_etag = response.headers["etag"]
+    assert new_etag != etag
+
+    # A concurrent writer still holding the previous version.
+    response = test_client.patch(
+        "/api/v1/films/my-id-0", json={"watched": False}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 412
+    assert (await memory_repo.get_by_id("my-id-0")).watched is True
+
+    # A weak tag never matches, a list matches if any of its tags does.
+    response = test_client.patch(
+        "/api/v1/films/my-id-0", json={}, headers={"If-Match": f"W/{new_etag}"}
+    )
+    assert response.status_code == 412
+    response = test_client.patch(
+        "/api/v1/films/my-id-0",
+        json={"watched": False},
+        headers={"If-Match": f"{etag}, {new_etag}"},
+    )
+    assert response.status_code == 200
+    assert (await memory_repo.get_by_id("my-id-0")).watched is False
+
+    # The tag of the compressed response stands for the same version.
+    response = test_client.patch(
+        "/api/v1/films/my-id-0",
+        json={"watched": True},
+        headers={"If-Match": f'{response.headers["etag"][:-1]}-gzip"'},
+    )
+    assert response.status_code == 200
+
+    response = test_client.patch(
+        "/api/v1/films/my-id-0", json={}, headers={"If-Match": "not-a-version"}
+    )
+    assert response.status_code == 400
+    response = test_client.patch(
+        "/api/v1/films/my-id-0", json={}, headers={"If-Match": '"abc"'}
+    )
+    assert response.status_code == 412
+
+    # No entity tag matches a missing film, not even `*`.
+    for if_match in (etag, "*"):
+        response = test_client.patch(
+            "/api/v1/films/unknown", json={}, headers={"If-Match": if_match}
+        )
+        assert response.status_code == 412
+    response = test_client.patch(
+        "/api/v1/films/my-id-0", json={"watched": True}, headers={"If-Match": "*"}
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_recreated_film_etag(test_client, memory_repo):
+    await memory_repo.create(
+        Film(
+            film_id="x",
+            title="Old",
+            description="My description",
+            release_year=1990,
+        )
+    )
+    etag = test_client.get("/api/v1/films/x").headers["etag"]
+    await memory_repo.delete("x")
+    await memory_repo.create(
+        Film(
+            film_id="x",
+            title="Completely different",
+            description="My description",
+            release_year=1990,
+        )
+    )
+
+    # The film is at version 1 again, its entity tag is different.
+    response = test_client.get("/api/v1/films/x", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["version"] == 1
+    response = test_client.patch(
+        "/api/v1/films/x", json={"watched": True}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_patch_film_without_changes(test_client, memory_repo):
+    await seed(memory_repo, 1)
+    response = test_client.patch("/api/v1/films/my-id-0", json={"watched": False})
+    assert response.status_code == 200
+    response = test_client.patch("/api/v1/films/unknown", json={"watched": False})
+    assert response.status_code == 404
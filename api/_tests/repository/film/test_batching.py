@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from api.entities.film import Film
+from api.repository.film.abstractions import (
+    FilmNotFoundException,
+    RepositoryException,
+    VersionConflictException,
+)
+from api.repository.film.batching import BatchingFilmRepository
+from api.repository.film.memory import MemoryFilmRepository
+
+
+class BatchRecordingFilmRepository(MemoryFilmRepository):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.error = None
+
+    async def execute_batch(self, operations):
+        self.batches.append(
+            [(type(operation).__name__, operation.film_id) for operation in operations]
+        )
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return await super().execute_batch(operations)
+
+
+def make_film(film_id, title="My Film"):
+    return Film(
+        film_id=film_id,
+        title=title,
+        description="My description",
+        release_year=1990,
+    )
+
+
+@pytest.fixture()
+def storage():
+    return BatchRecordingFilmRepository()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_are_batched(storage):
+    await storage.create(make_film("c"))
+    repo = BatchingFilmRepository(storage, window=0.01)
+
+    results = await asyncio.gather(
+        repo.create(make_film("a")),
+        repo.update("c", {"title": "New Title"}),
+        repo.delete("b"),
+        repo.update("missing", {"title": "New Title"}),
+        repo.update("c2", {"id": "x"}),
+        return_exceptions=True,
+    )
+
+    assert results[0] is None
+    assert (results[1].title, results[1].version) == ("New Title", 2)
+    assert results[2] is None
+    assert isinstance(results[3], FilmNotFoundException)
+    assert isinstance(results[4], RepositoryException)
+    assert storage.batches == [
+        [
+            ("CreateFilm", "a"),
+            ("UpdateFilm", "c"),
+            ("DeleteFilm", "b"),
+            ("UpdateFilm", "missing"),
+            ("UpdateFilm", "c2"),
+        ]
+    ]
+    assert (repo.writes, repo.batches) == (5, 1)
+    assert (await storage.get_by_id("a")).id == "a"
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_written_without_waiting(storage):
+    repo = BatchingFilmRepository(storage, window=60, max_batch_size=2)
+
+    await asyncio.wait_for(
+        asyncio.gather(repo.create(make_film("a")), repo.create(make_film("b"))),
+        timeout=1,
+    )
+
+    assert storage.batches == [[("CreateFilm", "a"), ("CreateFilm", "b")]]
+
+
+@pytest.mark.asyncio
+async def test_writes_of_a_film_are_applied_in_order(storage):
+    repo = BatchingFilmRepository(storage, window=0.01)
+
+    await asyncio.gather(
+        repo.create(make_film("a")),
+        repo.create(make_film("b")),
+        repo.update("a", {"title": "Second"}),
+        repo.update("a", {"title": "Third"}),
+        repo.update("a", {"watched": True}, expected_version=3),
+    )
+
+    assert storage.batches == [
+        [("CreateFilm", "a"), ("CreateFilm", "b")],
+        [("UpdateFilm", "a")],
+        [("UpdateFilm", "a")],
+    ]
+    film = await storage.get_by_id("a")
+    assert (film.title, film.watched, film.version) == ("Third", True, 4)
+
+    with pytest.raises(VersionConflictException):
+        await repo.update("a", {"watched": False}, expected_version=3)
+
+
+@pytest.mark.asyncio
+async def test_batch_errors_are_shared(storage):
+    storage.error = RuntimeError("down")
+    repo = BatchingFilmRepository(storage, window=0.01)
+
+    results = await asyncio.gather(
+        repo.create(make_film("a")), repo.delete("b"), return_exceptions=True
+    )
+
+    assert [str(result) for result in results] == ["down", "down"]
+    assert repo._in_flight == {}
+
+
+@pytest.mark.asyncio
+async def test_close_writes_pending_batch(storage):
+    repo = BatchingFilmRepository(storage, window=60)
+    task = asyncio.ensure_future(repo.create(make_film("a")))
+    await asyncio.sleep(0)
+
+    await repo.close()
+
+    assert task.done() and task.result() is None
+    assert (await storage.get_by_id("a")).id == "a"
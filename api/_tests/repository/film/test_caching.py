@@ -0,0 +1,138 @@
+import pytest
+
+from api.entities.film import Film
+from api.repository.film.caching import CachingFilmRepository
+from api.repository.film.memory import MemoryFilmRepository
+
+
+class CountingFilmRepository(MemoryFilmRepository):
+    """
+    Memory repository which counts the reads reaching it and returns copies,
+    like a database would.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def get_by_id(self, film_id):
+        self.reads += 1
+        film = await super().get_by_id(film_id)
+        if film is None:
+            return None
+        return Film(
+            film_id=film.id,
+            title=film.title,
+            description=film.description,
+            release_year=film.release_year,
+            watched=film.watched,
+        )
+
+    async def get_by_ids(self, film_ids):
+        self.reads += 1
+        return await super().get_by_ids(film_ids)
+
+    async def get_by_title(self, title, skip=0, limit=1000, after=None):
+        self.reads += 1
+        return await super().get_by_title(title, skip, limit, after)
+
+
+def make_film(film_id="my-id", title="My Film"):
+    return Film(
+        film_id=film_id,
+        title=title,
+        description="My description",
+        release_year=1990,
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_by_id_is_cached():
+    backend = CountingFilmRepository()
+    repo = CachingFilmRepository(backend)
+    await repo.create(make_film())
+
+    assert await repo.get_by_id("my-id") == make_film()
+    assert await repo.get_by_id("my-id") == make_film()
+    assert await repo.get_by_id("missing") is None
+    assert await repo.get_by_id("missing") is None
+
+    assert backend.reads == 2
+    assert repo.films_by_id.stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_get_by_id():
+    backend = CountingFilmRepository()
+    repo = CachingFilmRepository(backend)
+    assert await repo.get_by_id("my-id") is None
+
+    await repo.create(make_film())
+    assert await repo.get_by_id("my-id") == make_film()
+
+    await repo.update("my-id", {"watched": True})
+    assert (await repo.get_by_id("my-id")).watched is True
+
+    await repo.delete("my-id")
+    assert await repo.get_by_id("my-id") is None
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_get_by_title():
+    backend = CountingFilmRepository()
+    repo = CachingFilmRepository(backend)
+    await repo.create(make_film("first"))
+    await repo.create(make_film("other", title="Other Film"))
+    assert [film.id for film in await repo.get_by_title("My Film")] == ["first"]
+    assert [film.id for film in await repo.get_by_title("Other Film")] == ["other"]
+
+    # A new film joins the cached title.
+    await repo.create(make_film("second"))
+    films = await repo.get_by_title("My Film")
+    assert [film.id for film in films] == ["first", "second"]
+
+    # A renamed film leaves its old title and joins the new one.
+    reads = backend.reads
+    await repo.update("first", {"title": "Other Film"})
+    assert [film.id for film in await repo.get_by_title("My Film")] == ["second"]
+    films = await repo.get_by_title("Other Film")
+    assert [film.id for film in films] == ["first", "other"]
+    assert backend.reads == reads + 2
+
+    # Unrelated titles stay cached.
+    await repo.delete("second")
+    assert await repo.get_by_title("My Film") == []
+    assert [film.id for film in await repo.get_by_title("Other Film")] == [
+        "first",
+        "other",
+    ]
+    assert backend.reads == reads + 3
+
+
+@pytest.mark.asyncio
+async def test_bounded_size():
+    repo = CachingFilmRepository(CountingFilmRepository(), max_entries=2)
+    for film_id in ["a", "b", "c"]:
+        await repo.get_by_id(film_id)
+
+    stats = repo.films_by_id.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_by_ids_is_cached():
+    backend = CountingFilmRepository()
+    repo = CachingFilmRepository(backend)
+    await repo.create(make_film("a"))
+    await repo.get_by_id("a")
+    reads = backend.reads
+
+    films = await repo.get_by_ids(["a", "b"])
+    assert list(films) == ["a"]
+    assert backend.reads == reads + 1
+
+    # Both the film and the missing id are cached now.
+    assert list(await repo.get_by_ids(["a", "b"])) == ["a"]
+    assert await repo.get_by_id("b") is None
+    assert backend.reads == reads + 1
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from api.entities.film import Film
+from api.repository.film.coalescing import CoalescingFilmRepository
+from api.repository.film.memory import MemoryFilmRepository
+
+
+class BatchRecordingFilmRepository(MemoryFilmRepository):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.error = None
+
+    async def get_by_ids(self, film_ids):
+        self.batches.append(list(film_ids))
+        await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return await super().get_by_ids(film_ids)
+
+
+def make_film(film_id):
+    return Film(
+        film_id=film_id,
+        title="My Film",
+        description="My description",
+        release_year=1990,
+    )
+
+
+@pytest.fixture()
+def storage():
+    return BatchRecordingFilmRepository()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_merged(storage):
+    for film_id in ["a", "b", "c"]:
+        await storage.create(make_film(film_id))
+    repo = CoalescingFilmRepository(storage)
+
+    films = await asyncio.gather(
+        repo.get_by_id("a"),
+        repo.get_by_id("b"),
+        repo.get_by_id("a"),
+        repo.get_by_id("missing"),
+    )
+
+    assert [film and film.id for film in films] == ["a", "b", "a", None]
+    assert storage.batches == [["a", "b", "missing"]]
+    assert (repo.calls, repo.batches) == (4, 1)
+
+    assert (await repo.get_by_id("c")).id == "c"
+    assert storage.batches[1:] == [["c"]]
+
+
+@pytest.mark.asyncio
+async def test_batches_are_bounded(storage):
+    repo = CoalescingFilmRepository(storage, max_batch_size=2)
+    await asyncio.gather(*(repo.get_by_id(film_id) for film_id in "abcde"))
+    assert storage.batches == [["a", "b"], ["c", "d"], ["e"]]
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller(storage):
+    storage.error = RuntimeError("down")
+    repo = CoalescingFilmRepository(storage)
+    results = await asyncio.gather(
+        repo.get_by_id("a"), repo.get_by_id("b"), return_exceptions=True
+    )
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_doesnt_affect_the_batch(storage):
+    await storage.create(make_film("a"))
+    repo = CoalescingFilmRepository(storage)
+    cancelled = asyncio.ensure_future(repo.get_by_id("a"))
+    other = asyncio.ensure_future(repo.get_by_id("a"))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert (await other).id == "a"
+    assert cancelled.cancelled()
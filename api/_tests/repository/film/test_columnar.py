@@ -0,0 +1,166 @@
+import random
+
+import pytest
+
+from api.entities.film import Film
+from api.repository.film.abstractions import (
+    FilmNotFoundException,
+    FilmRepository,
+    RepositoryException,
+    SearchMode,
+    VersionConflictException,
+    film_document,
+)
+from api.repository.film.columnar import ColumnarFilmRepository
+from api.repository.film.memory import MemoryFilmRepository
+from api.rules import compile_rule
+
+
+def make_film(i: int, **fields) -> Film:
+    values = {
+        "film_id": f"my-id-{i:03d}",
+        "title": f"My Film {i % 7}",
+        "description": f"The description of film {i}",
+        "release_year": 1990 + i % 30,
+        "watched": i % 3 == 0,
+    }
+    values.update(fields)
+    return Film(**values)
+
+
+async def documents(iterator) -> list:
+    return [document async for document in iterator]
+
+
+@pytest.mark.asyncio
+async def test_create_update_delete():
+    repo = ColumnarFilmRepository()
+    await repo.create(make_film(1, watched=True))
+    film = await repo.get_by_id("my-id-001")
+    assert film == make_film(1, watched=True)
+    assert film.version == 1
+
+    film = await repo.update("my-id-001", {"title": "New Title", "watched": False})
+    assert (film.title, film.watched, film.version) == ("New Title", False, 2)
+    with pytest.raises(VersionConflictException):
+        await repo.update("my-id-001", {"watched": True}, expected_version=1)
+    with pytest.raises(RepositoryException):
+        await repo.update("my-id-001", {"id": "other"})
+    with pytest.raises(FilmNotFoundException):
+        await repo.update("unknown", {"watched": True})
+
+    await repo.create(make_film(1))
+    replaced = await repo.get_by_id("my-id-001")
+    assert (replaced.version, replaced.generation) == (3, film.generation)
+
+    await repo.delete("my-id-001")
+    assert await repo.get_by_id("my-id-001") is None
+    await repo.create(make_film(1))
+    created = await repo.get_by_id("my-id-001")
+    assert created.version == 1
+    assert created.generation not in (0, film.generation)
+    with pytest.raises(VersionConflictException):
+        await repo.update("my-id-001", {}, expected_generation=film.generation)
+    await repo.delete("my-id-001")
+    assert await repo.get_by_title("My Film 1") == []
+    assert len(repo) == 0
+
+
+@pytest.mark.asyncio
+async def test_rows_and_titles_are_reused():
+    repo = ColumnarFilmRepository()
+    await repo.create_many([make_film(i, title=f"Title {i}") for i in range(3)])
+    await repo.delete("my-id-001")
+    await repo.create(make_film(3, title="Other Title"))
+
+    # The row and the title code of the deleted film are reused.
+    assert len(repo._ids) == 3
+    assert repo._dictionary == ["Title 0", "Other Title", "Title 2"]
+    assert await repo.get_by_id("my-id-003") == make_film(3, title="Other Title")
+    assert [film.id async for film in repo.iter_all()] == [
+        "my-id-003",
+        "my-id-000",
+        "my-id-002",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_reads_match_memory_repository():
+    memory, columnar = MemoryFilmRepository(), ColumnarFilmRepository()
+    generator = random.Random(7)
+    for repo in (memory, columnar):
+        await repo.create_many([make_film(i) for i in range(100)])
+    for i in range(200):
+        film_id = f"my-id-{generator.randrange(120):03d}"
+        action = generator.random()
+        for repo in (memory, columnar):
+            if action < 0.3:
+                await repo.delete(film_id)
+            elif action < 0.6:
+                await repo.create(make_film(i, film_id=film_id))
+            elif await repo.get_by_id(film_id) is not None:
+                await repo.update(film_id, {"title": f"My Film {i % 11}"})
+
+    async def read(repo: FilmRepository):
+        return (
+            await documents(repo.iter_all_documents()),
+            await documents(repo.iter_all_documents(skip=3, limit=5)),
+            await documents(repo.iter_all_documents(after=("My Film 3", "my-id-050"))),
+            await repo.get_documents_by_title("My Film 4", skip=1, limit=3),
+            await repo.search("film 5", SearchMode.TEXT, limit=0),
+            await repo.release_year_statistics(),
+            await repo.watched_counts(),
+        )
+
+    assert await read(columnar) == await read(memory)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "rule",
+    [
+        "release_year >= 2000 and not watched",
+        "release_year == 1995 or watched",
+        'title =~ "My Film [12]" and release_year < 2005',
+        'title in ["My Film 3", "My Film 5"] and "film 1" in description',
+        'not (title == "My Film 0" or release_year > 1991)',
+        "release_year % 4 == 0 and watched",
+        'id > "my-id-150" and version == 1',
+    ],
+)
+async def test_iter_documents_matching(rule):
+    repo = ColumnarFilmRepository()
+    await repo.create_many([make_film(i) for i in range(200)])
+    await repo.delete("my-id-010")
+    compiled = compile_rule(rule)
+
+    # Every film evaluated by the rule itself.
+    expected = [
+        film_document(film)
+        async for film in repo.iter_all()
+        if compiled.matches(film_document(film))
+    ]
+    assert await documents(repo.iter_documents_matching(compiled)) == expected
+    assert await repo.count_matching(compiled) == len(expected)
+    assert (
+        await documents(repo.iter_documents_matching(compiled, skip=2, limit=3))
+        == expected[2:5]
+    )
+    if expected:
+        after = (expected[0]["title"], expected[0]["id"])
+        assert (
+            await documents(repo.iter_documents_matching(compiled, after=after))
+            == expected[1:]
+        )
+
+
+@pytest.mark.asyncio
+async def test_explain_matching():
+    repo = ColumnarFilmRepository()
+    explanation = await repo.explain_matching(
+        compile_rule("watched and release_year % 2 == 0")
+    )
+    assert explanation == {
+        "filter": {"watched": True},
+        "residual": "((release_year % 2) == 0)",
+    }
@@ -0,0 +1,193 @@
+import asyncio
+import os
+
+import pytest
+
+from api.entities.film import Film
+from api.repository.film.abstractions import (
+    CreateFilm,
+    DeleteFilm,
+    RepositoryException,
+    UpdateFilm,
+)
+from api.repository.film.durable import DurableMemoryFilmRepository
+
+
+def make_film(film_id, title="My Film"):
+    return Film(
+        film_id=film_id,
+        title=title,
+        description="My description",
+        release_year=1990,
+    )
+
+
+async def open_repository(path, **kwargs) -> DurableMemoryFilmRepository:
+    repo = DurableMemoryFilmRepository(str(path), **kwargs)
+    await repo.connect()
+    return repo
+
+
+async def films_of(repo):
+    return {
+        film.id: (film.title, film.watched, film.version)
+        async for film in repo.iter_all()
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fsync", ["always", "interval", "never"])
+async def test_writes_are_recovered(tmp_path, fsync):
+    repo = await open_repository(tmp_path, fsync=fsync, fsync_interval=0.001)
+    await repo.create(make_film("a"))
+    await repo.create_many([make_film("b"), make_film("c", title="Other")])
+    await repo.update("a", {"title": "New Title", "watched": True})
+    await repo.delete("b")
+    await repo.delete("missing")
+    expected = await films_of(repo)
+    generation = (await repo.get_by_id("a")).generation
+    await repo.close()
+
+    recovered = await open_repository(tmp_path)
+    assert (
+        await films_of(recovered)
+        == expected
+        == {
+            "a": ("New Title", True, 2),
+            "c": ("Other", False, 1),
+        }
+    )
+    assert [film.id for film in await recovered.get_by_title("Other")] == ["c"]
+    # The generations are recovered, the entity tags of the films are stable.
+    assert (await recovered.get_by_id("a")).generation == generation
+    assert await recovered.release_year_statistics() == {1990: (2, 2)}
+    assert await recovered.watched_counts() == (1, 1)
+    await recovered.close()
+
+
+@pytest.mark.asyncio
+async def test_batches_are_recovered(tmp_path):
+    repo = await open_repository(tmp_path)
+    await repo.create(make_film("a"))
+    results = await repo.execute_batch(
+        [
+            CreateFilm(make_film("b")),
+            UpdateFilm("a", {"watched": True}),
+            DeleteFilm("b"),
+            UpdateFilm("missing", {"watched": True}),
+        ]
+    )
+    assert results[1].version == 2
+    await repo.close()
+
+    recovered = await open_repository(tmp_path)
+    assert await films_of(recovered) == {"a": ("My Film", True, 2)}
+    await recovered.close()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_compacts_journals(tmp_path):
+    repo = await open_repository(tmp_path, snapshot_records=0)
+    await repo.create_many([make_film(str(i)) for i in range(25)])
+    await repo.snapshot()
+    await repo.update("3", {"watched": True})
+    await repo.delete("4")
+    await repo.close()
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "journal-000000000002.ndjson",
+        "snapshot-000000000002.ndjson",
+    ]
+    recovered = await open_repository(tmp_path)
+    films = await films_of(recovered)
+    assert len(films) == 24
+    assert films["3"] == ("My Film", True, 2)
+    await recovered.close()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_triggered_by_journal_size(tmp_path):
+    repo = await open_repository(tmp_path, snapshot_records=10)
+    for i in range(12):
+        await repo.create(make_film(str(i)))
+    await repo.close()
+
+    assert "snapshot-000000000002.ndjson" in os.listdir(tmp_path)
+    recovered = await open_repository(tmp_path)
+    assert len(await films_of(recovered)) == 12
+    await recovered.close()
+
+
+@pytest.mark.asyncio
+async def test_truncated_record_is_dropped(tmp_path):
+    repo = await open_repository(tmp_path)
+    await repo.create(make_film("a"))
+    await repo.create(make_film("b"))
+    await repo.close()
+    journal = tmp_path / "journal-000000000001.ndjson"
+    data = journal.read_bytes()
+    journal.write_bytes(data[:-10])
+
+    recovered = await open_repository(tmp_path)
+    assert list(await films_of(recovered)) == ["a"]
+    await recovered.create(make_film("c"))
+    await recovered.close()
+
+    recovered = await open_repository(tmp_path)
+    assert list(await films_of(recovered)) == ["a", "c"]
+    await recovered.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("fsync", ["always", "interval"])
+async def test_failed_journal_write(tmp_path, monkeypatch, fsync):
+    repo = await open_repository(tmp_path, fsync=fsync, fsync_interval=0.001)
+    await repo.create(make_film("a"))
+    if repo._flusher is not None:
+        await asyncio.wait({repo._flusher})
+    write = os.write
+
+    def torn_write(fd, data):
+        if fd != repo._fd:
+            return write(fd, data)
+        # Part of the record reaches the journal before the disk is full.
+        write(fd, bytes(data[:10]))
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(os, "write", torn_write)
+    if fsync == "always":
+        with pytest.raises(RepositoryException):
+            await repo.create(make_film("b"))
+    else:
+        # The write returned before its record failed to be written.
+        await repo.create(make_film("b"))
+        await asyncio.wait({repo._flusher})
+    monkeypatch.setattr(os, "write", write)
+
+    # The repository is read only once the journal can't be written.
+    with pytest.raises(RepositoryException):
+        await repo.create(make_film("c"))
+    with pytest.raises(RepositoryException):
+        await repo.delete("a")
+    await repo.close()
+
+    # The torn record was cut, the films are recovered and written again.
+    recovered = await open_repository(tmp_path)
+    assert await films_of(recovered) == {"a": ("My Film", False, 1)}
+    await recovered.create(make_film("c"))
+    await recovered.close()
+    recovered = await open_repository(tmp_path)
+    assert set(await films_of(recovered)) == {"a", "c"}
+    await recovered.close()
+
+
+@pytest.mark.asyncio
+async def test_records_without_generation_are_recovered(tmp_path):
+    # A journal written before films had a generation.
+    with open(tmp_path / "journal-000000000001.ndjson", "wb") as f:
+        f.write(b'["p","a","My Film","My description",1990,false,3]\n')
+
+    repo = await open_repository(tmp_path)
+    film = await repo.get_by_id("a")
+    assert (film.version, film.generation) == (3, 0)
+    await repo.close()
@@ -0,0 +1,75 @@
+import pytest
+
+from api.entities.film import Film
+from api.metrics import ApplicationMetrics
+from api.repository.film.instrumented import InstrumentedFilmRepository
+from api.repository.film.memory import MemoryFilmRepository
+
+
+class FailingFilmRepository(MemoryFilmRepository):
+    async def delete(self, film_id):
+        raise RuntimeError("down")
+
+
+def make_film(film_id):
+    return Film(
+        film_id=film_id,
+        title="My Film",
+        description="My description",
+        release_year=1990,
+    )
+
+
+@pytest.mark.asyncio
+async def test_operations_are_timed():
+    metrics = ApplicationMetrics()
+    repo = InstrumentedFilmRepository(FailingFilmRepository(), metrics)
+    await repo.create(make_film("a"))
+    await repo.create(make_film("b"))
+    assert await repo.get_by_id("a") == make_film("a")
+    assert [film.id async for film in repo.iter_by_title("My Film")] == ["a", "b"]
+    with pytest.raises(RuntimeError):
+        await repo.delete("a")
+
+    def count(operation):
+        return metrics.registry.get_sample_value(
+            "film_repository_operation_duration_seconds_count",
+            {"operation": operation},
+        )
+
+    def errors(operation):
+        return metrics.registry.get_sample_value(
+            "film_repository_operation_errors_total", {"operation": operation}
+        )
+
+    assert count("create") == 2
+    assert count("get_by_id") == 1
+    assert count("iter_by_title") == 1
+    assert count("delete") == 1
+    assert errors("delete") == 1
+    assert errors("create") == 0
+
+
+@pytest.mark.asyncio
+async def test_iteration_stopped_early_is_not_an_error():
+    metrics = ApplicationMetrics()
+    repo = InstrumentedFilmRepository(MemoryFilmRepository(), metrics)
+    await repo.create(make_film("a"))
+    await repo.create(make_film("b"))
+    iterator = repo.iter_all()
+    assert (await iterator.__anext__()).id == "a"
+    await iterator.aclose()
+
+    labels = {"operation": "iter_all"}
+    assert (
+        metrics.registry.get_sample_value(
+            "film_repository_operation_duration_seconds_count", labels
+        )
+        == 1
+    )
+    assert (
+        metrics.registry.get_sample_value(
+            "film_repository_operation_errors_total", labels
+        )
+        == 0
+    )
@@ -5,7 +5,13 @@ import pytest
 from api.entities.film import Film
 
 # from api.repository.film.abstractions import RepositoryException
-from api.repository.film.abstractions import RepositoryException
+from api.repository.film.abstractions import (
+    FilmNotFoundException,
+    FilmRepository,
+    RepositoryException,
+    SearchMode,
+    VersionConflictException,
+)
 from api.repository.film.memory import MemoryFilmRepository
 
 
@@ -176,3 +182,331 @@ async def test_update():
         release_year=2010,
         watched=True,
     )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "skip,limit,expected_ids",
+    [
+        pytest.param(0, 0, ["my-id", "my-id-2", "my-id-3"], id="no-limit"),
+        pytest.param(0, 1, ["my-id"], id="first-page"),
+        pytest.param(1, 1, ["my-id-2"], id="second-page"),
+        pytest.param(2, 5, ["my-id-3"], id="last-page"),
+        pytest.param(5, 5, [], id="out-of-range"),
+    ],
+)
+async def test_get_by_title_pagination(skip, limit, expected_ids):
+    repo = MemoryFilmRepository()
+    for film_id in ["my-id", "my-id-2", "my-id-3"]:
+        await repo.create(
+            Film(
+                film_id=film_id,
+                title="My Film",
+                description="My description",
+                release_year=1990,
+            )
+        )
+    await repo.create(
+        Film(
+            film_id="other",
+            title="Other Film",
+            description="My description",
+            release_year=1990,
+        )
+    )
+
+    films = await repo.get_by_title(title="My Film", skip=skip, limit=limit)
+    assert [film.id for film in films] == expected_ids
+
+
+@pytest.mark.asyncio
+async def test_title_index_follows_writes():
+    repo = MemoryFilmRepository()
+    await repo.create(
+        Film(
+            film_id="my-id",
+            title="My Film",
+            description="My description",
+            release_year=1990,
+        )
+    )
+    await repo.update(film_id="my-id", update_parameters={"title": "Renamed"})
+    assert await repo.get_by_title(title="My Film") == []
+    assert [film.id for film in await repo.get_by_title(title="Renamed")] == ["my-id"]
+
+    # Re-creating a film with the same id replaces its old title entry.
+    await repo.create(
+        Film(
+            film_id="my-id",
+            title="My Film",
+            description="My description",
+            release_year=1990,
+        )
+    )
+    assert await repo.get_by_title(title="Renamed") == []
+    assert [film.id for film in await repo.get_by_title(title="My Film")] == ["my-id"]
+
+    await repo.delete("my-id")
+    assert await repo.get_by_title(title="My Film") == []
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination():
+    repo = MemoryFilmRepository()
+    for film_id, title in [
+        ("c", "B Film"),
+        ("a", "B Film"),
+        ("b", "A Film"),
+        ("d", "C Film"),
+        ("e", "B Film"),
+    ]:
+        await repo.create(
+            Film(
+                film_id=film_id,
+                title=title,
+                description="My description",
+                release_year=1990,
+            )
+        )
+
+    films = await repo.get_by_title(title="B Film", limit=2, after="a")
+    assert [film.id for film in films] == ["c", "e"]
+
+    assert [film.id async for film in repo.iter_all()] == ["b", "a", "c", "e", "d"]
+    films = [film async for film in repo.iter_all(after=("B Film", "c"), limit=2)]
+    assert [film.id for film in films] == ["e", "d"]
+    # The key doesn't need to exist anymore.
+    films = [film async for film in repo.iter_all(after=("Arrival", "z"))]
+    assert [film.id for film in films] == ["a", "c", "e", "d"]
+
+
+@pytest.mark.asyncio
+async def test_compact_films():
+    repo = MemoryFilmRepository()
+    await repo.create(
+        Film(
+            film_id="my-id",
+            title="".join(["My ", "Film"]),
+            description="My description",
+            release_year=int("1990"),
+        )
+    )
+    await repo.create(
+        Film(
+            film_id="my-id-2",
+            title="".join(["My ", "Film"]),
+            description="My description",
+            release_year=int("1990"),
+        )
+    )
+    await repo.update(film_id="my-id-2", update_parameters={"watched": True})
+
+    first, second = await repo.get_by_title("My Film")
+    assert not hasattr(first, "__dict__")
+    # Titles and release years are shared between films.
+    assert first.title is second.title
+    assert first.release_year is second.release_year
+    assert second.watched is True
+
+
+@pytest.mark.asyncio
+async def test_get_by_ids():
+    repo = MemoryFilmRepository()
+    for film_id in ["a", "b", "c"]:
+        await repo.create(
+            Film(
+                film_id=film_id,
+                title="My Film",
+                description="My description",
+                release_year=1990,
+            )
+        )
+    films = await repo.get_by_ids(["c", "missing", "a"])
+    assert {film_id: film.id for film_id, film in films.items()} == {
+        "c": "c",
+        "a": "a",
+    }
+
+
+async def seed_search(repo):
+    for film_id, title, description in [
+        ("a", "The Matrix", "A hacker learns the truth about reality."),
+        ("b", "the matrix reloaded", "Neo fights the machines."),
+        ("c", "Matrix", "A documentary about the matrix films."),
+        ("d", "Heat", "A detective hunts a crew of thieves."),
+    ]:
+        await repo.create(
+            Film(
+                film_id=film_id,
+                title=title,
+                description=description,
+                release_year=1999,
+            )
+        )
+
+
+@pytest.mark.asyncio
+async def test_search_prefix_and_exact():
+    repo = MemoryFilmRepository()
+    await seed_search(repo)
+
+    films = await repo.search("THE MAT", mode=SearchMode.PREFIX)
+    assert [film.id for film in films] == ["a", "b"]
+    films = await repo.search("the matrix", mode=SearchMode.EXACT)
+    assert [film.id for film in films] == ["a"]
+    films = await repo.search("", mode=SearchMode.PREFIX, skip=1, limit=2)
+    assert [film.id for film in films] == ["c", "a"]
+
+
+@pytest.mark.asyncio
+async def test_search_text_is_ranked():
+    repo = MemoryFilmRepository()
+    await seed_search(repo)
+
+    # Title words weigh more than description words.
+    films = await repo.search("matrix")
+    assert [film.id for film in films] == ["c", "a", "b"]
+    films = await repo.search("thieves machines")
+    assert [film.id for film in films] == ["b", "d"]
+    assert await repo.search("unknown") == []
+
+
+@pytest.mark.asyncio
+async def test_search_index_follows_writes():
+    repo = MemoryFilmRepository()
+    await seed_search(repo)
+    assert [film.id for film in await repo.search("heat")] == ["d"]
+
+    await repo.update("d", {"title": "Ronin", "description": "Mercenaries."})
+    assert await repo.search("heat") == []
+    assert [film.id for film in await repo.search("mercenaries")] == ["d"]
+    await repo.update("d", {"watched": True})
+    films = await repo.search("ron", mode=SearchMode.PREFIX)
+    assert [film.id for film in films] == ["d"]
+
+    await repo.create(
+        Film(film_id="e", title="Heat", description="Again.", release_year=1995)
+    )
+    await repo.delete("a")
+    assert [film.id for film in await repo.search("heat")] == ["e"]
+    assert [film.id for film in await repo.search("hacker")] == []
+
+
+@pytest.mark.asyncio
+async def test_versions():
+    repo = MemoryFilmRepository()
+    film = Film(
+        film_id="my-id",
+        title="My Film",
+        description="My description",
+        release_year=1990,
+    )
+    await repo.create(film)
+    assert (await repo.get_by_id("my-id")).version == 1
+
+    updated = await repo.update("my-id", {"watched": True}, expected_version=1)
+    assert (updated.version, updated.watched) == (2, True)
+    with pytest.raises(VersionConflictException):
+        await repo.update("my-id", {"watched": False}, expected_version=1)
+    assert (await repo.get_by_id("my-id")).watched is True
+    assert (await repo.update("my-id", {})).version == 3
+
+    with pytest.raises(FilmNotFoundException):
+        await repo.update("unknown", {"watched": True})
+
+    await repo.create(
+        Film(
+            film_id="my-id",
+            title="My Film",
+            description="Replaced",
+            release_year=1990,
+        )
+    )
+    replaced = await repo.get_by_id("my-id")
+    assert (replaced.version, replaced.generation) == (4, updated.generation)
+
+    # A film created again after it was deleted starts over at version 1, in a
+    # new generation.
+    await repo.delete("my-id")
+    await repo.create(
+        Film(
+            film_id="my-id",
+            title="My Film",
+            description="Created again",
+            release_year=1990,
+        )
+    )
+    created = await repo.get_by_id("my-id")
+    assert created.version == 1
+    assert created.generation not in (0, updated.generation)
+    with pytest.raises(VersionConflictException):
+        await repo.update(
+            "my-id", {}, expected_version=1, expected_generation=updated.generation
+        )
+    assert (
+        await repo.update(
+            "my-id", {}, expected_version=1, expected_generation=created.generation
+        )
+    ).version == 2
+
+
+@pytest.mark.asyncio
+async def test_create_many_keeps_titles_ordered():
+    repo = MemoryFilmRepository()
+    await repo.create(
+        Film(film_id="x", title="M", description="My description", release_year=1990)
+    )
+    films = [
+        Film(
+            film_id=str(i),
+            title=f"T{i:03d}",
+            description="My description",
+            release_year=1990,
+        )
+        for i in range(100)
+    ]
+    # Replaced within the batch, its first title is left without films.
+    films.append(
+        Film(film_id="0", title="A", description="My description", release_year=1990)
+    )
+    assert await repo.create_many(films) == {}
+
+    titles = [film.title async for film in repo.iter_all()]
+    assert titles == sorted(titles)
+    assert "T000" not in titles
+    assert len(titles) == 101
+    assert (await repo.get_by_id("0")).version == 2
+
+
+@pytest.mark.asyncio
+async def test_statistics_follow_writes():
+    repo = MemoryFilmRepository()
+    for i in range(6):
+        await repo.create(
+            Film(
+                film_id=f"my-id-{i}",
+                title=f"My Film {i % 2}",
+                description="My description",
+                release_year=1990 + i % 3,
+                watched=i == 0,
+            )
+        )
+    await repo.update("my-id-1", {"release_year": 1995, "watched": True})
+    await repo.update("my-id-2", {"title": "My Film 0"})
+    await repo.update("my-id-3", {"description": "New description"})
+    await repo.create(
+        Film(
+            film_id="my-id-4",
+            title="Other Film",
+            description="My description",
+            release_year=1990,
+        )
+    )
+    await repo.delete("my-id-5")
+
+    expected = {1990: (3, 3), 1992: (1, 1), 1995: (1, 1)}
+    assert await repo.release_year_statistics() == expected
+    assert await repo.watched_counts() == (2, 3)
+    # Same as counting every film.
+    assert await FilmRepository.release_year_statistics(repo) == expected
+    assert await FilmRepository.watched_counts(repo) == (2, 3)
@@ -1,12 +1,23 @@
+import asyncio
 import secrets
 
 import pytest
+from pymongo.errors import AutoReconnect
 
 # noinspection PyUnresolvedReferences
 from api._tests.fixtures import mongo_film_repo_fixture
 from api.entities.film import Film
-from api.repository.film.abstractions import RepositoryException
+from api.repository.film.abstractions import (
+    CreateFilm,
+    DeleteFilm,
+    FilmNotFoundException,
+    RepositoryException,
+    SearchMode,
+    UpdateFilm,
+    VersionConflictException,
+)
 from api.repository.film.mongo import MongoFilmRepository
+from api.rules import compile_rule
 
 
 async def test_create(mongo_film_repo_fixture):
@@ -273,3 +284,332 @@ async def test_delete(mongo_film_repo_fixture):
     await mongo_film_repo_fixture.delete(film_id=secrets.token_hex(10))
     # Assert
     assert await mongo_film_repo_fixture.get_by_id(film_id="first") is None
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes(mongo_film_repo_fixture):
+    index_information = await mongo_film_repo_fixture.ensure_indexes()
+    assert index_information["id_unique"]["unique"] is True
+    assert index_information["title_id"]["key"] == [("title", 1), ("id", 1)]
+    # Ensuring the indexes a second time is a no-op.
+    assert await mongo_film_repo_fixture.ensure_indexes() == index_information
+
+
+@pytest.mark.asyncio
+async def test_build_indexes(mongo_film_repo_fixture):
+    build = mongo_film_repo_fixture.build_indexes()
+    # A single build runs at a time.
+    assert mongo_film_repo_fixture.build_indexes() is build
+    index_information = await build
+    assert index_information["id_unique"]["unique"] is True
+
+
+@pytest.mark.asyncio
+async def test_close_cancels_index_build(mongo_film_repo_fixture, monkeypatch):
+    started = asyncio.Event()
+
+    async def ensure_indexes():
+        started.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(mongo_film_repo_fixture, "ensure_indexes", ensure_indexes)
+    build = mongo_film_repo_fixture.build_indexes()
+    await started.wait()
+    await mongo_film_repo_fixture.close()
+    assert build.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_create_many(mongo_film_repo_fixture):
+    films = [
+        Film(
+            film_id=f"my-id-{i}",
+            title="My Film",
+            description="My description",
+            release_year=1990,
+        )
+        for i in range(5)
+    ]
+    errors = await mongo_film_repo_fixture.create_many(films)
+    assert errors == {}
+    assert await mongo_film_repo_fixture.get_by_title(title="My Film") == films
+
+
+@pytest.mark.asyncio
+async def test_create_many_failed_batch(mongo_film_repo_fixture, monkeypatch):
+    films = [
+        Film(
+            film_id=f"my-id-{i}",
+            title="My Film",
+            description="My description",
+            release_year=1990,
+        )
+        for i in range(5)
+    ]
+    repo = mongo_film_repo_fixture
+    monkeypatch.setattr(repo, "_bulk_write_batch_size", 2)
+    bulk_write = repo._films.bulk_write
+    calls = []
+
+    async def failing_bulk_write(operations, **kwargs):
+        calls.append(len(operations))
+        if len(calls) == 2:
+            # The connection is lost after the first write of the batch.
+            await bulk_write(operations[:1], **kwargs)
+            raise AutoReconnect("connection lost")
+        return await bulk_write(operations, **kwargs)
+
+    monkeypatch.setattr(repo._films, "bulk_write", failing_bulk_write)
+    errors = await repo.create_many(films)
+    # The whole batch is reported as failed, the next batch is still written.
+    assert calls == [2, 2, 1]
+    assert errors == {2: "connection lost", 3: "connection lost"}
+    assert [film.id for film in await repo.get_by_title(title="My Film")] == [
+        "my-id-0",
+        "my-id-1",
+        "my-id-2",
+        "my-id-4",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_iter_all(mongo_film_repo_fixture):
+    films = [
+        Film(
+            film_id=f"my-id-{i}",
+            title=f"My Film {i}",
+            description="My description",
+            release_year=1990,
+        )
+        for i in range(3)
+    ]
+    await mongo_film_repo_fixture.create_many(films)
+    assert [film async for film in mongo_film_repo_fixture.iter_all()] == films
+    assert [
+        film async for film in mongo_film_repo_fixture.iter_all(skip=1, limit=1)
+    ] == films[1:2]
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination(mongo_film_repo_fixture):
+    for film_id, title in [
+        ("c", "B Film"),
+        ("a", "B Film"),
+        ("b", "A Film"),
+        ("d", "C Film"),
+        ("e", "B Film"),
+    ]:
+        await mongo_film_repo_fixture.create(
+            Film(
+                film_id=film_id,
+                title=title,
+                description="My description",
+                release_year=1990,
+            )
+        )
+
+    films = await mongo_film_repo_fixture.get_by_title(
+        title="B Film", limit=2, after="a"
+    )
+    assert [film.id for film in films] == ["c", "e"]
+    films = [
+        film
+        async for film in mongo_film_repo_fixture.iter_all(
+            after=("B Film", "c"), limit=2
+        )
+    ]
+    assert [film.id for film in films] == ["e", "d"]
+
+
+@pytest.mark.asyncio
+async def test_connect(mongo_film_repo_fixture):
+    await mongo_film_repo_fixture.connect()
+
+
+@pytest.mark.asyncio
+async def test_connect_unreachable():
+    repo = MongoFilmRepository(
+        connection_string="mongodb://localhost:1",
+        database=secrets.token_hex(5),
+        serverSelectionTimeoutMS=100,
+    )
+    with pytest.raises(RepositoryException):
+        await repo.connect()
+    await repo.close()
+
+
+@pytest.mark.asyncio
+async def test_get_by_ids(mongo_film_repo_fixture):
+    for film_id in ["a", "b", "c"]:
+        await mongo_film_repo_fixture.create(
+            Film(
+                film_id=film_id,
+                title="My Film",
+                description="My description",
+                release_year=1990,
+            )
+        )
+    films = await mongo_film_repo_fixture.get_by_ids(["c", "missing", "a", "c"])
+    assert sorted(films) == ["a", "c"]
+    assert films["c"].id == "c"
+    assert await mongo_film_repo_fixture.get_by_ids([]) == {}
+
+
+@pytest.mark.asyncio
+async def test_search(mongo_film_repo_fixture):
+    await mongo_film_repo_fixture.ensure_indexes()
+    for film_id, title, description in [
+        ("a", "The Matrix", "A hacker learns the truth about reality."),
+        ("b", "the matrix reloaded", "Neo fights the machines."),
+        ("c", "Matrix", "A documentary about the matrix films."),
+        ("d", "Heat", "A detective hunts a crew of thieves."),
+    ]:
+        await mongo_film_repo_fixture.create(
+            Film(
+                film_id=film_id,
+                title=title,
+                description=description,
+                release_year=1999,
+            )
+        )
+
+    films = await mongo_film_repo_fixture.search("THE MAT", mode=SearchMode.PREFIX)
+    assert [film.id for film in films] == ["a", "b"]
+    films = await mongo_film_repo_fixture.search("the matrix", mode=SearchMode.EXACT)
+    assert [film.id for film in films] == ["a"]
+    films = await mongo_film_repo_fixture.search("matrix")
+    assert [film.id for film in films][0] == "c"
+    assert sorted(film.id for film in films) == ["a", "b", "c"]
+    films = await mongo_film_repo_fixture.search("thieves")
+    assert [film.id for film in films] == ["d"]
+
+
+@pytest.mark.asyncio
+async def test_versions(mongo_film_repo_fixture):
+    film = Film(
+        film_id="my-id",
+        title="My Film",
+        description="My description",
+        release_year=1990,
+    )
+    await mongo_film_repo_fixture.create(film)
+    assert (await mongo_film_repo_fixture.get_by_id("my-id")).version == 1
+
+    updated = await mongo_film_repo_fixture.update(
+        "my-id", {"watched": True}, expected_version=1
+    )
+    assert (updated.version, updated.watched) == (2, True)
+    with pytest.raises(VersionConflictException):
+        await mongo_film_repo_fixture.update(
+            "my-id", {"watched": False}, expected_version=1
+        )
+    # Updates which don't change anything succeed.
+    assert (
+        await mongo_film_repo_fixture.update("my-id", {"watched": True})
+    ).version == 3
+    assert (await mongo_film_repo_fixture.update("my-id", {})).version == 4
+
+    with pytest.raises(FilmNotFoundException):
+        await mongo_film_repo_fixture.update("unknown", {"watched": True})
+
+    await mongo_film_repo_fixture.create(film)
+    replaced = await mongo_film_repo_fixture.get_by_id("my-id")
+    assert (replaced.version, replaced.generation) == (5, updated.generation)
+
+    # A film created again after it was deleted is in a new generation.
+    await mongo_film_repo_fixture.delete("my-id")
+    await mongo_film_repo_fixture.create(film)
+    created = await mongo_film_repo_fixture.get_by_id("my-id")
+    assert created.version == 1
+    assert created.generation not in (0, updated.generation)
+    with pytest.raises(VersionConflictException):
+        await mongo_film_repo_fixture.update(
+            "my-id", {}, expected_version=1, expected_generation=updated.generation
+        )
+
+
+@pytest.mark.asyncio
+async def test_execute_batch(mongo_film_repo_fixture):
+    def make_film(film_id):
+        return Film(
+            film_id=film_id,
+            title="My Film",
+            description="My description",
+            release_year=1990,
+        )
+
+    await mongo_film_repo_fixture.create(make_film("updated"))
+    await mongo_film_repo_fixture.create(make_film("deleted"))
+
+    results = await mongo_film_repo_fixture.execute_batch(
+        [
+            CreateFilm(make_film("created")),
+            UpdateFilm("updated", {"title": "New Title"}),
+            DeleteFilm("deleted"),
+            UpdateFilm("unknown", {"title": "New Title"}),
+            UpdateFilm("updated-id", {"id": "other"}),
+        ]
+    )
+
+    assert results[0] is None
+    assert (results[1].title, results[1].version) == ("New Title", 2)
+    assert results[2] is None
+    assert isinstance(results[3], FilmNotFoundException)
+    assert isinstance(results[4], RepositoryException)
+    assert (await mongo_film_repo_fixture.get_by_id("created")).version == 1
+    assert await mongo_film_repo_fixture.get_by_id("deleted") is None
+
+
+@pytest.mark.asyncio
+async def test_iter_documents_matching(mongo_film_repo_fixture):
+    await mongo_film_repo_fixture.create_many(
+        [
+            Film(
+                film_id=f"my-id-{i}",
+                title=f"My Film {i}",
+                description="My description",
+                release_year=1990 + i,
+                watched=i == 2,
+            )
+            for i in range(5)
+        ]
+    )
+
+    # Pushed down entirely, skip and limit are applied by the server.
+    rule = compile_rule('title =~ "My" and release_year >= 1991 and not watched')
+    documents = mongo_film_repo_fixture.iter_documents_matching(rule, skip=1, limit=1)
+    assert [document["id"] async for document in documents] == ["my-id-3"]
+    assert await mongo_film_repo_fixture.count_matching(rule) == 3
+
+    # `%` is evaluated in process on the films matching the pushed down part.
+    rule = compile_rule("release_year % 2 == 0 and not watched")
+    documents = mongo_film_repo_fixture.iter_documents_matching(rule, skip=1)
+    assert [document["id"] async for document in documents] == ["my-id-4"]
+    assert await mongo_film_repo_fixture.count_matching(rule) == 2
+    assert await mongo_film_repo_fixture.explain_matching(rule) == {
+        "filter": {"$nor": [{"watched": True}]},
+        "residual": "((release_year % 2) == 0)",
+    }
+
+
+@pytest.mark.asyncio
+async def test_statistics(mongo_film_repo_fixture):
+    await mongo_film_repo_fixture.create_many(
+        [
+            Film(
+                film_id=f"my-id-{i}",
+                title=f"My Film {i % 2}",
+                description="My description",
+                release_year=1990 + i % 3,
+                watched=i < 2,
+            )
+            for i in range(7)
+        ]
+    )
+
+    assert await mongo_film_repo_fixture.release_year_statistics() == {
+        1990: (3, 2),
+        1991: (2, 2),
+        1992: (2, 2),
+    }
+    assert await mongo_film_repo_fixture.watched_counts() == (2, 5)
@@ -0,0 +1,59 @@
+import pytest
+
+from api.repository.film.rule_query import rule_query
+from api.rules import compile_rule
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("watched", {"watched": True}),
+        ("release_year >= 1990", {"release_year": {"$gte": 1990}}),
+        ("2000 < release_year", {"release_year": {"$gt": 2000}}),
+        ("release_year != 1999.5", {"release_year": {"$ne": 1999.5}}),
+        ('title =~ "My|Your"', {"title": {"$regex": "^(?:My|Your)"}}),
+        ('title =~~ "Film$"', {"title": {"$regex": "Film$"}}),
+        ('title !~ "My"', {"title": {"$not": {"$regex": "^(?:My)"}}}),
+        ('title in ["A", "B"]', {"title": {"$in": ["A", "B"]}}),
+        ('"a.b" in description', {"description": {"$regex": "a\\.b"}}),
+        (
+            "not (watched or release_year < 2000)",
+            {"$nor": [{"$or": [{"watched": True}, {"release_year": {"$lt": 2000}}]}]},
+        ),
+        (
+            'watched and (title == "A" or title == "B")',
+            {
+                "$and": [
+                    {"watched": True},
+                    {"$or": [{"title": {"$eq": "A"}}, {"title": {"$eq": "B"}}]},
+                ]
+            },
+        ),
+    ],
+)
+def test_translated_rules(text, expected):
+    query = rule_query(compile_rule(text))
+    assert query.filter == expected
+    assert query.residual == []
+    assert query.explain() == {"filter": expected, "residual": None}
+
+
+def test_residual():
+    rule = compile_rule(
+        "release_year >= 2000 and release_year % 2 == 0 and (watched or title == id)"
+    )
+    query = rule_query(rule)
+    assert query.filter == {"release_year": {"$gte": 2000}}
+    assert query.explain()["residual"] == (
+        "((release_year % 2) == 0) and (watched or (title == id))"
+    )
+    document = {"id": "a", "title": "a", "release_year": 2002, "watched": False}
+    assert query.matches(document)
+    assert not query.matches({**document, "id": "b"})
+    assert rule_query(rule) is query
+
+
+def test_untranslatable_rule():
+    query = rule_query(compile_rule("release_year % 2 == 0"))
+    assert query.filter == {}
+    assert query.explain() == {"filter": {}, "residual": "((release_year % 2) == 0)"}
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from api.entities.film import Film
+from api.repository.film.memory import MemoryFilmRepository
+from api.repository.film.single_flight import SingleFlightFilmRepository
+
+
+class SlowFilmRepository(MemoryFilmRepository):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def get_by_title(self, title, skip=0, limit=1000, after=None):
+        self.reads += 1
+        await asyncio.sleep(0)
+        return await super().get_by_title(title, skip, limit, after)
+
+
+@pytest.mark.asyncio
+async def test_identical_reads_run_once():
+    backend = SlowFilmRepository()
+    await backend.create(
+        Film(
+            film_id="a",
+            title="My Film",
+            description="My description",
+            release_year=1990,
+        )
+    )
+    repo = SingleFlightFilmRepository(backend)
+
+    first, second, other_page = await asyncio.gather(
+        repo.get_by_title("My Film"),
+        repo.get_by_title("My Film"),
+        repo.get_by_title("My Film", skip=1),
+    )
+
+    assert [film.id for film in first] == ["a"]
+    assert first == second and first is not second
+    assert other_page == []
+    assert backend.reads == 2
+    assert repo.reads.stats()["deduplicated"] == 1
+
+
+class StaleFilmRepository(MemoryFilmRepository):
+    def __init__(self):
+        super().__init__()
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def get_by_id(self, film_id):
+        # Reads the film, then answers late.
+        film = await super().get_by_id(film_id)
+        film = Film(
+            film_id=film.id,
+            title=film.title,
+            description=film.description,
+            release_year=film.release_year,
+            version=film.version,
+        )
+        self.started.set()
+        await self.release.wait()
+        return film
+
+
+@pytest.mark.asyncio
+async def test_read_after_write_doesnt_join_earlier_read():
+    backend = StaleFilmRepository()
+    await backend.create(
+        Film(
+            film_id="a",
+            title="My Film",
+            description="My description",
+            release_year=1990,
+        )
+    )
+    repo = SingleFlightFilmRepository(backend)
+
+    before = asyncio.ensure_future(repo.get_by_id("a"))
+    await backend.started.wait()
+    await repo.update("a", {"title": "New Title"})
+    after = asyncio.ensure_future(repo.get_by_id("a"))
+    await asyncio.sleep(0)
+    backend.release.set()
+
+    assert (await before).version == 1
+    film = await after
+    assert (film.title, film.version) == ("New Title", 2)
+    assert repo.reads.stats()["deduplicated"] == 0
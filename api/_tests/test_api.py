@@ -0,0 +1,47 @@
+from starlette.testclient import TestClient
+
+from api.api import create_app
+from api.repository.film.factory import innermost_repository, mongo_client_options
+from api.repository.film.memory import MemoryFilmRepository
+from api.settings import Settings, settings_instance
+
+
+def test_lifespan_opens_the_film_repository(monkeypatch):
+    settings = settings_instance()
+    monkeypatch.setattr(settings, "film_repository_backend", "memory")
+    monkeypatch.setattr(settings, "enable_metrics", False)
+    monkeypatch.setattr(settings, "film_cache_enabled", False)
+    app = create_app()
+
+    with TestClient(app=app) as client:
+        assert isinstance(
+            innermost_repository(app.state.film_repository), MemoryFilmRepository
+        )
+        response = client.post(
+            "/api/v1/films/",
+            json={
+                "title": "My Film",
+                "description": "My description",
+                "release_year": 1990,
+            },
+        )
+        assert response.status_code == 201
+        film_id = response.json()["id"]
+        assert client.get(f"/api/v1/films/{film_id}").json()["title"] == "My Film"
+
+
+def test_mongo_client_options():
+    settings = Settings(
+        enable_metrics=False,
+        mongo_max_pool_size=50,
+        mongo_min_pool_size=5,
+        mongo_max_idle_time_ms=60000,
+        mongo_compressors="zstd,zlib",
+    )
+    assert mongo_client_options(settings) == {
+        "maxPoolSize": 50,
+        "minPoolSize": 5,
+        "maxIdleTimeMS": 60000,
+        "waitQueueTimeoutMS": None,
+        "compressors": "zstd,zlib",
+    }
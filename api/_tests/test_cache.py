@@ -0,0 +1,64 @@
+from api.cache import TTLCache, caches
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction():
+    evicted = []
+    cache = TTLCache(
+        "test-lru", maxsize=2, on_evict=lambda key, value: evicted.append(key)
+    )
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert evicted == ["b"]
+    assert cache.get("b") is None
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiration():
+    timer = FakeTimer()
+    cache = TTLCache("test-ttl", maxsize=10, ttl=10, timer=timer)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=1)
+
+    timer.now = 5
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    timer.now = 11
+    assert "a" not in cache
+
+
+def test_max_bytes():
+    cache = TTLCache("test-bytes", maxsize=0, max_bytes=10, getsizeof=len)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.set("c", "1")
+
+    assert "a" not in cache
+    assert cache.bytes == 6
+    assert cache.pop("b") == "12345"
+    assert cache.bytes == 1
+
+
+def test_stats():
+    cache = TTLCache("test-stats", maxsize=10)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 2 / 3
+    assert cache in caches()
@@ -0,0 +1,171 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+# noinspection PyUnresolvedReferences
+from api._tests.fixtures import test_client
+from api.compression import (
+    CompressionMiddleware,
+    CompressionStats,
+    encoded_etag,
+    identity_etag,
+    negotiate,
+)
+
+BODY = b'{"title": "My Film", "description": "A film"}\n' * 100
+
+
+async def large(request):
+    return Response(BODY, media_type="application/json", headers={"ETag": '"1.2"'})
+
+
+async def small(request):
+    return Response(b'{"ok": true}', media_type="application/json")
+
+
+async def image(request):
+    return Response(BODY, media_type="image/png")
+
+
+async def stream(request):
+    async def lines():
+        for _ in range(10):
+            yield BODY[:470]
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def client(**kwargs) -> TestClient:
+    app = Starlette(
+        routes=[
+            Route("/large", large),
+            Route("/small", small),
+            Route("/image", image),
+            Route("/stream", stream),
+        ]
+    )
+    stats = CompressionStats()
+    app.add_middleware(CompressionMiddleware, stats=stats, **kwargs)
+    test_client = TestClient(app)
+    test_client.compression_stats = stats
+    return test_client
+
+
+def get(test_client: TestClient, path: str, accept_encoding: str = "gzip"):
+    # The raw stream isn't decoded by the client.
+    with test_client.stream(
+        "GET", path, headers={"Accept-Encoding": accept_encoding}
+    ) as response:
+        return response, b"".join(response.iter_raw())
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip", "gzip"),
+        ("deflate, gzip;q=0.5", "gzip"),
+        ("br;q=1, gzip;q=0.8", "gzip"),
+        ("*", "zstd"),
+        ("gzip;q=0", None),
+        ("*;q=0.5, gzip;q=0", "zstd"),
+        ("identity", None),
+        ("gzip;q=nope", None),
+    ],
+)
+def test_negotiate(accept_encoding, expected):
+    assert negotiate(accept_encoding, ("zstd", "gzip")) == expected
+
+
+def test_large_response_is_compressed():
+    test_client = client(minimum_size=500)
+    response, body = get(test_client, "/large")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(body)
+    assert gzip.decompress(body) == BODY
+    # The compressed body doesn't have the entity tag of the uncompressed one.
+    assert response.headers["etag"] == '"1.2-gzip"'
+
+    (stats,) = test_client.compression_stats.stats()
+    assert stats["responses"] == 1
+    assert stats["bytes_in"] == len(BODY)
+    assert stats["bytes_out"] == len(body)
+    assert stats["ratio"] > 10
+    assert stats["cpu_seconds"] >= 0
+
+
+@pytest.mark.parametrize(
+    "path, accept_encoding",
+    [("/small", "gzip"), ("/image", "gzip"), ("/large", "identity")],
+)
+def test_response_is_not_compressed(path, accept_encoding):
+    response, body = get(client(minimum_size=500), path, accept_encoding)
+    assert "content-encoding" not in response.headers
+    assert int(response.headers["content-length"]) == len(body)
+    if path == "/large":
+        assert response.headers["etag"] == '"1.2"'
+
+
+@pytest.mark.parametrize(
+    "etag, encoding, expected",
+    [
+        ('"1.2"', "gzip", '"1.2-gzip"'),
+        ('W/"1.2"', "br", 'W/"1.2-br"'),
+        ("malformed", "gzip", "malformed"),
+    ],
+)
+def test_encoded_etag(etag, encoding, expected):
+    assert encoded_etag(etag, encoding) == expected
+    assert identity_etag(expected) == etag
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_is_compressed_by_chunk():
+    app = CompressionMiddleware(
+        StreamingResponse(
+            (BODY[:470] for _ in range(10)), media_type="application/x-ndjson"
+        ),
+        stats=CompressionStats(),
+    )
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    messages = []
+
+    async def receive():
+        # The client stays connected.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = [decompressor.decompress(message["body"]) for message in messages[1:]]
+    # Every chunk is flushed, none is held back by the compressor.
+    assert chunks[:10] == [BODY[:470]] * 10
+    assert decompressor.eof
+
+
+def test_compressed_bodies_are_cached():
+    test_client = client(minimum_size=500, cache_max_entries=10)
+    first = get(test_client, "/large")[1]
+    second = get(test_client, "/large")[1]
+    assert first == second
+    (stats,) = test_client.compression_stats.stats()
+    assert stats["responses"] == 1
+    assert stats["cache_hits"] == 1
+
+
+def test_compression_stats(test_client):
+    response = test_client.get("/api/v1/stats/compression")
+    assert response.status_code == 200
+    assert "gzip" in [stats["encoding"] for stats in response.json()]
@@ -0,0 +1,76 @@
+import io
+
+import orjson
+import pytest
+
+from api.importer import import_films, read_chunks
+from api.repository.film.memory import MemoryFilmRepository
+
+FILMS = [
+    {"title": "spiderman", "year": 2018, "watched": False},
+    {"title": "avengers", "year": 2022, "watched": False},
+    {"title": "x", "year": 2023},
+    {"title": "randomfilm", "year": 2001, "watched": True},
+]
+
+
+def ndjson(rows) -> bytes:
+    return b"".join(orjson.dumps(row) + b"\n" for row in rows)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [orjson.dumps(FILMS), ndjson(FILMS), ndjson(FILMS).rstrip(b"\n")],
+)
+def test_read_chunks(data):
+    chunks = list(read_chunks(io.BytesIO(data), batch_size=3))
+    assert [(first, len(rows)) for first, rows in chunks] == [(1, 3), (4, 1)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("data", [orjson.dumps(FILMS), ndjson(FILMS)])
+async def test_import_films(data):
+    repo = MemoryFilmRepository()
+    rejections = []
+
+    report = await import_films(
+        io.BytesIO(data),
+        repo,
+        mapping={"release_year": "year"},
+        defaults={"description": "No description"},
+        batch_size=2,
+        concurrency=2,
+        on_rejection=lambda number, reason: rejections.append((number, reason)),
+    )
+
+    assert (report.rows, report.imported, report.rejected) == (4, 3, 1)
+    assert rejections == [
+        (3, "title: title's length must be greater than 3 characters.")
+    ]
+    films = {film.title: film async for film in repo.iter_all()}
+    assert sorted(films) == ["avengers", "randomfilm", "spiderman"]
+    assert films["randomfilm"].release_year == 2001
+    assert films["randomfilm"].watched
+    assert films["randomfilm"].description == "No description"
+
+
+@pytest.mark.asyncio
+async def test_import_films_with_workers():
+    repo = MemoryFilmRepository()
+    rows = [
+        {"id": str(i), "title": f"Film {i}", "description": "About", "year": 2000}
+        for i in range(50)
+    ]
+    data = ndjson(rows) + b"\nnot json\n"
+
+    report = await import_films(
+        io.BytesIO(data),
+        repo,
+        mapping={"release_year": "year"},
+        id_field="id",
+        batch_size=10,
+        workers=2,
+    )
+
+    assert (report.rows, report.imported, report.rejected) == (52, 50, 1)
+    assert (await repo.get_by_id("7")).title == "Film 7"
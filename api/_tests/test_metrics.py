@@ -0,0 +1,89 @@
+import pytest
+from prometheus_client import values
+from starlette.testclient import TestClient
+
+# noinspection PyUnresolvedReferences
+from api._tests.fixtures import test_client
+from api.api import create_app
+from api.handlers.film_v1 import authenticate_jwt, film_repository
+from api.metrics import (
+    CONTENT_TYPE,
+    MULTIPROCESS_DIR_ENV,
+    ApplicationMetrics,
+    application_metrics,
+)
+from api.repository.film.memory import MemoryFilmRepository
+from api.settings import settings_instance
+
+
+def test_render_multiprocess(monkeypatch, tmp_path):
+    monkeypatch.setenv(MULTIPROCESS_DIR_ENV, str(tmp_path))
+    # Two workers, writing their values to the shared directory.
+    for pid in (1, 2):
+        monkeypatch.setattr(
+            values, "ValueClass", values.MultiProcessValue(lambda pid=pid: pid)
+        )
+        metrics = ApplicationMetrics()
+        metrics.repository_duration.labels("create").observe(0.01)
+        metrics.http_requests_in_progress.inc()
+
+    lines = metrics.render().decode().splitlines()
+
+    assert (
+        'film_repository_operation_duration_seconds_count{operation="create"} 2.0'
+        in lines
+    )
+    assert "http_requests_in_progress 2.0" in lines
+
+
+@pytest.fixture()
+def metrics_client(monkeypatch):
+    monkeypatch.setattr(settings_instance(), "enable_metrics", True)
+    application_metrics.cache_clear()
+    app = create_app()
+    app.dependency_overrides[film_repository] = lambda: MemoryFilmRepository()
+    app.dependency_overrides[authenticate_jwt] = lambda: None
+    yield TestClient(app=app)
+    application_metrics.cache_clear()
+
+
+def test_metrics_endpoint(metrics_client):
+    assert metrics_client.get("/api/v1/films/unknown").status_code == 404
+    assert (
+        metrics_client.get("/api/v1/films/", params={"title": "My Film"}).status_code
+        == 200
+    )
+    assert metrics_client.get("/nowhere").status_code == 404
+
+    response = metrics_client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    lines = response.text.splitlines()
+    assert (
+        'http_requests_total{method="GET",route="/api/v1/films/{film_id}",status="4xx"} 1.0'
+        in lines
+    )
+    assert (
+        'http_requests_total{method="GET",route="/api/v1/films/",status="2xx"} 1.0'
+        in lines
+    )
+    assert (
+        'http_requests_total{method="GET",route="unmatched",status="4xx"} 1.0' in lines
+    )
+    # Label sets of the routes are created before their first request.
+    assert (
+        'http_requests_total{method="DELETE",route="/api/v1/films/{film_id}",status="2xx"} 0.0'
+        in lines
+    )
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/api/v1/films/"} 1.0'
+        in lines
+    )
+    # The metrics request itself is in progress while they are rendered.
+    assert "http_requests_in_progress 1.0" in lines
+    assert "mongodb_pool_connections 0.0" in lines
+
+
+def test_metrics_endpoint_disabled(test_client):
+    assert test_client.get("/metrics").status_code == 404
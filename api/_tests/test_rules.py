@@ -0,0 +1,33 @@
+import pytest
+
+from api.rules import RuleError, compile_rule, compiled_rules, normalize
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("  watched  ==   true ", "watched == true"),
+        ('title == "My   Film"\n and  watched', 'title == "My   Film" and watched'),
+        ("title == 'a \\'  b'  or  watched", "title == 'a \\'  b' or watched"),
+    ],
+)
+def test_normalize(text, expected):
+    assert normalize(text) == expected
+
+
+def test_compiled_rules_are_cached():
+    cache = compiled_rules()
+    hits = cache.hits
+    rule = compile_rule("release_year  >= 2000")
+    assert compile_rule(" release_year >= 2000") is rule
+    assert cache.hits == hits + 1
+    assert rule.matches({"release_year": 2001})
+    assert not rule.matches({"release_year": 1999})
+
+
+@pytest.mark.parametrize(
+    "text", ["release_year >=", "unknown == 1", 'release_year > "2000"']
+)
+def test_invalid_rules(text):
+    with pytest.raises(RuleError):
+        compile_rule(text)
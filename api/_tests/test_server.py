@@ -0,0 +1,180 @@
+import os
+import signal
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from api import server
+from api.metrics import MULTIPROCESS_DIR_ENV
+from api.server import Supervisor, bind_socket, worker_config, worker_count
+from api.settings import Settings
+
+
+@pytest.mark.parametrize(
+    "backend,workers,expected",
+    [
+        ("mongo", 3, 3),
+        ("mongo", 0, os.cpu_count() or 1),
+        ("memory", 4, 1),
+        ("columnar", 0, 1),
+    ],
+)
+def test_worker_count(backend, workers, expected):
+    settings = Settings(film_repository_backend=backend, server_workers=workers)
+    assert worker_count(settings) == expected
+
+
+def test_worker_count_warns_about_film_cache(caplog):
+    settings = Settings(server_workers=2, film_cache_enabled=True)
+    assert worker_count(settings) == 2
+    assert "own film cache" in caplog.text
+
+
+def test_bind_socket_reuse_port():
+    first = bind_socket("127.0.0.1", 0, reuse_port=True, backlog=8)
+    port = first.getsockname()[1]
+    # Every worker listens on its own socket bound to the same port.
+    second = bind_socket("127.0.0.1", port, reuse_port=True, backlog=8)
+    try:
+        assert second.getsockname()[1] == port
+        assert second.get_inheritable()
+    finally:
+        first.close()
+        second.close()
+
+    first = bind_socket("127.0.0.1", 0, reuse_port=False, backlog=8)
+    try:
+        with pytest.raises(OSError):
+            bind_socket("127.0.0.1", first.getsockname()[1], reuse_port=False)
+    finally:
+        first.close()
+
+
+def test_worker_config():
+    settings = Settings(
+        server_loop="asyncio",
+        server_http="h11",
+        server_backlog=128,
+        server_keep_alive_timeout=10,
+    )
+    config = worker_config(settings, max_requests=0)
+    assert (config.loop, config.http, config.backlog) == ("asyncio", "h11", 128)
+    # The workers create the application, the supervisor never imports it.
+    assert (config.app, config.factory) == ("api.api:create_app", True)
+    assert config.timeout_keep_alive == 10
+    assert config.limit_max_requests is None
+    assert worker_config(settings, max_requests=100).limit_max_requests == 100
+
+
+def test_max_requests_jitter():
+    supervisor = Supervisor(
+        Settings(server_max_requests=100, server_max_requests_jitter=10)
+    )
+    assert {supervisor._max_requests() for _ in range(200)} <= set(range(100, 111))
+    # Workers aren't recycled without a maximum, whatever the jitter.
+    supervisor = Supervisor(
+        Settings(server_max_requests=0, server_max_requests_jitter=10)
+    )
+    assert supervisor._max_requests() == 0
+
+
+def _listens(pid: int, port: int) -> bool:
+    """
+    Tells whether the process `pid` has a socket listening on `port`.
+    """
+    inodes = set()
+    for fd in os.listdir(f"/proc/{pid}/fd"):
+        try:
+            target = os.readlink(f"/proc/{pid}/fd/{fd}")
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            inodes.add(target[len("socket:[") : -1])
+    with open("/proc/net/tcp") as f:
+        for line in f.readlines()[1:]:
+            fields = line.split()
+            local_port = int(fields[1].rsplit(":", 1)[1], 16)
+            if local_port == port and fields[3] == "0A" and fields[9] in inodes:
+                return True
+    return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="requires procfs")
+@pytest.mark.parametrize("reuse_port", [True, False])
+def test_supervisor_serves_with_two_workers(monkeypatch, reuse_port):
+    # The workers hold a catalogue each, no MongoDB server is needed. They
+    # only serve the memory backend because they get these settings, their
+    # environment selects the mongo one.
+    monkeypatch.setattr(server, "IN_PROCESS_BACKENDS", ())
+    settings = Settings(
+        film_repository_backend="memory",
+        enable_metrics=True,
+        server_host="127.0.0.1",
+        server_port=0,
+        server_workers=2,
+        server_reuse_port=reuse_port,
+        server_graceful_timeout=10,
+    )
+    supervisor = Supervisor(settings)
+    results = {}
+
+    def drive():
+        try:
+            deadline = time.monotonic() + 60
+            while len(supervisor._ready) < 2 or not all(
+                ready.is_set() for ready in list(supervisor._ready.values())
+            ):
+                assert time.monotonic() < deadline, "the workers didn't start"
+                time.sleep(0.1)
+            pids = [process.pid for process in supervisor._workers.values()]
+            results["listening"] = [_listens(pid, supervisor.port) for pid in pids]
+            results["metric_files"] = {f"counter_{pid}.db" for pid in pids} <= set(
+                os.listdir(os.environ[MULTIPROCESS_DIR_ENV])
+            )
+            url = f"http://127.0.0.1:{supervisor.port}/api/v1/films/statistics/watched"
+            results["statuses"] = [
+                urllib.request.urlopen(url, timeout=10).status for _ in range(10)
+            ]
+            results["metrics"] = [
+                urllib.request.urlopen(
+                    f"http://127.0.0.1:{supervisor.port}/metrics", timeout=10
+                )
+                .read()
+                .decode()
+                .splitlines()
+                for _ in range(4)
+            ]
+        except BaseException as e:
+            results["error"] = e
+        finally:
+            supervisor._stopping.set()
+
+    handlers = {
+        signum: signal.getsignal(signum)
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP)
+    }
+    driver = threading.Thread(target=drive)
+    driver.start()
+    try:
+        supervisor.run()
+    finally:
+        driver.join()
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+
+    assert "error" not in results, results["error"]
+    assert results["listening"] == [True, True]
+    assert results["statuses"] == [200] * 10
+    # Whichever worker serves them, the metrics count the requests of both.
+    requests = (
+        'http_requests_total{method="GET",'
+        'route="/api/v1/films/statistics/watched",status="2xx"} 10.0'
+    )
+    assert all(requests in lines for lines in results["metrics"])
+    assert results["metric_files"]
+    assert MULTIPROCESS_DIR_ENV not in os.environ
+    assert not supervisor._workers or all(
+        not process.is_alive() for process in supervisor._workers.values()
+    )
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from api.single_flight import SingleFlight
+
+
+class Backend:
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.error = None
+
+    async def read(self, value):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return value
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_deduplicated():
+    backend = Backend()
+    group = SingleFlight("test")
+    tasks = [
+        asyncio.ensure_future(group.do("a", lambda: backend.read("A")))
+        for _ in range(3)
+    ]
+    other = asyncio.ensure_future(group.do("b", lambda: backend.read("B")))
+    await asyncio.sleep(0)
+    assert group.stats()["in_flight"] == 2
+    backend.release.set()
+
+    assert await asyncio.gather(*tasks, other) == ["A", "A", "A", "B"]
+    assert backend.calls == 2
+    assert group.stats() == {
+        "name": "test",
+        "calls": 4,
+        "executions": 2,
+        "deduplicated": 2,
+        "in_flight": 0,
+    }
+
+    # Results aren't kept once the call is done.
+    assert await group.do("a", lambda: backend.read("A2")) == "A2"
+    assert backend.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_not_kept():
+    backend = Backend()
+    backend.error = RuntimeError("down")
+    group = SingleFlight("test")
+    tasks = [
+        asyncio.ensure_future(group.do("a", lambda: backend.read("A")))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    backend.release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert backend.calls == 1
+
+    backend.error = None
+    assert await group.do("a", lambda: backend.read("A")) == "A"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_doesnt_cancel_the_call():
+    backend = Backend()
+    group = SingleFlight("test")
+    cancelled = asyncio.ensure_future(group.do("a", lambda: backend.read("A")))
+    other = asyncio.ensure_future(group.do("a", lambda: backend.read("A")))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    backend.release.set()
+
+    assert await other == "A"
+    assert cancelled.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_with_its_last_caller():
+    backend = Backend()
+    group = SingleFlight("test")
+    caller = asyncio.ensure_future(group.do("a", lambda: backend.read("A")))
+    await asyncio.sleep(0)
+    caller.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await caller
+    await asyncio.sleep(0)
+    assert group.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_caller_after_cancellation_starts_a_new_call():
+    backend = Backend()
+    group = SingleFlight("test")
+    caller = asyncio.ensure_future(group.do("a", lambda: backend.read("A")))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.sleep(0)
+    # The cancelled call hasn't finished yet, a new caller doesn't join it.
+    assert group.stats()["in_flight"] == 0
+    other = asyncio.ensure_future(group.do("a", lambda: backend.read("A2")))
+    await asyncio.sleep(0)
+    backend.release.set()
+
+    assert await other == "A2"
+    assert backend.calls == 2
+    with pytest.raises(asyncio.CancelledError):
+        await caller
@@ -5,13 +5,52 @@
 """
 
 
+import contextlib
+
 from fastapi import FastAPI
 
-from api.handlers import demo, film_v1
+from api.compression import CompressionMiddleware
+from api.handlers import demo, film_v1, metrics, stats
+from api.metrics import MetricsMiddleware, application_metrics
+from api.repository.film.factory import open_film_repository
+from api.settings import settings_instance
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the film repository before the first request is served and closes
+    it once the application stops.
+    """
+    app.state.film_repository = await open_film_repository(settings_instance())
+    try:
+        yield
+    finally:
+        await app.state.film_repository.close()
 
 
 def create_app():
-    app = FastAPI(docs_url="/", redoc_url="/docs")
+    app = FastAPI(docs_url="/", redoc_url="/docs", lifespan=lifespan)
     app.include_router(demo.router)
     app.include_router(film_v1.router)
+    app.include_router(stats.router)
+    settings = settings_instance()
+    if settings.compression_enabled:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.compression_minimum_size,
+            encodings=[
+                encoding.strip()
+                for encoding in settings.compression_encodings.split(",")
+                if encoding.strip()
+            ],
+            cache_max_entries=settings.compression_cache_max_entries,
+            cache_max_bytes=settings.compression_cache_max_bytes,
+        )
+    # Added last so that it measures the compression too.
+    if settings.enable_metrics:
+        app.include_router(metrics.router)
+        app.add_middleware(
+            MetricsMiddleware, metrics=application_metrics(), routes=app.routes
+        )
     return app
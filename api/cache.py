@@ -0,0 +1,159 @@
+"""
+In process caches shared by the application.
+
+Every cache registers itself by name so its statistics can be reported,
+see `caches()`.
+"""
+
+import collections
+import time
+import typing
+import weakref
+
+_registry: "weakref.WeakValueDictionary[str, TTLCache]" = weakref.WeakValueDictionary()
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    TTLCache is a bounded mapping whose entries expire after a time to live.
+
+    Once the cache holds `maxsize` entries, or `max_bytes` bytes as measured by
+    `getsizeof`, the least recently used entries are evicted. `on_evict` is
+    called with the key and the value of every entry dropped because of its
+    size or its age, entries removed with `pop` or `clear` are not reported.
+
+    The cache isn't thread safe, it is meant to be used from the event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl: typing.Optional[float] = None,
+        max_bytes: int = 0,
+        getsizeof: typing.Optional[typing.Callable[[typing.Any], int]] = None,
+        on_evict: typing.Optional[
+            typing.Callable[[typing.Any, typing.Any], None]
+        ] = None,
+        timer: typing.Callable[[], float] = time.monotonic,
+    ):
+        """
+        Parameters
+        ----------
+        name: str
+            The name the cache statistics are reported under.
+        maxsize: int
+            The maximum number of entries, 0 means no limit.
+        ttl: float
+            The default time to live of an entry in seconds, None means entries
+            don't expire.
+        max_bytes: int
+            The maximum size of the values, 0 means no limit.
+        getsizeof: Callable
+            Returns the size of a value in bytes, required with `max_bytes`.
+        on_evict: Callable
+            Called with the key and the value of every evicted entry.
+        timer: Callable
+            The clock used for expiration.
+        """
+        if max_bytes and getsizeof is None:
+            raise ValueError("getsizeof is required to bound a cache by bytes")
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._getsizeof = getsizeof
+        self._on_evict = on_evict
+        self._timer = timer
+        # key -> (value, expiration time or None, size in bytes)
+        self._data: "collections.OrderedDict[typing.Any, tuple]" = (
+            collections.OrderedDict()
+        )
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _registry[name] = self
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count: bool = True):
+        """
+        Returns the value cached for `key`, `default` if there is none or if it
+        has expired.
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            value, expires_at, _ = entry
+            if expires_at is None or expires_at > self._timer():
+                self._data.move_to_end(key)
+                if count:
+                    self.hits += 1
+                return value
+            self._evict(key)
+        if count:
+            self.misses += 1
+        return default
+
+    def set(self, key, value, ttl: typing.Optional[float] = None):
+        """
+        Caches `value` for `key`, `ttl` overrides the default time to live.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else self._timer() + ttl
+        size = self._getsizeof(value) if self._getsizeof is not None else 0
+        if key in self._data:
+            self.bytes -= self._data.pop(key)[2]
+        self._data[key] = (value, expires_at, size)
+        self.bytes += size
+        while self._data and (
+            (self.maxsize and len(self._data) > self.maxsize)
+            or (self.max_bytes and self.bytes > self.max_bytes)
+        ):
+            self._evict(next(iter(self._data)))
+
+    def pop(self, key, default=None):
+        """
+        Removes the entry of `key` and returns its value.
+        """
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return default
+        self.bytes -= entry[2]
+        return entry[0]
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def _evict(self, key):
+        value, _, size = self._data.pop(key)
+        self.bytes -= size
+        self.evictions += 1
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def caches() -> typing.List[TTLCache]:
+    """
+    Returns the caches alive in this process.
+    """
+    return list(_registry.values())
@@ -0,0 +1,392 @@
+"""
+Compression of the HTTP responses.
+
+`CompressionMiddleware` compresses the responses with the best encoding the
+client accepts among the available ones: gzip always, br if the `brotli`
+package is installed and zstd if the `zstandard` package is installed.
+Streamed responses are compressed chunk by chunk and flushed, so the client
+gets every chunk as soon as it is produced. The `ETag` of a compressed
+response gets the encoding as a suffix, see `encoded_etag`.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+import typing
+import zlib
+from functools import lru_cache
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from api.cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Media types worth compressing, other responses are sent as they are.
+COMPRESSIBLE_MEDIA_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+
+# Bodies from this size on are compressed off the event loop, the
+# compressors release the GIL.
+OFFLOAD_SIZE = 256 * 1024
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        # wbits 16 + 15 writes the gzip header and trailer.
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self, chunk: bytes = b"") -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self, chunk: bytes = b"") -> bytes:
+        return self._compressor.process(chunk) + self._compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self, chunk: bytes = b"") -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush()
+
+
+# encoding -> (stream factory, default level)
+_ENCODERS: typing.Dict[str, typing.Tuple[typing.Callable, int]] = {
+    "gzip": (_GzipStream, 6)
+}
+if brotli is not None:
+    _ENCODERS["br"] = (_BrotliStream, 4)
+if zstandard is not None:
+    _ENCODERS["zstd"] = (_ZstdStream, 3)
+
+
+def available_encodings() -> typing.List[str]:
+    return list(_ENCODERS)
+
+
+# The suffix `encoded_etag` gives to the entity tags.
+_ENCODED_ETAG_SUFFIX = re.compile(r'-(gzip|br|zstd)"$')
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    Returns the entity tag of the response whose uncompressed body has the
+    entity tag `etag` once compressed with `encoding`, e.g. `"1.2-gzip"` for
+    `"1.2"`. The compressed bytes differ from the uncompressed ones, they
+    can't share a strong entity tag.
+
+    Refer - https://www.rfc-editor.org/rfc/rfc9110#name-etag
+    """
+    if not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def identity_etag(etag: str) -> str:
+    """
+    Returns the entity tag `etag` was made from by `encoded_etag`, `etag`
+    itself if it isn't the tag of a compressed response.
+    """
+    return _ENCODED_ETAG_SUFFIX.sub('"', etag)
+
+
+@lru_cache(maxsize=256)
+def negotiate(
+    accept_encoding: str, preference: typing.Tuple[str, ...]
+) -> typing.Optional[str]:
+    """
+    Returns the encoding of `preference` the `Accept-Encoding` header ranks
+    best, ties go to the first one of `preference`. None means identity.
+
+    Refer - https://www.rfc-editor.org/rfc/rfc9110#name-accept-encoding
+    """
+    weights: typing.Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, parameters = item.strip().partition(";")
+        coding = coding.strip().lower()
+        weight = 1.0
+        parameters = parameters.strip()
+        if parameters.startswith("q="):
+            try:
+                weight = float(parameters[2:])
+            except ValueError:
+                weight = 0.0
+        if coding:
+            weights[coding] = weight
+    best, best_weight = None, 0.0
+    for encoding in preference:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class _EncodingStats:
+    __slots__ = ("responses", "bytes_in", "bytes_out", "cpu_seconds", "cache_hits")
+
+    def __init__(self):
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        self.cache_hits = 0
+
+
+class CompressionStats:
+    """
+    CompressionStats counts the bytes compressed by each encoding and the CPU
+    time spent compressing them.
+    """
+
+    def __init__(self):
+        self._encodings: typing.Dict[str, _EncodingStats] = {
+            encoding: _EncodingStats() for encoding in _ENCODERS
+        }
+
+    def __getitem__(self, encoding: str) -> _EncodingStats:
+        return self._encodings[encoding]
+
+    def stats(self) -> typing.List[dict]:
+        return [
+            {
+                "encoding": encoding,
+                "responses": stats.responses,
+                "cache_hits": stats.cache_hits,
+                "bytes_in": stats.bytes_in,
+                "bytes_out": stats.bytes_out,
+                "ratio": stats.bytes_in / stats.bytes_out if stats.bytes_out else 0.0,
+                "cpu_seconds": stats.cpu_seconds,
+            }
+            for encoding, stats in self._encodings.items()
+        ]
+
+
+@lru_cache()
+def compression_stats() -> CompressionStats:
+    """
+    The compression statistics of the process.
+    """
+    return CompressionStats()
+
+
+def _compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_MEDIA_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    CompressionMiddleware is an ASGI middleware compressing the responses
+    whose body is at least `minimum_size` bytes, and every streamed response.
+
+    With `cache_max_entries` set the compressed bodies are kept by encoding
+    and digest of the body, identical responses, such as the popular pages of
+    a list, are then compressed once.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        encodings: typing.Sequence[str] = ("zstd", "br", "gzip"),
+        levels: typing.Optional[typing.Dict[str, int]] = None,
+        cache_max_entries: int = 0,
+        cache_max_bytes: int = 0,
+        stats: typing.Optional[CompressionStats] = None,
+    ):
+        """
+        Parameters
+        ----------
+        app: ASGIApp
+            The wrapped application.
+        minimum_size: int
+            Smaller bodies aren't worth compressing and are sent as they are.
+        encodings: Sequence[str]
+            The encodings offered by order of preference, the ones which aren't
+            available are ignored.
+        levels: Dict[str, int]
+            The compression level of each encoding, defaults to levels trading
+            a little ratio for speed.
+        cache_max_entries: int
+            The maximum number of compressed bodies kept, 0 disables the cache.
+        cache_max_bytes: int
+            The maximum number of bytes of compressed bodies kept, 0 means no
+            limit.
+        stats: CompressionStats
+            Where the compression statistics are counted.
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encodings = tuple(
+            encoding for encoding in encodings if encoding in _ENCODERS
+        )
+        self.levels = {
+            encoding: (levels or {}).get(encoding, default)
+            for encoding, (_, default) in _ENCODERS.items()
+        }
+        self.cache = None
+        if cache_max_entries:
+            self.cache = TTLCache(
+                "compressed_bodies",
+                maxsize=cache_max_entries,
+                max_bytes=cache_max_bytes,
+                getsizeof=len,
+            )
+        self.stats = stats if stats is not None else compression_stats()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        encoding = None
+        if accept_encoding:
+            encoding = negotiate(accept_encoding, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self, encoding, send).run(scope, receive)
+
+    def _stream(self, encoding: str):
+        return _ENCODERS[encoding][0](self.levels[encoding])
+
+    def compress_chunk(self, encoding: str, stream, chunk: bytes, last: bool) -> bytes:
+        start = time.thread_time()
+        compressed = stream.finish(chunk) if last else stream.compress(chunk)
+        stats = self.stats[encoding]
+        stats.cpu_seconds += time.thread_time() - start
+        stats.bytes_in += len(chunk)
+        stats.bytes_out += len(compressed)
+        return compressed
+
+    def _compress_body(self, encoding: str, body: bytes) -> typing.Tuple[bytes, float]:
+        start = time.thread_time()
+        compressed = self._stream(encoding).finish(body)
+        return compressed, time.thread_time() - start
+
+    async def compress_body(self, encoding: str, body: bytes) -> bytes:
+        stats = self.stats[encoding]
+        key = None
+        if self.cache is not None:
+            key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+            compressed = self.cache.get(key)
+            if compressed is not None:
+                stats.cache_hits += 1
+                return compressed
+        if len(body) >= OFFLOAD_SIZE:
+            compressed, cpu_seconds = await asyncio.get_running_loop().run_in_executor(
+                None, self._compress_body, encoding, body
+            )
+        else:
+            compressed, cpu_seconds = self._compress_body(encoding, body)
+        stats.responses += 1
+        stats.cpu_seconds += cpu_seconds
+        stats.bytes_in += len(body)
+        stats.bytes_out += len(compressed)
+        if key is not None:
+            self.cache.set(key, compressed)
+        return compressed
+
+
+class _CompressingResponder:
+    """
+    Compresses the messages of a single response.
+    """
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        # None until the first body message tells if the response is
+        # compressed, then the compression stream or False.
+        self.stream = None
+
+    async def run(self, scope, receive):
+        await self.middleware.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body message, the headers depend on it.
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.stream is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if (
+                self.start_message["status"] < 200
+                or self.start_message["status"] in (204, 304)
+                or not _compressible(headers)
+                or (not more_body and len(body) < self.middleware.minimum_size)
+            ):
+                self.stream = False
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["ETag"], self.encoding)
+            if not more_body:
+                # The whole body is known, see `compress_body`.
+                self.stream = False
+                body = await self.middleware.compress_body(self.encoding, body)
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            self.stream = self.middleware._stream(self.encoding)
+            self.middleware.stats[self.encoding].responses += 1
+            await self.send(self.start_message)
+        elif self.stream is False:
+            await self.send(message)
+            return
+
+        compressed = self.middleware.compress_chunk(
+            self.encoding, self.stream, body, last=not more_body
+        )
+        await self.send(
+            {"type": "http.response.body", "body": compressed, "more_body": more_body}
+        )
@@ -36,11 +36,79 @@ class FilmCreatedResponse(BaseModel):
     id: str
 
 
+class BulkItemError(BaseModel):
+    """
+    BulkItemError reports why the film at `index` of a bulk request was rejected.
+    """
+
+    index: int
+    message: str
+
+
+class FilmsBulkCreatedResponse(BaseModel):
+    """
+    FilmsBulkCreatedResponse is returned by the bulk create endpoint, `ids` holds
+    the id of each created film in request order (None for rejected films).
+    """
+
+    ids: typing.List[typing.Optional[str]]
+    errors: typing.List[BulkItemError]
+
+
 class FilmResponse(FilmCreatedResponse):
     title: str
     description: str
     release_year: int
     watched: bool
+    # Incremented by every write, 0 for films stored before versions existed.
+    version: int = 0
+
+
+class FilmsBatchResponse(BaseModel):
+    """
+    FilmsBatchResponse is returned by the batched lookup, `films` holds the
+    films found in request order and `missing` the ids which weren't found.
+    """
+
+    films: typing.List[FilmResponse]
+    missing: typing.List[str]
+
+
+class ReleaseYearStatisticsResponse(BaseModel):
+    """
+    ReleaseYearStatisticsResponse counts the films released in a year and
+    their distinct titles.
+    """
+
+    release_year: int
+    films: int
+    titles: int
+
+
+class WatchedStatisticsResponse(BaseModel):
+    """
+    WatchedStatisticsResponse counts the watched and unwatched films,
+    `watched_ratio` is the share of watched films, 0 without films.
+    """
+
+    watched: int
+    unwatched: int
+    watched_ratio: float
+
+
+class FilterCountResponse(BaseModel):
+    count: int
+
+
+class FilterExplainResponse(BaseModel):
+    """
+    FilterExplainResponse describes how a rule is evaluated, `filter` is the
+    part of the rule evaluated by the storage (a MongoDB query) and `residual`
+    the part evaluated in process, None if there is none.
+    """
+
+    filter: typing.Optional[dict]
+    residual: typing.Optional[str]
 
 
 class FilmUpdateBody(BaseModel):
@@ -0,0 +1,32 @@
+import base64
+import binascii
+import typing
+
+import orjson
+
+
+def encode_cursor(title: str, film_id: str) -> str:
+    """
+    Encodes the (title, id) key of the last film of a page into an opaque
+    continuation token.
+    """
+    return base64.urlsafe_b64encode(orjson.dumps([title, film_id])).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> typing.Tuple[str, str]:
+    """
+    Decodes a continuation token created by `encode_cursor`.
+
+    Raises ValueError if the token is malformed.
+    """
+    try:
+        key = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, orjson.JSONDecodeError):
+        raise ValueError("invalid cursor")
+    if (
+        not isinstance(key, list)
+        or len(key) != 2
+        or not all(isinstance(part, str) for part in key)
+    ):
+        raise ValueError("invalid cursor")
+    return key[0], key[1]
@@ -0,0 +1,44 @@
+from pydantic import BaseModel
+
+
+class CacheStatsResponse(BaseModel):
+    """
+    CacheStatsResponse reports the usage of an in process cache.
+    """
+
+    name: str
+    size: int
+    bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_ratio: float
+
+
+class SingleFlightStatsResponse(BaseModel):
+    """
+    SingleFlightStatsResponse reports how many calls a single flight group
+    saved, `deduplicated` calls waited for an identical call in flight.
+    """
+
+    name: str
+    calls: int
+    executions: int
+    deduplicated: int
+    in_flight: int
+
+
+class CompressionStatsResponse(BaseModel):
+    """
+    CompressionStatsResponse reports the work of a response encoding, `ratio`
+    is the number of bytes in per byte out and `cpu_seconds` the CPU time
+    spent compressing.
+    """
+
+    encoding: str
+    responses: int
+    cache_hits: int
+    bytes_in: int
+    bytes_out: int
+    ratio: float
+    cpu_seconds: float
@@ -1,4 +1,35 @@
+import sys
+
+# Release years are shared by many films, keeping a single int object per
+# year saves an allocation per film (ints above 256 aren't cached by CPython).
+_release_years: dict = {}
+
+
+def intern_value(value):
+    """
+    Returns a shared instance of `value` for titles and release years.
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    if type(value) is int:
+        return _release_years.setdefault(value, value)
+    return value
+
+
 class Film:
+    # No per instance `__dict__`, the attributes are stored in fixed slots.
+    # This is what the memory repository keeps for every film, see
+    # `benchmarks/film_memory.py` for the bytes per film.
+    __slots__ = (
+        "_id",
+        "_title",
+        "_description",
+        "_release_year",
+        "_watched",
+        "_version",
+        "_generation",
+    )
+
     def __init__(
         self,
         *,
@@ -6,7 +37,9 @@ class Film:
         title: str,
         description: str,
         release_year: int,
-        watched: bool = False
+        watched: bool = False,
+        version: int = 1,
+        generation: int = 0
     ):
         """
         Parameters
@@ -21,6 +54,13 @@ class Film:
             The release year of the film.
         watched: bool
             Boolean that indicates if the film has been watched.
+        version: int
+            The revision of the film, repositories increment it on every write.
+        generation: int
+            Set by repositories when the film is created, it tells the film
+            apart from a film created before with the same id and deleted,
+            whose versions started at 1 as well. 0 for films created before
+            generations existed.
 
         Return
         ------
@@ -35,10 +75,12 @@ class Film:
         if film_id is None:
             raise ValueError("Film id is required!")
         self._id = film_id
-        self._title = title
+        self._title = intern_value(title)
         self._description = description
-        self._release_year = release_year
+        self._release_year = intern_value(release_year)
         self._watched = watched
+        self._version = version
+        self._generation = generation
 
     @property
     def id(self) -> str:
@@ -60,6 +102,14 @@ class Film:
     def watched(self) -> bool:
         return self._watched
 
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
     def __eq__(self, o: object) -> bool:
         """
         NOTE :
@@ -67,6 +117,9 @@ class Film:
         because each object of a class is a new object and will have a different
         `id()`.
 
+        The version and the generation aren't compared, they tell revisions of
+        a film apart but aren't part of the film itself.
+
         Args:
             o:
 
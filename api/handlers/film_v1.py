@@ -1,28 +1,52 @@
 import dataclasses
+import hashlib
+import re
+import time
 import typing
 import uuid
 from collections import namedtuple
 from functools import lru_cache
 
+import orjson
+import rule_engine
 from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from jose import jwt
+from jose import JWTError, jwk, jwt
+from pydantic import ValidationError
 from starlette import status
 from starlette.datastructures import Headers
-from starlette.responses import JSONResponse, Response
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
+from api.cache import TTLCache
+from api.compression import identity_etag
 from api.dto.detail import DetailResponse
 from api.dto.film import (
+    BulkItemError,
     CreateFilmBody,
     FilmCreatedResponse,
     FilmResponse,
+    FilmsBatchResponse,
+    FilmsBulkCreatedResponse,
     FilmUpdateBody,
+    FilterCountResponse,
+    FilterExplainResponse,
+    ReleaseYearStatisticsResponse,
+    WatchedStatisticsResponse,
 )
+from api.dto.pagination import decode_cursor, encode_cursor
 from api.entities.film import Film
-from api.repository.film.abstractions import FilmRepository, RepositoryException
-from api.repository.film.mongo import MongoFilmRepository
-from api.settings import Settings, settings_instance
+from api.repository.film.abstractions import (
+    FilmNotFoundException,
+    FilmRepository,
+    RepositoryException,
+    SearchMode,
+    VersionConflictException,
+    film_document,
+)
+from api.rules import RuleError, compile_rule
+from api.settings import settings_instance
 
 http_basic = HTTPBasic()
 
@@ -44,15 +68,25 @@ def basic_authentication(credentials: HTTPBasicCredentials = Depends(http_basic)
 router = APIRouter(prefix="/api/v1/films", tags=["films"])
 
 
-@lru_cache()
-def film_repository(settings: Settings = Depends(settings_instance)):
+def film_repository(request: Request) -> FilmRepository:
     """
     Film repository instance to be used as a Fast API dependency.
+
+    The repository is opened and closed by the application lifespan, see
+    `api.api.lifespan`.
     """
-    return MongoFilmRepository(
-        connection_string=settings.mongo_connection_string,
-        database=settings.mongo_database_name,
-    )
+    return request.app.state.film_repository
+
+
+Pagination = namedtuple("Pagination", ["skip", "limit", "after"])
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Maximum number of ids of a batched lookup.
+BATCH_LOOKUP_MAX_IDS = 1000
+
+# Maximum length of a filter rule.
+RULE_MAX_LENGTH = 2000
 
 
 def pagination_params(
@@ -63,9 +97,39 @@ def pagination_params(
         description="The limit of the number of items returned",
         le=1000,
     ),
+    cursor: typing.Union[str, None] = Query(
+        None,
+        title="Cursor",
+        description=f"The continuation token returned in the `{NEXT_CURSOR_HEADER}` "
+        "header of the previous page. Pages read with a cursor cost the same "
+        "whatever their depth, `skip` is kept for backward compatibility.",
+    ),
 ):
-    Pagination = namedtuple("Pagination", ["skip", "limit"])
-    return Pagination(skip=skip, limit=limit)
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="invalid cursor"
+            )
+    return Pagination(skip=skip, limit=limit, after=after)
+
+
+def _films_json_response(documents: typing.List[dict], limit: int) -> Response:
+    """
+    Serializes film documents (see `film_document`) straight to JSON with orjson.
+
+    FastAPI neither validates nor encodes a returned `Response`, so no
+    `FilmResponse` is built on this path while the `response_model` of the
+    route still documents the schema. The continuation token of the next page
+    is set if there may be one.
+    """
+    response = Response(orjson.dumps(documents), media_type="application/json")
+    if limit and len(documents) == limit:
+        last = documents[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last["title"], last["id"])
+    return response
 
 
 @router.post("/", status_code=201, response_model=FilmCreatedResponse)
@@ -90,13 +154,484 @@ async def post_create_film(
     return FilmCreatedResponse(id=film_id)
 
 
+# Number of validated films handed to `FilmRepository.create_many` at once by
+# the bulk create endpoint.
+BULK_CREATE_CHUNK_SIZE = 1000
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Streamed NDJSON lines are grouped in chunks of about this many bytes so a
+# large listing isn't sent as one ASGI message per film.
+NDJSON_CHUNK_SIZE = 64 * 1024
+
+
+async def _ndjson_documents(
+    documents: typing.AsyncIterator[dict],
+) -> typing.AsyncIterator[bytes]:
+    """
+    Encodes film documents as newline delimited `FilmResponse` JSON objects.
+    """
+    chunk = bytearray()
+    async for document in documents:
+        chunk += orjson.dumps(document)
+        chunk += b"\n"
+        if len(chunk) >= NDJSON_CHUNK_SIZE:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+async def _bulk_items(request: Request) -> typing.AsyncIterator[typing.Any]:
+    """
+    Yields the items of a bulk request body.
+
+    NDJSON bodies are decoded line by line while they are streamed in, items
+    which are not valid JSON are yielded as `orjson.JSONDecodeError` so they can
+    be reported along with the other per item errors.
+    """
+    if request.headers.get("content-type", "").startswith(NDJSON_MEDIA_TYPE):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    try:
+                        yield orjson.loads(line)
+                    except orjson.JSONDecodeError as e:
+                        yield e
+        if buffer.strip():
+            try:
+                yield orjson.loads(buffer)
+            except orjson.JSONDecodeError as e:
+                yield e
+        return
+
+    try:
+        items = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="invalid JSON body"
+        )
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="body must be a JSON array of films",
+        )
+    for item in items:
+        yield item
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+        for error in e.errors()
+    )
+
+
+@router.post(
+    "/bulk",
+    status_code=201,
+    response_model=FilmsBulkCreatedResponse,
+    responses={400: {"model": DetailResponse}},
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "description": "A JSON array of films or newline delimited JSON films.",
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/CreateFilmBody"},
+                    }
+                },
+                NDJSON_MEDIA_TYPE: {
+                    "schema": {"$ref": "#/components/schemas/CreateFilmBody"}
+                },
+            },
+        }
+    },
+)
+async def post_create_films_bulk(
+    request: Request, repo: FilmRepository = Depends(film_repository)
+):
+    """
+    Creates many films at once.
+
+    The body is either a JSON array of films or a stream of newline delimited
+    JSON films (`Content-Type: application/x-ndjson`). Each film is validated
+    on its own and errors are reported per item with its position in the body.
+    """
+    ids: typing.List[typing.Optional[str]] = []
+    errors: typing.List[BulkItemError] = []
+    # (position in the body, film) of the validated films not written yet.
+    pending: typing.List[typing.Tuple[int, Film]] = []
+
+    async def flush():
+        failures = await repo.create_many([film for _, film in pending])
+        for position, message in failures.items():
+            index = pending[position][0]
+            ids[index] = None
+            errors.append(BulkItemError(index=index, message=message))
+        pending.clear()
+
+    async for item in _bulk_items(request):
+        index = len(ids)
+        if isinstance(item, orjson.JSONDecodeError):
+            ids.append(None)
+            errors.append(BulkItemError(index=index, message=f"invalid JSON: {item}"))
+            continue
+        try:
+            body = CreateFilmBody.parse_obj(item)
+        except ValidationError as e:
+            ids.append(None)
+            errors.append(BulkItemError(index=index, message=_validation_message(e)))
+            continue
+        film_id = str(uuid.uuid4())
+        ids.append(film_id)
+        pending.append(
+            (
+                index,
+                Film(
+                    film_id=film_id,
+                    title=body.title,
+                    description=body.description,
+                    release_year=body.release_year,
+                    watched=body.watched,
+                ),
+            )
+        )
+        if len(pending) >= BULK_CREATE_CHUNK_SIZE:
+            await flush()
+    if pending:
+        await flush()
+
+    errors.sort(key=lambda error: error.index)
+    return FilmsBulkCreatedResponse(ids=ids, errors=errors)
+
+
+@router.get(
+    "/all",
+    response_model=typing.List[FilmResponse],
+    responses={
+        200: {
+            "content": {
+                NDJSON_MEDIA_TYPE: {
+                    "schema": {"$ref": "#/components/schemas/FilmResponse"}
+                }
+            }
+        }
+    },
+)
+async def get_all_films(
+    pagination=Depends(pagination_params),
+    accept: typing.Union[str, None] = Header(default=None),
+    repo: FilmRepository = Depends(film_repository),
+):
+    """
+    Returns every film ordered by title.
+
+    Films are streamed as newline delimited JSON when the client accepts
+    `application/x-ndjson`, use `limit=0` to stream the whole catalogue.
+    """
+    if accept is not None and NDJSON_MEDIA_TYPE in accept:
+        return StreamingResponse(
+            _ndjson_documents(
+                repo.iter_all_documents(
+                    skip=pagination.skip,
+                    limit=pagination.limit,
+                    after=pagination.after,
+                )
+            ),
+            media_type=NDJSON_MEDIA_TYPE,
+        )
+
+    documents = [
+        document
+        async for document in repo.iter_all_documents(
+            skip=pagination.skip, limit=pagination.limit, after=pagination.after
+        )
+    ]
+    return _films_json_response(documents, pagination.limit)
+
+
+@router.get("/search", response_model=typing.List[FilmResponse])
+async def search_films(
+    q: str = Query(
+        ...,
+        title="Query",
+        description="The words searched for, or the beginning of the titles with "
+        "`mode=prefix`",
+        min_length=1,
+        max_length=200,
+    ),
+    mode: SearchMode = Query(
+        SearchMode.TEXT,
+        title="Mode",
+        description="`text` ranks the films whose title or description hold the "
+        "words, `prefix` and `exact` match titles ignoring case.",
+    ),
+    skip: int = Query(0, title="Skip", description="The number of items to skip", ge=0),
+    limit: int = Query(
+        100,
+        title="Limit",
+        description="The limit of the number of items returned",
+        ge=1,
+        le=1000,
+    ),
+    repo: FilmRepository = Depends(film_repository),
+):
+    """
+    Searches films, best matches first.
+    """
+    films = await repo.search(q, mode=mode, skip=skip, limit=limit)
+    return Response(
+        orjson.dumps([film_document(film) for film in films]),
+        media_type="application/json",
+    )
+
+
+def _compiled_rule(text: str) -> rule_engine.Rule:
+    try:
+        return compile_rule(text)
+    except RuleError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"invalid rule: {e.message}"
+        )
+
+
+@router.get(
+    "/filter",
+    response_model=typing.List[FilmResponse],
+    responses={
+        200: {
+            "content": {
+                NDJSON_MEDIA_TYPE: {
+                    "schema": {"$ref": "#/components/schemas/FilmResponse"}
+                }
+            }
+        },
+        400: {"model": DetailResponse},
+    },
+)
+async def filter_films(
+    rule: str = Query(
+        ...,
+        title="Rule",
+        description="A rule_engine expression over the film fields `id`, `title`, "
+        "`description`, `release_year`, `watched` and `version`, e.g. "
+        "`release_year >= 2000 and not watched`.",
+        min_length=1,
+        max_length=RULE_MAX_LENGTH,
+    ),
+    pagination=Depends(pagination_params),
+    accept: typing.Union[str, None] = Header(default=None),
+    repo: FilmRepository = Depends(film_repository),
+):
+    """
+    Returns the films matching a rule ordered by title.
+
+    Films are streamed as newline delimited JSON when the client accepts
+    `application/x-ndjson`, use `limit=0` to stream every matching film.
+    """
+    documents = repo.iter_documents_matching(
+        _compiled_rule(rule),
+        skip=pagination.skip,
+        limit=pagination.limit,
+        after=pagination.after,
+    )
+    if accept is not None and NDJSON_MEDIA_TYPE in accept:
+        return StreamingResponse(
+            _ndjson_documents(documents), media_type=NDJSON_MEDIA_TYPE
+        )
+    return _films_json_response(
+        [document async for document in documents], pagination.limit
+    )
+
+
+@router.get(
+    "/filter/count",
+    response_model=FilterCountResponse,
+    responses={400: {"model": DetailResponse}},
+)
+async def count_filter(
+    rule: str = Query(
+        ...,
+        title="Rule",
+        description="A rule of the filter endpoint.",
+        min_length=1,
+        max_length=RULE_MAX_LENGTH,
+    ),
+    repo: FilmRepository = Depends(film_repository),
+):
+    """
+    Returns the number of films matching a rule.
+    """
+    return FilterCountResponse(count=await repo.count_matching(_compiled_rule(rule)))
+
+
+@router.get(
+    "/filter/explain",
+    response_model=FilterExplainResponse,
+    responses={400: {"model": DetailResponse}},
+)
+async def explain_filter(
+    rule: str = Query(
+        ...,
+        title="Rule",
+        description="A rule of the filter endpoint.",
+        min_length=1,
+        max_length=RULE_MAX_LENGTH,
+    ),
+    repo: FilmRepository = Depends(film_repository),
+):
+    """
+    Returns the part of a rule pushed down to the storage and the part
+    evaluated by the API on the films it returns.
+    """
+    explanation = await repo.explain_matching(_compiled_rule(rule))
+    return Response(orjson.dumps(explanation), media_type="application/json")
+
+
+@router.get("/batch", response_model=FilmsBatchResponse)
+async def get_films_by_ids(
+    film_ids: typing.List[str] = Query(
+        ...,
+        alias="id",
+        title="Film ids",
+        description="The ids of the films, the parameter is repeated for each id.",
+        max_items=BATCH_LOOKUP_MAX_IDS,
+    ),
+    repo: FilmRepository = Depends(film_repository),
+):
+    """
+    Returns the films of many ids with a single lookup.
+    """
+    film_ids = list(dict.fromkeys(film_ids))
+    films = await repo.get_by_ids(film_ids)
+    body = {
+        "films": [
+            film_document(films[film_id]) for film_id in film_ids if film_id in films
+        ],
+        "missing": [film_id for film_id in film_ids if film_id not in films],
+    }
+    return Response(orjson.dumps(body), media_type="application/json")
+
+
+@router.get(
+    "/statistics/release-years",
+    response_model=typing.List[ReleaseYearStatisticsResponse],
+)
+async def get_release_year_statistics(
+    repo: FilmRepository = Depends(film_repository),
+):
+    """
+    Returns the number of films and of distinct titles of every release year,
+    ordered by year.
+    """
+    statistics = await repo.release_year_statistics()
+    body = [
+        {"release_year": release_year, "films": films, "titles": titles}
+        for release_year, (films, titles) in statistics.items()
+    ]
+    return Response(orjson.dumps(body), media_type="application/json")
+
+
+@router.get("/statistics/watched", response_model=WatchedStatisticsResponse)
+async def get_watched_statistics(repo: FilmRepository = Depends(film_repository)):
+    """
+    Returns the number of watched and unwatched films.
+    """
+    watched, unwatched = await repo.watched_counts()
+    films = watched + unwatched
+    return WatchedStatisticsResponse(
+        watched=watched,
+        unwatched=unwatched,
+        watched_ratio=watched / films if films else 0.0,
+    )
+
+
+def film_etag(film: Film) -> str:
+    """
+    Returns the entity tag of a film, it changes with every write of the film.
+
+    The version alone isn't enough, it starts over at 1 when a deleted film is
+    created again, the tag holds the generation of the film as well.
+    """
+    return f'"{film.generation}.{film.version}"'
+
+
+# An entity tag, strong or weak, or `*`.
+_ENTITY_TAG = re.compile(r'^(\*|(W/)?"[^"]*")$')
+# The entity tags made by `film_etag`.
+_FILM_ETAG = re.compile(r'^"(\d+)\.(\d+)"$')
+
+
+def _matching_etag(header: str, etag: str, weak: bool) -> typing.Optional[str]:
+    """
+    Returns the entity tag listed by an `If-Match` or `If-None-Match` header
+    which matches `etag`, None if there is none. The tags of the compressed
+    responses, see `encoded_etag`, match the tag they were made from.
+
+    Refer - https://www.rfc-editor.org/rfc/rfc9110#name-comparison-2
+    """
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return etag
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if identity_etag(candidate) == etag:
+            return candidate
+    return None
+
+
+def _revisions_of(
+    if_match: str,
+) -> typing.List[typing.Optional[typing.Tuple[int, int]]]:
+    """
+    Returns the (generation, version) of the films matched by an `If-Match`
+    header, None for `*`. Weak tags never match and the tags which weren't
+    made by `film_etag`, or by `encoded_etag` from one, match no film, both
+    are left out.
+
+    Raises a 400 HTTPException if the header isn't a list of entity tags.
+    """
+    revisions: typing.List[typing.Optional[typing.Tuple[int, int]]] = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if not _ENTITY_TAG.match(tag):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="If-Match must hold entity tags returned by the API",
+            )
+        if tag == "*":
+            return [None]
+        match = _FILM_ETAG.match(identity_etag(tag))
+        if match is not None:
+            revisions.append((int(match.group(1)), int(match.group(2))))
+    return revisions
+
+
 @router.get(
     "/{film_id}",
-    responses={200: {"model": FilmResponse}, 404: {"model": DetailResponse}},
+    responses={
+        200: {"model": FilmResponse},
+        304: {"description": "The film still has the `If-None-Match` entity tag."},
+        404: {"model": DetailResponse},
+    },
 )
-async def get_film_by_id(film_id: str, repo: FilmRepository = Depends(film_repository)):
+async def get_film_by_id(
+    film_id: str,
+    if_none_match: typing.Union[str, None] = Header(default=None),
+    repo: FilmRepository = Depends(film_repository),
+):
     """
     Returns a Film if found, None otherwise.
+
+    The `ETag` header changes with every write of the film, a request whose
+    `If-None-Match` header holds it gets an empty 304 response.
     """
 
     film = await repo.get_by_id(film_id=film_id)
@@ -107,23 +642,62 @@ async def get_film_by_id(film_id: str, repo: FilmRepository = Depends(film_repos
                 DetailResponse(message=f"Film with id {film_id} is not found.")
             ),
         )
-    return FilmResponse(
-        id=film.id,
-        title=film.title,
-        description=film.description,
-        release_year=film.release_year,
-        watched=film.watched,
+    etag = film_etag(film)
+    if if_none_match is not None:
+        # The 304 response isn't compressed, it holds the tag the client has.
+        matching = _matching_etag(if_none_match, etag, weak=True)
+        if matching is not None:
+            return Response(status_code=304, headers={"ETag": matching})
+    return Response(
+        orjson.dumps(film_document(film)),
+        media_type="application/json",
+        headers={"ETag": etag},
     )
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True)
 class Token:
     name: str
     admin: bool
 
 
-def authenticate_jwt(authorization: typing.Union[str, None] = Header(default=None)):
+JWT_PUBLIC_KEY = """-----BEGIN PUBLIC KEY-----
+MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEAu1SU1LfVLPHCozMxH2Mo
+4lgOEePzNm0tRgeLezV6ffAt0gunVTLw7onLRnrq0/IzW7yWR7QkrmBL7jTKEn5u
++qKhbwKfBstIs+bMY2Zkp18gnTxKLxoS2tFczGkPLPgizskuemMghRniWaoLcyeh
+kd3qqGElvW/VDL5AaWTg0nLVkjRo9z+40RQzuVaE8AkAFmxZzow3x+VJYKdjykkJ
+0iT9wCS0DRTXu269V264Vf/3jvredZiKRkgwlL9xNAwxXFg0x/XFw005UWVRIkdg
+cKWTjpBP2dPwVZ4WWC+9aGVd+Gyn1o0CLelf4rEjGoXbAAEgAqeGUxrcIlbjXfbc
+mwIDAQAB
+-----END PUBLIC KEY-----"""
+
+
+@lru_cache()
+def jwt_public_key() -> jwk.Key:
+    """
+    The RS256 public key used to verify tokens, parsed from its PEM once.
+    """
+    return jwk.construct(JWT_PUBLIC_KEY, algorithm="RS256")
+
+
+@lru_cache()
+def verified_tokens() -> TTLCache:
+    """
+    Cache of the already verified tokens, keyed by the SHA-256 digest of the
+    token so repeated callers skip the RSA signature check.
+    """
+    settings = settings_instance()
+    return TTLCache(
+        "verified_tokens", maxsize=settings.jwt_cache_size, ttl=settings.jwt_cache_ttl
+    )
+
+
+async def authenticate_jwt(
+    authorization: typing.Union[str, None] = Header(default=None)
+):
     """
+    Runs on the event loop rather than in the threadpool, verified_tokens()
+    isn't safe to share between threads.
 
     Bearer <token>
 
@@ -141,57 +715,80 @@ def authenticate_jwt(authorization: typing.Union[str, None] = Header(default=Non
 
     """
 
-    token_secret = """-----BEGIN PUBLIC KEY-----
-MIIBIjANBgkqhkiG9w0BAQEFAAOCAQ8AMIIBCgKCAQEAu1SU1LfVLPHCozMxH2Mo
-4lgOEePzNm0tRgeLezV6ffAt0gunVTLw7onLRnrq0/IzW7yWR7QkrmBL7jTKEn5u
-+qKhbwKfBstIs+bMY2Zkp18gnTxKLxoS2tFczGkPLPgizskuemMghRniWaoLcyeh
-kd3qqGElvW/VDL5AaWTg0nLVkjRo9z+40RQzuVaE8AkAFmxZzow3x+VJYKdjykkJ
-0iT9wCS0DRTXu269V264Vf/3jvredZiKRkgwlL9xNAwxXFg0x/XFw005UWVRIkdg
-cKWTjpBP2dPwVZ4WWC+9aGVd+Gyn1o0CLelf4rEjGoXbAAEgAqeGUxrcIlbjXfbc
-mwIDAQAB
------END PUBLIC KEY-----"""
-
     if authorization is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid token"
         )
 
     token = authorization.split(" ")[1]
-    token_payload = jwt.decode(token, token_secret, algorithms=["RS256"])
-    return Token(
+    cache = verified_tokens()
+    digest = hashlib.sha256(token.encode()).digest()
+    verified = cache.get(digest)
+    if verified is not None:
+        return verified
+
+    try:
+        token_payload = jwt.decode(token, jwt_public_key(), algorithms=["RS256"])
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid token"
+        )
+    verified = Token(
         name=token_payload.get("name"), admin=token_payload.get("admin", False)
     )
+    ttl = cache.ttl
+    if "exp" in token_payload:
+        # Never keep a token past its expiration time.
+        ttl = min(ttl, token_payload["exp"] - time.time())
+    if cache.maxsize and ttl > 0:
+        cache.set(digest, verified, ttl=ttl)
+    return verified
 
 
-@router.get("/", response_model=typing.List[FilmResponse])
+@router.get(
+    "/",
+    response_model=typing.List[FilmResponse],
+    responses={
+        200: {
+            "content": {
+                NDJSON_MEDIA_TYPE: {
+                    "schema": {"$ref": "#/components/schemas/FilmResponse"}
+                }
+            }
+        }
+    },
+)
 async def get_films_by_title(
     title: str = Query(
         ..., title="Title", description="The title of the film.", min_length=3
     ),
     pagination=Depends(pagination_params),
+    accept: typing.Union[str, None] = Header(default=None),
     repo: FilmRepository = Depends(film_repository),
     _=Depends(authenticate_jwt),
 ):
     """
     This handler returns films by filtering their title.
-    """
 
-    films = await repo.get_by_title(title, skip=pagination.skip, limit=pagination.limit)
-    films_return_value = []
-    for film in films:
-        films_return_value.append(
-            FilmResponse(
-                id=film.id,
-                title=film.title,
-                description=film.description,
-                release_year=film.release_year,
-                watched=film.watched,
-            )
+    Films are streamed as newline delimited JSON when the client accepts
+    `application/x-ndjson`.
+    """
+    after = pagination.after[1] if pagination.after is not None else None
+
+    if accept is not None and NDJSON_MEDIA_TYPE in accept:
+        return StreamingResponse(
+            _ndjson_documents(
+                repo.iter_documents_by_title(
+                    title, skip=pagination.skip, limit=pagination.limit, after=after
+                )
+            ),
+            media_type=NDJSON_MEDIA_TYPE,
         )
-    return films_return_value
 
-
-# Assignment: Create an endpoint which returns all the films.
+    documents = await repo.get_documents_by_title(
+        title, skip=pagination.skip, limit=pagination.limit, after=after
+    )
+    return _films_json_response(documents, pagination.limit)
 
 
 @router.patch(
@@ -199,6 +796,8 @@ async def get_films_by_title(
     responses={
         200: {"model": DetailResponse},
         400: {"model": DetailResponse},
+        404: {"model": DetailResponse},
+        412: {"model": DetailResponse},
     },
 )
 async def patch_update_film(
@@ -208,23 +807,56 @@ async def patch_update_film(
         title="Update Body",
         description="The parameters of the film to be updated.",
     ),
+    if_match: typing.Union[str, None] = Header(default=None),
     repo: FilmRepository = Depends(film_repository),
 ):
     """
     Updates a film.
+
+    With an `If-Match` header holding the `ETag` of the film, the film is
+    only updated if nobody updated it meanwhile, a 412 is returned otherwise.
+    The `ETag` of the updated film is returned.
+
+    The entity tags are checked by the update itself, atomically, the film
+    isn't read first. A tag never matches a missing film, the request gets a
+    412 rather than a 404, see RFC 9110 13.1.1.
     """
-    try:
-        await repo.update(
-            film_id=film_id,
-            update_parameters=update_parameters.dict(
-                exclude_unset=True, exclude_none=True
-            ),
-        )
-        return DetailResponse(message="Film updated.")
-    except RepositoryException as e:
+    revisions = [None] if if_match is None else _revisions_of(if_match)
+    parameters = update_parameters.dict(exclude_unset=True, exclude_none=True)
+    film = None
+    # Without a tag made by `film_etag`, the header matches no film.
+    error = RepositoryException(f"film: {film_id} doesn't have the If-Match tags")
+    # A list of tags matches if any of them does, they are tried in turn.
+    for revision in revisions:
+        generation, version = (None, None) if revision is None else revision
+        try:
+            film = await repo.update(
+                film_id=film_id,
+                update_parameters=parameters,
+                expected_version=version,
+                expected_generation=generation,
+            )
+            break
+        except VersionConflictException as e:
+            error = e
+        except RepositoryException as e:
+            error = e
+            break
+    if film is None:
+        if isinstance(error, FilmNotFoundException):
+            status_code = 404 if if_match is None else 412
+        elif isinstance(error, VersionConflictException) or not revisions:
+            status_code = 412
+        else:
+            status_code = 400
         return JSONResponse(
-            status_code=400, content=jsonable_encoder(DetailResponse(message=str(e)))
+            status_code=status_code,
+            content=jsonable_encoder(DetailResponse(message=str(error))),
         )
+    return JSONResponse(
+        content=jsonable_encoder(DetailResponse(message="Film updated.")),
+        headers={"ETag": film_etag(film)},
+    )
 
 
 @router.delete("/{film_id}", status_code=204)
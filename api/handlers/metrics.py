@@ -0,0 +1,21 @@
+"""
+Prometheus metrics endpoint, only mounted if `Settings.enable_metrics` is set.
+"""
+
+from fastapi import APIRouter
+from starlette.responses import Response
+
+from api.metrics import CONTENT_TYPE, application_metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Returns the metrics of the server in the Prometheus text format.
+    """
+    # The content type already holds the charset, starlette would add it again.
+    return Response(
+        application_metrics().render(), headers={"Content-Type": CONTENT_TYPE}
+    )
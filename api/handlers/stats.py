@@ -0,0 +1,49 @@
+"""
+Runtime statistics of the application.
+"""
+
+import typing
+
+from fastapi import APIRouter
+
+from api.cache import caches
+from api.compression import compression_stats
+from api.dto.stats import (
+    CacheStatsResponse,
+    CompressionStatsResponse,
+    SingleFlightStatsResponse,
+)
+from api.single_flight import groups
+
+router = APIRouter(prefix="/api/v1/stats", tags=["stats"])
+
+
+@router.get("/caches", response_model=typing.List[CacheStatsResponse])
+async def get_cache_stats():
+    """
+    Returns the hit and miss counts of the in process caches.
+    """
+    return [
+        CacheStatsResponse(**cache.stats())
+        for cache in sorted(caches(), key=lambda cache: cache.name)
+    ]
+
+
+@router.get("/single-flight", response_model=typing.List[SingleFlightStatsResponse])
+async def get_single_flight_stats():
+    """
+    Returns the number of calls deduplicated by the single flight groups.
+    """
+    return [
+        SingleFlightStatsResponse(**group.stats())
+        for group in sorted(groups(), key=lambda group: group.name)
+    ]
+
+
+@router.get("/compression", response_model=typing.List[CompressionStatsResponse])
+async def get_compression_stats():
+    """
+    Returns the compression ratio and the CPU time spent compressing the
+    responses of each encoding.
+    """
+    return [CompressionStatsResponse(**stats) for stats in compression_stats().stats()]
@@ -0,0 +1,401 @@
+"""
+Imports films from a JSON array or a newline delimited JSON (NDJSON) file
+into the film repository described by the settings, exits with 1 if rows
+were rejected.
+
+    python -m api.importer films.json --map release_year=year \
+        --default "description=No description"
+
+Rows are validated like the bodies of the create film endpoint by a pool of
+processes, the valid films are written by concurrent `create_many` batches.
+The rows read ahead of the writers are bounded, a slow repository slows the
+reading down instead of filling the memory.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import sys
+import time
+import typing
+import uuid
+
+import orjson
+from pydantic import ValidationError
+
+from api.dto.film import CreateFilmBody
+from api.entities.film import Film
+from api.repository.film.abstractions import FilmRepository
+from api.repository.film.factory import open_film_repository
+from api.settings import settings_instance
+
+# Bytes read from the file at once when looking for NDJSON lines.
+READ_SIZE = 1024 * 1024
+
+# (row number, id, title, description, release_year, watched) of a valid row,
+# rows are numbered from 1.
+FilmRow = typing.Tuple[int, str, str, str, int, bool]
+# (row number, reason) of a rejected row.
+Rejection = typing.Tuple[int, str]
+
+
+def read_chunks(
+    file: typing.BinaryIO, batch_size: int
+) -> typing.Iterator[typing.Tuple[int, list]]:
+    """
+    Yields the rows of `file` by chunks of `batch_size`, together with the
+    number of the first row of the chunk.
+
+    A file starting with `[` is a JSON array, it is decoded at once and its
+    items are yielded. Otherwise the file is NDJSON, its lines are yielded
+    undecoded as they are read.
+    """
+    head = file.read(READ_SIZE)
+    if head.lstrip()[:1] == b"[":
+        items = orjson.loads(head + file.read())
+        if not isinstance(items, list):
+            raise ValueError("a JSON file must hold an array of films")
+        for start in range(0, len(items), batch_size):
+            yield start + 1, items[start : start + batch_size]
+        return
+
+    row = 1
+    lines: typing.List[bytes] = []
+    buffer = head
+    while buffer:
+        *complete, buffer_tail = buffer.split(b"\n")
+        lines += complete
+        while len(lines) >= batch_size:
+            yield row, lines[:batch_size]
+            row += batch_size
+            lines = lines[batch_size:]
+        data = file.read(READ_SIZE)
+        if not data:
+            if buffer_tail:
+                lines.append(buffer_tail)
+            break
+        buffer = buffer_tail + data
+    if lines:
+        yield row, lines
+
+
+def validate_rows(
+    first_row: int,
+    rows: list,
+    mapping: typing.Dict[str, str],
+    defaults: typing.Dict[str, typing.Any],
+    id_field: typing.Optional[str],
+) -> typing.Tuple[typing.List[FilmRow], typing.List[Rejection]]:
+    """
+    Validates a chunk of rows, runs in the processes of the pool.
+
+    `mapping` maps the fields of `CreateFilmBody` to the fields of the rows
+    they are read from, `defaults` fills the fields missing from a row.
+    Blank NDJSON lines are skipped but still numbered.
+    """
+    films: typing.List[FilmRow] = []
+    rejections: typing.List[Rejection] = []
+    for number, row in enumerate(rows, start=first_row):
+        if isinstance(row, bytes):
+            if not row.strip():
+                continue
+            try:
+                row = orjson.loads(row)
+            except orjson.JSONDecodeError as e:
+                rejections.append((number, f"invalid JSON: {e}"))
+                continue
+        if not isinstance(row, dict):
+            rejections.append((number, "a film must be a JSON object"))
+            continue
+        item = dict(row)
+        for target, source in mapping.items():
+            if source in row:
+                item[target] = row[source]
+        for field, value in defaults.items():
+            item.setdefault(field, value)
+        try:
+            body = CreateFilmBody.parse_obj(item)
+        except ValidationError as e:
+            rejections.append(
+                (
+                    number,
+                    "; ".join(
+                        f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+                        for error in e.errors()
+                    ),
+                )
+            )
+            continue
+        film_id = row.get(id_field) if id_field else None
+        films.append(
+            (
+                number,
+                str(film_id) if film_id is not None else str(uuid.uuid4()),
+                body.title,
+                body.description,
+                body.release_year,
+                body.watched,
+            )
+        )
+    return films, rejections
+
+
+class ImportReport:
+    """
+    ImportReport counts the rows of an import as it goes.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def throughput(self) -> float:
+        """
+        Rows imported per second.
+        """
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.rows} rows: {self.imported} imported, {self.rejected} "
+            f"rejected in {self.elapsed:.1f}s ({self.throughput:.0f} films/s)"
+        )
+
+
+async def import_films(
+    file: typing.BinaryIO,
+    repo: FilmRepository,
+    mapping: typing.Optional[typing.Dict[str, str]] = None,
+    defaults: typing.Optional[typing.Dict[str, typing.Any]] = None,
+    id_field: typing.Optional[str] = None,
+    batch_size: int = 1000,
+    workers: int = 0,
+    concurrency: int = 4,
+    on_rejection: typing.Optional[typing.Callable[[int, str], None]] = None,
+    on_progress: typing.Optional[typing.Callable[[ImportReport], None]] = None,
+    progress_interval: float = 1.0,
+) -> ImportReport:
+    """
+    Imports the films of `file` into `repo`, see `read_chunks` for the
+    formats.
+
+    Parameters
+    ----------
+    file: BinaryIO
+        The file the rows are read from.
+    repo: FilmRepository
+        The repository the films are written to.
+    mapping: Dict[str, str]
+        Fields of `CreateFilmBody` read from other fields of the rows.
+    defaults: Dict[str, Any]
+        Values of the fields missing from the rows.
+    id_field: str
+        The field of the rows holding the film id, importing the file again
+        then replaces the films instead of duplicating them. Films get new
+        ids if unset.
+    batch_size: int
+        The number of rows validated and written at once.
+    workers: int
+        The number of processes validating the rows, 0 validates them in
+        the event loop.
+    concurrency: int
+        The number of batches written concurrently.
+    on_rejection: Callable
+        Called with the number and the reason of every rejected row.
+    on_progress: Callable
+        Called with the report every `progress_interval` seconds.
+    """
+    mapping, defaults = mapping or {}, defaults or {}
+    report = ImportReport()
+    loop = asyncio.get_running_loop()
+    pool = concurrent.futures.ProcessPoolExecutor(workers) if workers else None
+    # Chunks read but not written yet, bounded so that reading waits for the
+    # writers.
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=max(workers, 1) * 2 + concurrency)
+
+    def reject(number: int, reason: str):
+        report.rejected += 1
+        if on_rejection is not None:
+            on_rejection(number, reason)
+
+    async def read():
+        reader = read_chunks(file, batch_size)
+        while True:
+            # The file is read off the event loop, the writers keep going.
+            chunk = await loop.run_in_executor(None, next, reader, None)
+            if chunk is None:
+                break
+            first_row, rows = chunk
+            report.rows = first_row + len(rows) - 1
+            if pool is not None:
+                validated = loop.run_in_executor(
+                    pool, validate_rows, first_row, rows, mapping, defaults, id_field
+                )
+            else:
+                validated = loop.create_future()
+                validated.set_result(
+                    validate_rows(first_row, rows, mapping, defaults, id_field)
+                )
+            await chunks.put(validated)
+        for _ in range(concurrency):
+            await chunks.put(None)
+
+    async def write():
+        while True:
+            validated = await chunks.get()
+            if validated is None:
+                return
+            rows, rejections = await validated
+            for number, reason in rejections:
+                reject(number, reason)
+            numbers = [row[0] for row in rows]
+            films = [
+                Film(
+                    film_id=film_id,
+                    title=title,
+                    description=description,
+                    release_year=release_year,
+                    watched=watched,
+                )
+                for _, film_id, title, description, release_year, watched in rows
+            ]
+            failures = await repo.create_many(films)
+            report.imported += len(films) - len(failures)
+            for position, reason in failures.items():
+                reject(numbers[position], reason)
+
+    async def progress():
+        while True:
+            await asyncio.sleep(progress_interval)
+            on_progress(report)
+
+    progress_task = None
+    if on_progress is not None:
+        progress_task = loop.create_task(progress())
+    try:
+        tasks = [loop.create_task(read())]
+        tasks += [loop.create_task(write()) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+    finally:
+        if progress_task is not None:
+            progress_task.cancel()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return report
+
+
+def _assignments(values: typing.Sequence[str], parse: bool) -> dict:
+    assignments = {}
+    for value in values:
+        key, separator, value = value.partition("=")
+        if not separator:
+            raise argparse.ArgumentTypeError(f"expected field=value: {key}")
+        if parse:
+            # JSON values keep their type, anything else is a string.
+            try:
+                value = orjson.loads(value)
+            except orjson.JSONDecodeError:
+                pass
+        assignments[key] = value
+    return assignments
+
+
+async def _main(args: argparse.Namespace) -> int:
+    settings = settings_instance()
+    if args.backend:
+        settings.film_repository_backend = args.backend
+    rejections = open(args.rejections, "wb") if args.rejections else None
+
+    def on_rejection(number: int, reason: str):
+        if rejections is not None:
+            rejections.write(
+                orjson.dumps(
+                    {"row": number, "reason": reason}, option=orjson.OPT_APPEND_NEWLINE
+                )
+            )
+
+    def on_progress(report: ImportReport):
+        print(report, file=sys.stderr)
+
+    repo = await open_film_repository(settings)
+    try:
+        with open(args.file, "rb") as file:
+            report = await import_films(
+                file,
+                repo,
+                mapping=_assignments(args.map, parse=False),
+                defaults=_assignments(args.default, parse=True),
+                id_field=args.id_field,
+                batch_size=args.batch_size,
+                workers=args.workers,
+                concurrency=args.concurrency,
+                on_rejection=on_rejection,
+                on_progress=on_progress,
+                progress_interval=args.progress_interval,
+            )
+    finally:
+        await repo.close()
+        if rejections is not None:
+            rejections.close()
+    print(report, file=sys.stderr)
+    return 1 if report.rejected else 0
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m api.importer", description=__doc__.splitlines()[1]
+    )
+    parser.add_argument("file", help="a JSON array or NDJSON file of films")
+    parser.add_argument(
+        "--map",
+        action="append",
+        default=[],
+        metavar="FIELD=SOURCE",
+        help="read a film field from another field of the rows",
+    )
+    parser.add_argument(
+        "--default",
+        action="append",
+        default=[],
+        metavar="FIELD=VALUE",
+        help="value of a field missing from the rows, JSON or a string",
+    )
+    parser.add_argument("--id-field", help="the field of the rows holding the film ids")
+    parser.add_argument(
+        "--backend",
+        choices=["mongo", "memory", "columnar"],
+        help="overrides FILM_REPOSITORY_BACKEND",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="validating processes, 0 validates in the main process",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="batches written concurrently"
+    )
+    parser.add_argument(
+        "--rejections", help="write the rejected rows to this NDJSON file"
+    )
+    parser.add_argument("--progress-interval", type=float, default=5.0)
+    args = parser.parse_args(argv)
+    return asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Prometheus metrics of the application, recorded with `prometheus_client`.
+
+The metrics are only created when `Settings.enable_metrics` is set, see
+`application_metrics()`: with the setting off no middleware is installed and
+the repositories are not wrapped, so the instrumentation costs nothing.
+
+The label sets known in advance (routes, repository operations) are created
+once so recording a value doesn't look them up.
+
+The server workers (see `api.server`) share their metrics through the
+directory named by the `PROMETHEUS_MULTIPROC_DIR` environment variable, a
+scrape of any worker reports the metrics of all of them.
+
+Refer - https://prometheus.github.io/client_python/multiprocess/
+"""
+
+import os
+import time
+import typing
+from functools import lru_cache
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Environment variable naming the directory the processes share their
+# metrics through.
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+# Buckets of the request latency histograms, in seconds.
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Buckets of the repository operation histograms, in seconds.
+REPOSITORY_LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+)
+
+# Label of the requests which didn't match any route.
+UNMATCHED_ROUTE = "unmatched"
+
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    MongoPoolMetrics counts the connections of the MongoDB connection pools.
+
+    It is passed to the Motor client through `event_listeners`, pymongo
+    publishes the pool events from the threads Motor runs its operations on.
+
+    Refer - https://pymongo.readthedocs.io/en/4.3.3/api/pymongo/monitoring.html
+    """
+
+    def __init__(self, registry: CollectorRegistry):
+        self._connections = Gauge(
+            "mongodb_pool_connections",
+            "Connections open in the MongoDB connection pools.",
+            registry=registry,
+            multiprocess_mode="livesum",
+        )
+        self._connections_in_use = Gauge(
+            "mongodb_pool_connections_in_use",
+            "Connections of the MongoDB connection pools checked out by an "
+            "operation.",
+            registry=registry,
+            multiprocess_mode="livesum",
+        )
+        self._checkout_failures = Counter(
+            "mongodb_pool_checkout_failures",
+            "Connection checkouts which failed, e.g. on a wait queue timeout.",
+            registry=registry,
+        )
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._connections.inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._connections.dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._checkout_failures.inc()
+
+    def connection_checked_out(self, event):
+        self._connections_in_use.inc()
+
+    def connection_checked_in(self, event):
+        self._connections_in_use.dec()
+
+
+class ApplicationMetrics:
+    """
+    ApplicationMetrics creates the metrics reported by the application, in a
+    registry of their own.
+    """
+
+    def __init__(self):
+        self.registry = CollectorRegistry()
+        self.http_requests = Counter(
+            "http_requests",
+            "HTTP requests handled, by route and status class.",
+            ["method", "route", "status"],
+            registry=self.registry,
+        )
+        self.http_request_duration = Histogram(
+            "http_request_duration_seconds",
+            "Time spent handling HTTP requests, by route.",
+            ["method", "route"],
+            buckets=HTTP_LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.http_requests_in_progress = Gauge(
+            "http_requests_in_progress",
+            "HTTP requests being handled.",
+            registry=self.registry,
+            multiprocess_mode="livesum",
+        )
+        self.repository_duration = Histogram(
+            "film_repository_operation_duration_seconds",
+            "Time spent in the film repository, by operation.",
+            ["operation"],
+            buckets=REPOSITORY_LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.repository_errors = Counter(
+            "film_repository_operation_errors",
+            "Film repository operations which raised, by operation.",
+            ["operation"],
+            registry=self.registry,
+        )
+        self.mongo_pool = MongoPoolMetrics(self.registry)
+
+    def render(self) -> bytes:
+        """
+        Returns the metrics in the Prometheus text exposition format, the ones
+        of every process sharing the `PROMETHEUS_MULTIPROC_DIR` directory if
+        it is set.
+        """
+        if os.environ.get(MULTIPROCESS_DIR_ENV):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            return generate_latest(registry)
+        return generate_latest(self.registry)
+
+
+@lru_cache()
+def application_metrics() -> ApplicationMetrics:
+    """
+    The metrics of the process, only created if metrics are enabled.
+    """
+    return ApplicationMetrics()
+
+
+class _RouteMetrics:
+    """
+    The values of the request metrics of a route and method.
+    """
+
+    __slots__ = ("duration", "statuses")
+
+    def __init__(self, metrics: ApplicationMetrics, method: str, route: str):
+        self.duration = metrics.http_request_duration.labels(method, route)
+        self.statuses = [
+            metrics.http_requests.labels(method, route, status)
+            for status in STATUS_CLASSES
+        ]
+
+
+class MetricsMiddleware:
+    """
+    MetricsMiddleware is an ASGI middleware recording the count, the status
+    and the duration of the HTTP requests by route.
+
+    The label values of every route of `routes` are created up front, routes
+    are looked up by the endpoint the router stores in the request scope.
+    """
+
+    def __init__(self, app, metrics: ApplicationMetrics, routes: typing.Sequence):
+        self.app = app
+        self._metrics = metrics
+        self._routes = routes
+        # (endpoint, method) -> _RouteMetrics
+        self._route_metrics: typing.Dict[tuple, _RouteMetrics] = {}
+        self._unmatched: typing.Dict[str, _RouteMetrics] = {}
+        self._index_routes()
+
+    def _index_routes(self):
+        for route in self._routes:
+            endpoint = getattr(route, "endpoint", None)
+            path = getattr(route, "path", None)
+            if endpoint is None or path is None:
+                continue
+            for method in getattr(route, "methods", None) or ():
+                self._route_metrics.setdefault(
+                    (endpoint, method), _RouteMetrics(self._metrics, method, path)
+                )
+
+    def _metrics_of(self, scope) -> _RouteMetrics:
+        method = scope["method"]
+        endpoint = scope.get("endpoint")
+        if endpoint is not None:
+            key = (endpoint, method)
+            route_metrics = self._route_metrics.get(key)
+            if route_metrics is None:
+                # A route added after the application started, or an endpoint
+                # which isn't a route (a mount...) remembered as unmatched.
+                self._index_routes()
+                route_metrics = self._route_metrics.setdefault(
+                    key, self._unmatched_metrics(method)
+                )
+            return route_metrics
+        return self._unmatched_metrics(method)
+
+    def _unmatched_metrics(self, method: str) -> _RouteMetrics:
+        route_metrics = self._unmatched.get(method)
+        if route_metrics is None:
+            route_metrics = self._unmatched[method] = _RouteMetrics(
+                self._metrics, method, UNMATCHED_ROUTE
+            )
+        return route_metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = self._metrics.http_requests_in_progress
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            in_progress.dec()
+            route_metrics = self._metrics_of(scope)
+            route_metrics.duration.observe(duration)
+            status_class = min(max(status_code // 100, 1), 5) - 1
+            route_metrics.statuses[status_class].inc()
@@ -1,13 +1,128 @@
 import abc
+import enum
+import random
 import typing
 
+import rule_engine
+
 from api.entities.film import Film
+from api.repository.film.statistics import FilmCounters, ReleaseYearStatistics
 
 
 class RepositoryException(Exception):
     pass
 
 
+class FilmNotFoundException(RepositoryException):
+    pass
+
+
+class VersionConflictException(RepositoryException):
+    """
+    Raised when a write expects a version of a film which isn't the current one.
+    """
+
+    def __init__(
+        self,
+        film_id: str,
+        expected_version: typing.Optional[int],
+        expected_generation: typing.Optional[int] = None,
+    ):
+        expected = [] if expected_version is None else [f"version {expected_version}"]
+        if expected_generation is not None:
+            expected.append(f"generation {expected_generation}")
+        super().__init__(f"film: {film_id} is not at {' and '.join(expected)}")
+        self.film_id = film_id
+        self.expected_version = expected_version
+        self.expected_generation = expected_generation
+
+
+def new_generation() -> int:
+    """
+    Returns the generation of a film being created, see `Film.generation`.
+
+    Generations are random rather than counted so that the processes writing
+    to a shared database don't have to agree on them, they fit a signed 64-bit
+    integer and are never 0.
+    """
+    return random.randrange(1, 1 << 62)
+
+
+def film_document(film: Film) -> dict:
+    """
+    Returns the plain document of a film, shaped like the `FilmResponse` DTO.
+    """
+    return {
+        "id": film.id,
+        "title": film.title,
+        "description": film.description,
+        "release_year": film.release_year,
+        "watched": film.watched,
+        "version": film.version,
+    }
+
+
+class SearchMode(str, enum.Enum):
+    """
+    How `FilmRepository.search` matches films.
+
+    - `prefix`: titles starting with the query, ignoring case, ordered by title.
+    - `exact`: titles equal to the query, ignoring case.
+    - `text`: films whose title or description hold words of the query,
+      ranked by relevance, words of the title weigh more.
+    """
+
+    PREFIX = "prefix"
+    EXACT = "exact"
+    TEXT = "text"
+
+
+class WriteOperation:
+    """
+    A write of a film, applied by `FilmRepository.execute_batch`.
+    """
+
+    __slots__ = ("film_id",)
+
+    def __init__(self, film_id: str):
+        self.film_id = film_id
+
+    async def apply(self, repository: "FilmRepository") -> typing.Any:
+        """
+        Applies the write with the single operation methods of `repository`.
+        """
+        raise NotImplementedError
+
+
+class CreateFilm(WriteOperation):
+    __slots__ = ("film",)
+
+    def __init__(self, film: Film):
+        super().__init__(film.id)
+        self.film = film
+
+    async def apply(self, repository: "FilmRepository"):
+        return await repository.create(self.film)
+
+
+class UpdateFilm(WriteOperation):
+    __slots__ = ("update_parameters",)
+
+    def __init__(self, film_id: str, update_parameters: dict):
+        super().__init__(film_id)
+        self.update_parameters = update_parameters
+
+    async def apply(self, repository: "FilmRepository") -> Film:
+        return await repository.update(self.film_id, self.update_parameters)
+
+
+class DeleteFilm(WriteOperation):
+    __slots__ = ()
+
+    async def apply(self, repository: "FilmRepository"):
+        return await repository.delete(self.film_id)
+
+
 class FilmRepository(abc.ABC):
     async def create(self, film: Film):
         """
@@ -17,23 +132,215 @@ class FilmRepository(abc.ABC):
         """
         raise NotImplementedError
 
+    async def create_many(self, films: typing.Sequence[Film]) -> typing.Dict[int, str]:
+        """
+        Inserts many films into the database.
+
+        Returns a mapping of the positions (in `films`) of the films that could
+        not be inserted to the reason of the failure, an empty mapping means
+        that every film has been inserted.
+        """
+        raise NotImplementedError
+
     async def get_by_id(self, film_id: str) -> typing.Optional[Film]:
         """
         Retrieves a Film by it's ID and if the film is not found it will return None.
         """
         raise NotImplementedError
 
+    async def get_by_ids(
+        self, film_ids: typing.Sequence[str]
+    ) -> typing.Dict[str, Film]:
+        """
+        Finds the films of the given ids, returns them by id. Ids which aren't
+        found are left out.
+        """
+        films = {}
+        for film_id in film_ids:
+            film = await self.get_by_id(film_id)
+            if film is not None:
+                films[film_id] = film
+        return films
+
     async def get_by_title(
-        self, title: str, skip: int = 0, limit: int = 1000
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
     ) -> typing.List[Film]:
         """
-        Returns a list of films which share the same title.
+        Returns a list of films which share the same title, ordered by id.
+
+        When `after` is given only the films whose id is greater than `after`
+        are returned (keyset pagination), `skip` is applied after that.
         """
         raise NotImplementedError
 
-    async def update(self, film_id: str, update_parameters: dict):
+    def iter_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[Film]:
         """
-        Update a film by it's id.
+        Async iterator variant of `get_by_title`, films are yielded as they are
+        read from the database instead of being collected in a list.
+
+        A `limit` of 0 means no limit.
+        """
+        raise NotImplementedError
+
+    def iter_all(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[Film]:
+        """
+        Yields every film of the database, ordered by (title, id).
+
+        When `after` is given only the films whose (title, id) key is greater
+        than `after` are yielded, `skip` is applied after that. A `limit` of 0
+        means no limit.
+        """
+        raise NotImplementedError
+
+    async def search(
+        self,
+        query: str,
+        mode: SearchMode = SearchMode.TEXT,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> typing.List[Film]:
+        """
+        Finds films matching `query` as described by `mode`, best matches
+        first, a `limit` of 0 means no limit.
+        """
+        raise NotImplementedError
+
+    async def get_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[dict]:
+        """
+        Same as `get_by_title` but returns plain film documents (see
+        `film_document`) which can be serialized without building entities.
+        """
+        films = await self.get_by_title(title, skip, limit, after)
+        return [film_document(film) for film in films]
+
+    async def iter_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[dict]:
+        """
+        Same as `iter_by_title` but yields plain film documents.
+        """
+        async for film in self.iter_by_title(title, skip, limit, after):
+            yield film_document(film)
+
+    async def iter_all_documents(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        """
+        Same as `iter_all` but yields plain film documents.
+        """
+        async for film in self.iter_all(skip, limit, after):
+            yield film_document(film)
+
+    async def iter_documents_matching(
+        self,
+        rule: rule_engine.Rule,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        """
+        Yields the documents of the films matching `rule`, ordered by
+        (title, id) like `iter_all`. `skip` and `limit` count matching films,
+        a `limit` of 0 means no limit.
+        """
+        matches = rule.matches
+        count = 0
+        async for document in self.iter_all_documents(after=after):
+            if not matches(document):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            yield document
+            count += 1
+            if count == limit:
+                return
+
+    async def count_matching(self, rule: rule_engine.Rule) -> int:
+        """
+        Returns the number of films matching `rule`.
+        """
+        count = 0
+        async for _ in self.iter_documents_matching(rule):
+            count += 1
+        return count
+
+    async def explain_matching(self, rule: rule_engine.Rule) -> dict:
+        """
+        Describes how `iter_documents_matching` evaluates `rule`: the `filter`
+        evaluated by the storage and the `residual` part of the rule evaluated
+        in process on the films it returns.
+        """
+        return {"filter": None, "residual": rule.text}
+
+    async def release_year_statistics(self) -> ReleaseYearStatistics:
+        """
+        Returns the number of films and of distinct titles of every release
+        year, ordered by year.
+        """
+        return (await self._count_all()).release_years()
+
+    async def watched_counts(self) -> typing.Tuple[int, int]:
+        """
+        Returns the number of watched and unwatched films.
+        """
+        return (await self._count_all()).watched_counts()
+
+    async def _count_all(self) -> FilmCounters:
+        counters = FilmCounters()
+        async for document in self.iter_all_documents():
+            counters.add(
+                document["title"], document["release_year"], document["watched"]
+            )
+        return counters
+
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
+        """
+        Update a film by it's id and returns the updated film, its version is
+        incremented.
+
+        If `expected_version` or `expected_generation` are set the film is only
+        updated if it is at that version and generation, the check and the
+        update are atomic. Versions start over when a film is deleted and
+        created again, the generation tells the two apart.
+
+        Raises FilmNotFoundException if there is no such film,
+        VersionConflictException if the film isn't at `expected_version` or
+        `expected_generation` and RepositoryException on other failures.
         """
         raise NotImplementedError
 
@@ -44,3 +351,36 @@ class FilmRepository(abc.ABC):
         Raises RepositoryException of failure.
         """
         raise NotImplementedError
+
+    async def execute_batch(
+        self, operations: typing.Sequence[WriteOperation]
+    ) -> typing.List[typing.Any]:
+        """
+        Applies many writes at once, a batch holds at most one write per film
+        and its writes may be applied in any order.
+
+        Returns, in the order of `operations`, what each write would have
+        returned on its own (None for creates and deletes, the updated film
+        for updates) or the exception it failed with. A failing write doesn't
+        stop the others.
+        """
+        results: typing.List[typing.Any] = []
+        for operation in operations:
+            try:
+                results.append(await operation.apply(self))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def connect(self):
+        """
+        Gets the repository ready to serve requests, e.g. opens the database
+        connections, so the first requests don't pay for it.
+
+        Raises RepositoryException if the storage can't be reached.
+        """
+
+    async def close(self):
+        """
+        Releases the resources held by the repository.
+        """
@@ -0,0 +1,161 @@
+import asyncio
+import typing
+
+from api.entities.film import Film
+from api.repository.film.abstractions import (
+    CreateFilm,
+    DeleteFilm,
+    FilmRepository,
+    UpdateFilm,
+    WriteOperation,
+)
+from api.repository.film.delegating import DelegatingFilmRepository
+
+
+class BatchingFilmRepository(DelegatingFilmRepository):
+    """
+    BatchingFilmRepository groups the creates, updates and deletes made within
+    a short window into a single `execute_batch` call of the repository it
+    wraps (group commit), every caller gets the result or the error of its own
+    write.
+
+    A batch is written once its window has elapsed or once it holds
+    `max_batch_size` writes. It holds a single write per film, a second write
+    of a film flushes the pending batch first, and waits for the batches in
+    flight writing the same films, so the writes of a film are applied in the
+    order they were made.
+
+    Updates with an expected version are sent on their own, their check relies
+    on the atomic read and write of `update`.
+
+    Refer - https://en.wikipedia.org/wiki/Group_commit
+    """
+
+    def __init__(
+        self,
+        repository: FilmRepository,
+        window: float = 0.002,
+        max_batch_size: int = 500,
+    ):
+        """
+        Parameters
+        ----------
+        repository: FilmRepository
+            The repository the batches are written to.
+        window: float
+            The number of seconds a write waits for other writes to join its
+            batch.
+        max_batch_size: int
+            The maximum number of writes of a batch.
+        """
+        super().__init__(repository)
+        self._window = window
+        self._max_batch_size = max_batch_size
+        # film id -> write and future of its caller, in arrival order.
+        self._pending: typing.Dict[
+            str, typing.Tuple[WriteOperation, asyncio.Future]
+        ] = {}
+        self._timer: typing.Optional[asyncio.TimerHandle] = None
+        # film id -> task writing the last batch holding a write of the film.
+        self._in_flight: typing.Dict[str, asyncio.Task] = {}
+        self._tasks: typing.Set[asyncio.Task] = set()
+        # Number of writes and number of batches written for them.
+        self.writes = 0
+        self.batches = 0
+
+    async def create(self, film: Film):
+        return await self._write(CreateFilm(film))
+
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
+        if expected_version is None and expected_generation is None:
+            return await self._write(UpdateFilm(film_id, update_parameters))
+        # Applied after the writes of the film made before it.
+        if film_id in self._pending:
+            self._flush()
+        task = self._in_flight.get(film_id)
+        if task is not None:
+            await asyncio.wait({task})
+        return await self._repository.update(
+            film_id, update_parameters, expected_version, expected_generation
+        )
+
+    async def delete(self, film_id: str):
+        return await self._write(DeleteFilm(film_id))
+
+    async def _write(self, operation: WriteOperation):
+        loop = asyncio.get_running_loop()
+        if operation.film_id in self._pending:
+            self._flush()
+        future = loop.create_future()
+        self._pending[operation.film_id] = (operation, future)
+        self.writes += 1
+        if len(self._pending) >= self._max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        previous = {
+            self._in_flight[film_id] for film_id in batch if film_id in self._in_flight
+        }
+        task = asyncio.get_running_loop().create_task(self._execute(batch, previous))
+        for film_id in batch:
+            self._in_flight[film_id] = task
+        # Keeps a reference to the task until it is done.
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _execute(
+        self,
+        batch: typing.Dict[str, typing.Tuple[WriteOperation, asyncio.Future]],
+        previous: typing.Set[asyncio.Task],
+    ):
+        try:
+            if previous:
+                await asyncio.wait(previous)
+            self.batches += 1
+            results = await self._repository.execute_batch(
+                [operation for operation, _ in batch.values()]
+            )
+        except asyncio.CancelledError:
+            for _, future in batch.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            current = asyncio.current_task()
+            for film_id in batch:
+                if self._in_flight.get(film_id) is current:
+                    del self._in_flight[film_id]
+        for (_, future), result in zip(batch.values(), results):
+            # The future of a cancelled caller is already done.
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        # Writes the pending batch and waits for the batches in flight.
+        self._flush()
+        if self._tasks:
+            await asyncio.wait(set(self._tasks))
+        await self._repository.close()
@@ -0,0 +1,229 @@
+import sys
+import typing
+
+from api.cache import TTLCache
+from api.entities.film import Film
+from api.repository.film.abstractions import (
+    CreateFilm,
+    FilmRepository,
+    UpdateFilm,
+    WriteOperation,
+    film_document,
+)
+from api.repository.film.delegating import DelegatingFilmRepository
+
+_MISSING = object()
+
+
+def _film_size(film: typing.Optional[Film]) -> int:
+    """
+    Approximates the memory held by a cached film in bytes.
+    """
+    if film is None:
+        return 0
+    return (
+        sys.getsizeof(film)
+        + sys.getsizeof(film.id)
+        + sys.getsizeof(film.title)
+        + sys.getsizeof(film.description)
+    )
+
+
+def _films_size(films: typing.List[Film]) -> int:
+    return sys.getsizeof(films) + sum(_film_size(film) for film in films)
+
+
+class CachingFilmRepository(DelegatingFilmRepository):
+    """
+    CachingFilmRepository adds a read-through cache to `get_by_id`,
+    `get_by_ids` and `get_by_title` of any FilmRepository.
+
+    Writes made through this repository invalidate exactly the cached entries
+    they affect: the film itself and the title lookups holding the film or
+    holding the title it gets.
+    """
+
+    def __init__(
+        self,
+        repository: FilmRepository,
+        max_entries: int = 10000,
+        max_bytes: int = 0,
+        ttl: typing.Optional[float] = 60,
+    ):
+        """
+        Parameters
+        ----------
+        repository: FilmRepository
+            The repository the cached data is read from.
+        max_entries: int
+            The maximum number of entries of each cache, 0 means no limit.
+        max_bytes: int
+            The maximum number of bytes held by each cache, 0 means no limit.
+        ttl: float
+            The number of seconds an entry is cached for, None means no expiration.
+        """
+        super().__init__(repository)
+        self.films_by_id = TTLCache(
+            "films_by_id",
+            maxsize=max_entries,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            getsizeof=_film_size,
+        )
+        self.films_by_title = TTLCache(
+            "films_by_title",
+            maxsize=max_entries,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            getsizeof=_films_size,
+            on_evict=self._title_entry_evicted,
+        )
+        # title -> keys of the cached `get_by_title` results of that title.
+        self._title_keys: typing.Dict[str, typing.Set[tuple]] = {}
+        # film id -> title of the cached `get_by_title` results holding the film.
+        self._film_titles: typing.Dict[str, str] = {}
+        # Bumped by every write, a read only fills the cache if no write
+        # happened while it was waiting for the wrapped repository.
+        self._generation = 0
+
+    def _title_entry_evicted(self, key: tuple, films: typing.List[Film]):
+        title = key[0]
+        keys = self._title_keys.get(title)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self._title_keys[title]
+            self._forget_films(title, films)
+
+    def _forget_films(self, title: str, films: typing.List[Film]):
+        for film in films:
+            if self._film_titles.get(film.id) == title:
+                del self._film_titles[film.id]
+
+    def _invalidate_title(self, title: str):
+        for key in self._title_keys.pop(title, ()):
+            films = self.films_by_title.pop(key)
+            if films is not None:
+                self._forget_films(title, films)
+
+    def _invalidate_film(self, film_id: str):
+        self._generation += 1
+        cached = self.films_by_id.pop(film_id)
+        if cached is not None:
+            self._invalidate_title(cached.title)
+        title = self._film_titles.pop(film_id, None)
+        if title is not None:
+            self._invalidate_title(title)
+
+    async def create(self, film: Film):
+        try:
+            return await self._repository.create(film)
+        finally:
+            self._invalidate_film(film.id)
+            self._invalidate_title(film.title)
+
+    async def create_many(self, films: typing.Sequence[Film]) -> typing.Dict[int, str]:
+        try:
+            return await self._repository.create_many(films)
+        finally:
+            for film in films:
+                self._invalidate_film(film.id)
+                self._invalidate_title(film.title)
+
+    async def get_by_id(self, film_id: str) -> typing.Optional[Film]:
+        film = self.films_by_id.get(film_id, _MISSING)
+        if film is not _MISSING:
+            return film
+        generation = self._generation
+        film = await self._repository.get_by_id(film_id)
+        if generation == self._generation:
+            self.films_by_id.set(film_id, film)
+        return film
+
+    async def get_by_ids(
+        self, film_ids: typing.Sequence[str]
+    ) -> typing.Dict[str, Film]:
+        films = {}
+        missing = []
+        for film_id in film_ids:
+            film = self.films_by_id.get(film_id, _MISSING)
+            if film is _MISSING:
+                missing.append(film_id)
+            elif film is not None:
+                films[film_id] = film
+        if not missing:
+            return films
+        generation = self._generation
+        found = await self._repository.get_by_ids(missing)
+        if generation == self._generation:
+            for film_id in missing:
+                self.films_by_id.set(film_id, found.get(film_id))
+        films.update(found)
+        return films
+
+    async def get_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[Film]:
+        key = (title, skip, limit, after)
+        films = self.films_by_title.get(key)
+        if films is not None:
+            return list(films)
+        generation = self._generation
+        films = await self._repository.get_by_title(title, skip, limit, after)
+        if generation == self._generation:
+            self.films_by_title.set(key, films)
+            self._title_keys.setdefault(title, set()).add(key)
+            for film in films:
+                self._film_titles[film.id] = title
+        return list(films)
+
+    async def get_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[dict]:
+        films = await self.get_by_title(title, skip, limit, after)
+        return [film_document(film) for film in films]
+
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
+        try:
+            return await self._repository.update(
+                film_id, update_parameters, expected_version, expected_generation
+            )
+        finally:
+            self._invalidate_film(film_id)
+            if "title" in update_parameters:
+                self._invalidate_title(update_parameters["title"])
+
+    async def delete(self, film_id: str):
+        try:
+            return await self._repository.delete(film_id)
+        finally:
+            self._invalidate_film(film_id)
+
+    async def execute_batch(
+        self, operations: typing.Sequence[WriteOperation]
+    ) -> typing.List[typing.Any]:
+        try:
+            return await self._repository.execute_batch(operations)
+        finally:
+            for operation in operations:
+                self._invalidate_film(operation.film_id)
+                if isinstance(operation, CreateFilm):
+                    self._invalidate_title(operation.film.title)
+                elif isinstance(operation, UpdateFilm):
+                    if "title" in operation.update_parameters:
+                        self._invalidate_title(operation.update_parameters["title"])
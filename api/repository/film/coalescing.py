@@ -0,0 +1,83 @@
+import asyncio
+import typing
+
+from api.entities.film import Film
+from api.repository.film.abstractions import FilmRepository
+from api.repository.film.delegating import DelegatingFilmRepository
+
+
+class CoalescingFilmRepository(DelegatingFilmRepository):
+    """
+    CoalescingFilmRepository merges the `get_by_id` calls made during the same
+    iteration of the event loop into a single `get_by_ids` call of the
+    repository it wraps, in the manner of a DataLoader.
+
+    The first call of an iteration schedules the batch to be loaded on the
+    next iteration, the calls made meanwhile join it. Concurrent calls for the
+    same id share the lookup, a caller being cancelled doesn't affect the
+    other callers of the batch.
+
+    Refer - https://github.com/graphql/dataloader#batching
+    """
+
+    def __init__(self, repository: FilmRepository, max_batch_size: int = 1000):
+        """
+        Parameters
+        ----------
+        repository: FilmRepository
+            The repository the batches are loaded from.
+        max_batch_size: int
+            The maximum number of ids loaded by a single `get_by_ids` call.
+        """
+        super().__init__(repository)
+        self._max_batch_size = max_batch_size
+        # film id -> futures of the callers waiting for the film.
+        self._pending: typing.Dict[str, typing.List[asyncio.Future]] = {}
+        self._tasks: typing.Set[asyncio.Task] = set()
+        # Number of `get_by_id` calls and number of `get_by_ids` calls made
+        # for them.
+        self.calls = 0
+        self.batches = 0
+
+    async def get_by_id(self, film_id: str) -> typing.Optional[Film]:
+        loop = asyncio.get_running_loop()
+        if not self._pending:
+            loop.call_soon(self._dispatch)
+        future = loop.create_future()
+        self._pending.setdefault(film_id, []).append(future)
+        self.calls += 1
+        return await future
+
+    def _dispatch(self):
+        pending, self._pending = self._pending, {}
+        film_ids = list(pending)
+        for start in range(0, len(film_ids), self._max_batch_size):
+            batch = {
+                film_id: pending[film_id]
+                for film_id in film_ids[start : start + self._max_batch_size]
+            }
+            task = asyncio.get_running_loop().create_task(self._load(batch))
+            # Keeps a reference to the task until it is done.
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, batch: typing.Dict[str, typing.List[asyncio.Future]]):
+        self.batches += 1
+        try:
+            films = await self._repository.get_by_ids(list(batch))
+        except asyncio.CancelledError:
+            for futures in batch.values():
+                for future in futures:
+                    future.cancel()
+            raise
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for film_id, futures in batch.items():
+            film = films.get(film_id)
+            for future in futures:
+                if not future.done():
+                    future.set_result(film)
@@ -0,0 +1,707 @@
+"""
+Columnar in memory storage of the films.
+
+`MemoryFilmRepository` keeps an object per film, a filter reads every one of
+them. `ColumnarFilmRepository` stores each field in its own column instead,
+a film is a row of the columns:
+
+- release years, versions and generations are packed in `array` buffers of
+  machine integers,
+- watched flags are a bitmap, bit `row` of a bytearray,
+- titles are dictionary encoded, the title column holds the code of the title
+  of each row and the dictionary the distinct titles,
+- ids map to their row, the rows of deleted films are reused by the next ones.
+
+Filters (see `rule_query`) are evaluated column by column into masks, Python
+ints holding a bit per row, combined with bitwise operations. Comparisons over
+the integer columns are vectorized with numpy when it is installed, otherwise
+they run a builtin comparison over the buffer without creating an object per
+film. Title conditions are evaluated once per distinct title.
+"""
+
+import array
+import bisect
+import itertools
+import operator
+import re
+import typing
+
+import rule_engine
+
+from api.entities.film import Film, intern_value
+from api.repository.film.abstractions import (
+    FilmNotFoundException,
+    FilmRepository,
+    RepositoryException,
+    SearchMode,
+    VersionConflictException,
+    new_generation,
+)
+from api.repository.film.memory import DEFERRED_TITLES_MIN_FILMS
+from api.repository.film.rule_query import RuleQuery, rule_query
+from api.repository.film.search import FilmSearchIndex
+from api.repository.film.statistics import (
+    COUNTED_FIELDS,
+    FilmCounters,
+    ReleaseYearStatistics,
+)
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+# Matches are sorted by (title, id) when they are fewer than the films divided
+# by this ratio, otherwise the films are walked in (title, id) order.
+SORTED_MATCHES_RATIO = 8
+
+_COMPARISONS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+# The method of the operand comparing it to a value, `value > 3` is
+# `(3).__lt__(value)`, mapped over a buffer it runs without Python frames.
+_REFLECTED = {
+    "$eq": "__eq__",
+    "$ne": "__ne__",
+    "$gt": "__lt__",
+    "$gte": "__le__",
+    "$lt": "__gt__",
+    "$lte": "__ge__",
+}
+_REGEX_OPTIONS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL}
+_ASCII_BITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def _mask_from_flags(flags: bytes) -> int:
+    """
+    Packs a byte per row, 0 or 1, in a mask.
+    """
+    if not flags:
+        return 0
+    # Base 2 parsing is linear, the first character is the most significant.
+    return int(flags.translate(_ASCII_BITS)[::-1], 2)
+
+
+def _mask_rows(mask: int) -> typing.Iterator[int]:
+    """
+    Yields the rows set in a mask in ascending order.
+    """
+    bits = format(mask, "b")[::-1]
+    row = bits.find("1")
+    while row != -1:
+        yield row
+        row = bits.find("1", row + 1)
+
+
+def _is_number(value: typing.Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _comparison(compare: typing.Callable, operand: typing.Any) -> typing.Callable:
+    def test(value: typing.Any) -> bool:
+        try:
+            return compare(value, operand)
+        except TypeError:
+            # MongoDB doesn't order values of different types.
+            return False
+
+    return test
+
+
+def _predicate(condition: typing.Any) -> typing.Callable[[typing.Any], bool]:
+    """
+    Returns the function testing a value against the condition of a field of
+    a MongoDB filter, a document or a value the field equals.
+    """
+    if not isinstance(condition, dict):
+        return lambda value: value == condition
+    tests: typing.List[typing.Callable[[typing.Any], bool]] = []
+    for name, operand in condition.items():
+        if name in _COMPARISONS:
+            tests.append(_comparison(_COMPARISONS[name], operand))
+        elif name == "$in":
+            tests.append(operand.__contains__)
+        elif name == "$regex":
+            flags = 0
+            for option in condition.get("$options", ""):
+                flags |= _REGEX_OPTIONS[option]
+            search = re.compile(operand, flags).search
+            tests.append(
+                lambda value, search=search: isinstance(value, str)
+                and search(value) is not None
+            )
+        elif name == "$not":
+            negated = _predicate(operand)
+            tests.append(lambda value, negated=negated: not negated(value))
+        elif name != "$options":
+            raise RepositoryException(f"unsupported filter operator: {name}")
+    if len(tests) == 1:
+        return tests[0]
+    return lambda value: all(test(value) for test in tests)
+
+
+class ColumnarFilmRepository(FilmRepository):
+    """
+    ColumnarFilmRepository implements the repository pattern by storing the
+    films in memory by columns, see the module documentation.
+    """
+
+    def __init__(self):
+        # row -> film id, None for the free rows.
+        self._ids: typing.List[typing.Optional[str]] = []
+        # film id -> row.
+        self._rows: typing.Dict[str, int] = {}
+        # Rows of deleted films, reused by the next films.
+        self._free: typing.List[int] = []
+        # Bitmaps of the rows holding a film and of the watched films.
+        self._live = bytearray()
+        self._watched = bytearray()
+        self._release_years = array.array("q")
+        self._versions = array.array("q")
+        self._generations = array.array("q")
+        self._descriptions: typing.List[typing.Optional[str]] = []
+        # Dictionary encoding: row -> title code, code -> title and back.
+        self._title_codes = array.array("q")
+        self._dictionary: typing.List[typing.Optional[str]] = []
+        self._codes: typing.Dict[str, int] = {}
+        self._free_codes: typing.List[int] = []
+        # title -> sorted ids of the films sharing that title, with the sorted
+        # distinct titles this orders the films by (title, id).
+        self._title_index: typing.Dict[str, typing.List[str]] = {}
+        self._titles: typing.List[str] = []
+        # New titles not inserted in `_titles` yet, see `create_many`.
+        self._deferred_titles: typing.Optional[typing.Set[str]] = None
+        # Built by the first search.
+        self._search_index: typing.Optional[FilmSearchIndex] = None
+        # Aggregates of the films, see `release_year_statistics`.
+        self._counters = FilmCounters()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # Rows.
+
+    @staticmethod
+    def _set_bit(bitmap: bytearray, row: int, value: bool):
+        index, bit = divmod(row, 8)
+        if value:
+            bitmap[index] |= 1 << bit
+        else:
+            bitmap[index] &= ~(1 << bit)
+
+    @staticmethod
+    def _bit(bitmap: bytearray, row: int) -> bool:
+        return bool(bitmap[row >> 3] >> (row & 7) & 1)
+
+    def _allocate(self, film_id: str) -> int:
+        if self._free:
+            row = self._free.pop()
+            self._ids[row] = film_id
+        else:
+            row = len(self._ids)
+            self._ids.append(film_id)
+            self._release_years.append(0)
+            self._versions.append(0)
+            self._generations.append(0)
+            self._title_codes.append(-1)
+            self._descriptions.append(None)
+            if row % 8 == 0:
+                self._live.append(0)
+                self._watched.append(0)
+        self._rows[film_id] = row
+        self._set_bit(self._live, row, True)
+        return row
+
+    def _film(self, row: int) -> Film:
+        return Film(
+            film_id=self._ids[row],
+            title=self._dictionary[self._title_codes[row]],
+            description=self._descriptions[row],
+            release_year=self._release_years[row],
+            watched=self._bit(self._watched, row),
+            version=self._versions[row],
+            generation=self._generations[row],
+        )
+
+    def _count(self, row: int, counted: bool):
+        """
+        Adds the film of a row to the counters, or removes it.
+        """
+        values = (
+            self._dictionary[self._title_codes[row]],
+            self._release_years[row],
+            self._bit(self._watched, row),
+        )
+        if counted:
+            self._counters.add(*values)
+        else:
+            self._counters.remove(*values)
+
+    def _document(self, row: int) -> dict:
+        return {
+            "id": self._ids[row],
+            "title": self._dictionary[self._title_codes[row]],
+            "description": self._descriptions[row],
+            "release_year": self._release_years[row],
+            "watched": self._bit(self._watched, row),
+            "version": self._versions[row],
+        }
+
+    # Titles.
+
+    def _encode(self, title: str) -> int:
+        code = self._codes.get(title)
+        if code is None:
+            if self._free_codes:
+                code = self._free_codes.pop()
+                self._dictionary[code] = title
+            else:
+                code = len(self._dictionary)
+                self._dictionary.append(title)
+            self._codes[title] = code
+        return code
+
+    def _index(self, film_id: str, title: str):
+        ids = self._title_index.get(title)
+        if ids is None:
+            ids = self._title_index[title] = []
+            if self._deferred_titles is not None:
+                self._deferred_titles.add(title)
+            else:
+                bisect.insort(self._titles, title)
+        bisect.insort(ids, film_id)
+
+    def _unindex(self, film_id: str, title: str):
+        ids = self._title_index[title]
+        del ids[bisect.bisect_left(ids, film_id)]
+        if ids:
+            return
+        del self._title_index[title]
+        if self._deferred_titles is not None and title in self._deferred_titles:
+            self._deferred_titles.discard(title)
+        else:
+            del self._titles[bisect.bisect_left(self._titles, title)]
+        # No film has the title anymore, its code is reused.
+        code = self._codes.pop(title)
+        self._dictionary[code] = None
+        self._free_codes.append(code)
+
+    def _set_title(self, row: int, title: str):
+        film_id = self._ids[row]
+        code = self._title_codes[row]
+        if code >= 0:
+            if self._dictionary[code] == title:
+                return
+            self._unindex(film_id, self._dictionary[code])
+        title = intern_value(title)
+        self._title_codes[row] = self._encode(title)
+        self._index(film_id, title)
+
+    def _ids_after(
+        self, after: typing.Optional[typing.Tuple[str, str]]
+    ) -> typing.Iterator[str]:
+        """
+        Yields the ids ordered by (title, id) which come after the `after` key,
+        see `MemoryFilmRepository._ids_after`.
+        """
+        title, film_id = after if after is not None else (None, None)
+        position = 0 if title is None else bisect.bisect_left(self._titles, title)
+        while position < len(self._titles):
+            current = self._titles[position]
+            ids = self._title_index[current]
+            start = bisect.bisect_right(ids, film_id) if current == title else 0
+            yield from ids[start:]
+            position = bisect.bisect_right(self._titles, current)
+
+    def _searchable(self) -> FilmSearchIndex:
+        if self._search_index is None:
+            search_index = FilmSearchIndex()
+            for row in self._rows.values():
+                search_index.add(self._film(row))
+            self._search_index = search_index
+        return self._search_index
+
+    # Writes.
+
+    async def create(self, film: Film):
+        self._create(film)
+
+    def _create(self, film: Film):
+        row = self._rows.get(film.id)
+        version = film.version
+        if row is None:
+            row = self._allocate(film.id)
+            self._generations[row] = new_generation()
+        else:
+            version = self._versions[row] + 1
+            self._count(row, False)
+            if self._search_index is not None:
+                self._search_index.remove(self._film(row))
+        film._version = version
+        film._generation = self._generations[row]
+        self._set_title(row, film.title)
+        self._descriptions[row] = film.description
+        self._release_years[row] = film.release_year
+        self._versions[row] = version
+        self._set_bit(self._watched, row, film.watched)
+        self._count(row, True)
+        if self._search_index is not None:
+            self._search_index.add(film)
+
+    async def create_many(self, films: typing.Sequence[Film]) -> typing.Dict[int, str]:
+        # Like `MemoryFilmRepository.create_many`, new titles are merged at once.
+        if len(films) > DEFERRED_TITLES_MIN_FILMS:
+            self._deferred_titles = set()
+        try:
+            for film in films:
+                self._create(film)
+        finally:
+            deferred, self._deferred_titles = self._deferred_titles, None
+            if deferred:
+                self._titles.extend(sorted(deferred))
+                self._titles.sort()
+        return {}
+
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
+        row = self._rows.get(film_id)
+        if row is None:
+            raise FilmNotFoundException(f"film: {film_id} not found")
+        if (
+            expected_version is not None and self._versions[row] != expected_version
+        ) or (
+            expected_generation is not None
+            and self._generations[row] != expected_generation
+        ):
+            raise VersionConflictException(
+                film_id, expected_version, expected_generation
+            )
+        if "id" in update_parameters:
+            raise RepositoryException("can't update film id.")
+        search_index = None
+        if "title" in update_parameters or "description" in update_parameters:
+            search_index = self._search_index
+        if search_index is not None:
+            search_index.remove(self._film(row))
+        counted = not COUNTED_FIELDS.isdisjoint(update_parameters)
+        if counted:
+            self._count(row, False)
+        try:
+            for key, value in update_parameters.items():
+                if key == "title":
+                    self._set_title(row, value)
+                elif key == "description":
+                    self._descriptions[row] = value
+                elif key == "release_year":
+                    self._release_years[row] = value
+                elif key == "watched":
+                    self._set_bit(self._watched, row, value)
+                elif key == "version":
+                    self._versions[row] = value
+        finally:
+            if search_index is not None:
+                search_index.add(self._film(row))
+            if counted:
+                self._count(row, True)
+        self._versions[row] += 1
+        return self._film(row)
+
+    async def delete(self, film_id: str):
+        row = self._rows.pop(film_id, None)
+        if row is None:
+            return
+        if self._search_index is not None:
+            self._search_index.remove(self._film(row))
+        self._count(row, False)
+        self._unindex(film_id, self._dictionary[self._title_codes[row]])
+        self._ids[row] = None
+        self._descriptions[row] = None
+        self._title_codes[row] = -1
+        self._set_bit(self._live, row, False)
+        self._set_bit(self._watched, row, False)
+        self._free.append(row)
+
+    # Reads.
+
+    async def get_by_id(self, film_id: str) -> typing.Optional[Film]:
+        row = self._rows.get(film_id)
+        return None if row is None else self._film(row)
+
+    async def get_by_ids(
+        self, film_ids: typing.Sequence[str]
+    ) -> typing.Dict[str, Film]:
+        rows = self._rows
+        return {
+            film_id: self._film(rows[film_id])
+            for film_id in film_ids
+            if film_id in rows
+        }
+
+    async def get_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[Film]:
+        return [film async for film in self.iter_by_title(title, skip, limit, after)]
+
+    def _title_rows(
+        self, title: str, skip: int, limit: int, after: typing.Optional[str]
+    ) -> typing.Iterator[int]:
+        ids = self._title_index.get(title, [])
+        start = skip if after is None else bisect.bisect_right(ids, after) + skip
+        stop = None if limit == 0 else start + limit
+        for film_id in ids[start:stop]:
+            row = self._rows.get(film_id)
+            if row is not None:
+                yield row
+
+    async def iter_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[Film]:
+        for row in self._title_rows(title, skip, limit, after):
+            yield self._film(row)
+
+    async def iter_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[dict]:
+        for row in self._title_rows(title, skip, limit, after):
+            yield self._document(row)
+
+    async def get_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[dict]:
+        return [
+            self._document(row) for row in self._title_rows(title, skip, limit, after)
+        ]
+
+    def _all_rows(
+        self, skip: int, limit: int, after: typing.Optional[typing.Tuple[str, str]]
+    ) -> typing.Iterator[int]:
+        stop = None if limit == 0 else skip + limit
+        for film_id in itertools.islice(self._ids_after(after), skip, stop):
+            row = self._rows.get(film_id)
+            if row is not None:
+                yield row
+
+    async def iter_all(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[Film]:
+        for row in self._all_rows(skip, limit, after):
+            yield self._film(row)
+
+    async def iter_all_documents(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        for row in self._all_rows(skip, limit, after):
+            yield self._document(row)
+
+    async def search(
+        self,
+        query: str,
+        mode: SearchMode = SearchMode.TEXT,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> typing.List[Film]:
+        search_index = self._searchable()
+        stop = None if limit == 0 else skip + limit
+        if mode == SearchMode.PREFIX:
+            ids = search_index.prefix(query)
+        elif mode == SearchMode.EXACT:
+            ids = iter(search_index.exact(query))
+        else:
+            ids = iter(search_index.text(query, count=stop or 0))
+        return [
+            self._film(self._rows[film_id])
+            for film_id in itertools.islice(ids, skip, stop)
+        ]
+
+    # Filters.
+
+    def _integer_mask(self, column: array.array, condition: typing.Any) -> int:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        if numpy is not None and all(
+            name in _COMPARISONS and _is_number(operand)
+            for name, operand in condition.items()
+        ):
+            values = numpy.frombuffer(column, dtype=numpy.int64)
+            flags = numpy.ones(len(values), dtype=bool)
+            for name, operand in condition.items():
+                flags &= _COMPARISONS[name](values, operand)
+            # The view is released before the column can grow again.
+            del values
+            return int.from_bytes(
+                numpy.packbits(flags, bitorder="little").tobytes(), "little"
+            )
+        if len(condition) == 1:
+            ((name, operand),) = condition.items()
+            if name in _REFLECTED and _is_number(operand):
+                compare = getattr(operand, _REFLECTED[name])
+                return _mask_from_flags(bytes(map(compare, column)))
+        return _mask_from_flags(bytes(map(_predicate(condition), column)))
+
+    def _field_mask(self, field: str, condition: typing.Any, live: int) -> int:
+        test = _predicate(condition)
+        if field in ("release_year", "version"):
+            column = self._release_years if field == "release_year" else self._versions
+            return self._integer_mask(column, condition) & live
+        if field == "watched":
+            watched = int.from_bytes(self._watched, "little")
+            return (watched if test(True) else 0) | (
+                live & ~watched if test(False) else 0
+            )
+        if field == "title":
+            # Dictionary encoding, the condition is tested once per title.
+            codes = {
+                code
+                for code, title in enumerate(self._dictionary)
+                if title is not None and test(title)
+            }
+            if not codes:
+                return 0
+            if len(codes) == len(self._codes):
+                return live
+            if numpy is not None:
+                flags = numpy.isin(
+                    numpy.frombuffer(self._title_codes, dtype=numpy.int64),
+                    list(codes),
+                )
+                return int.from_bytes(
+                    numpy.packbits(flags, bitorder="little").tobytes(), "little"
+                )
+            return _mask_from_flags(bytes(map(codes.__contains__, self._title_codes)))
+        if field in ("id", "description"):
+            column = self._ids if field == "id" else self._descriptions
+            return live & _mask_from_flags(
+                bytes(map(lambda value: value is not None and test(value), column))
+            )
+        # Films have no such field, MongoDB tests missing fields as null.
+        return live if test(None) else 0
+
+    def _filter_mask(self, filter: dict, live: int) -> int:
+        """
+        Returns the mask of the rows matching a MongoDB filter, as translated
+        by `rule_query`.
+        """
+        mask = live
+        for key, value in filter.items():
+            if key == "$and":
+                for operand in value:
+                    mask &= self._filter_mask(operand, live)
+            elif key == "$or":
+                union = 0
+                for operand in value:
+                    union |= self._filter_mask(operand, live)
+                mask &= union
+            elif key == "$nor":
+                for operand in value:
+                    mask &= ~self._filter_mask(operand, live)
+            elif key == "$expr":
+                if not value:
+                    mask = 0
+            else:
+                mask &= self._field_mask(key, value, live)
+        return mask
+
+    def _matching_mask(self, query: RuleQuery) -> int:
+        return self._filter_mask(query.filter, int.from_bytes(self._live, "little"))
+
+    def _ordered_rows(
+        self, mask: int, after: typing.Optional[typing.Tuple[str, str]]
+    ) -> typing.Iterator[typing.Tuple[int, str]]:
+        """
+        Yields the rows of a mask with their id ordered by (title, id).
+        """
+        matches = bin(mask).count("1")
+        if matches * SORTED_MATCHES_RATIO < len(self._rows):
+            dictionary, codes, ids = self._dictionary, self._title_codes, self._ids
+            keys = sorted(
+                (dictionary[codes[row]], ids[row], row) for row in _mask_rows(mask)
+            )
+            start = 0
+            if after is not None:
+                # Rows are never negative, this sorts before the `after` key.
+                start = bisect.bisect_right(keys, (after[0], after[1], len(ids)))
+            for _, film_id, row in keys[start:]:
+                yield row, film_id
+            return
+        # Rows freed and reused while the films are walked belong to other
+        # films, the ids are compared to the ones the mask was computed for.
+        ids = self._ids.copy()
+        flags = format(mask, f"0{len(ids)}b")[::-1]
+        for film_id in self._ids_after(after):
+            row = self._rows.get(film_id)
+            if row is not None and flags[row] == "1" and ids[row] == film_id:
+                yield row, film_id
+
+    async def iter_documents_matching(
+        self,
+        rule: rule_engine.Rule,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        query = rule_query(rule)
+        count = 0
+        for row, film_id in self._ordered_rows(self._matching_mask(query), after):
+            if self._ids[row] != film_id:
+                # Deleted since the mask was computed.
+                continue
+            document = self._document(row)
+            if query.residual and not query.matches(document):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            yield document
+            count += 1
+            if count == limit:
+                return
+
+    async def count_matching(self, rule: rule_engine.Rule) -> int:
+        query = rule_query(rule)
+        mask = self._matching_mask(query)
+        if not query.residual:
+            return bin(mask).count("1")
+        return sum(1 for row in _mask_rows(mask) if query.matches(self._document(row)))
+
+    async def explain_matching(self, rule: rule_engine.Rule) -> dict:
+        return rule_query(rule).explain()
+
+    # Aggregates.
+
+    async def release_year_statistics(self) -> ReleaseYearStatistics:
+        return self._counters.release_years()
+
+    async def watched_counts(self) -> typing.Tuple[int, int]:
+        return self._counters.watched_counts()
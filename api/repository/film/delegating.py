@@ -0,0 +1,148 @@
+import typing
+
+import rule_engine
+
+from api.entities.film import Film
+from api.repository.film.abstractions import FilmRepository, SearchMode, WriteOperation
+from api.repository.film.statistics import ReleaseYearStatistics
+
+
+class DelegatingFilmRepository(FilmRepository):
+    """
+    DelegatingFilmRepository forwards every call to the repository it wraps.
+
+    It is the base class of the repositories which add a behaviour (caching,
+    instrumentation...) on top of another repository, they only override the
+    methods they change.
+    """
+
+    def __init__(self, repository: FilmRepository):
+        self._repository = repository
+
+    @property
+    def repository(self) -> FilmRepository:
+        """
+        The wrapped repository.
+        """
+        return self._repository
+
+    async def create(self, film: Film):
+        return await self._repository.create(film)
+
+    async def create_many(self, films: typing.Sequence[Film]) -> typing.Dict[int, str]:
+        return await self._repository.create_many(films)
+
+    async def get_by_id(self, film_id: str) -> typing.Optional[Film]:
+        return await self._repository.get_by_id(film_id)
+
+    async def get_by_ids(
+        self, film_ids: typing.Sequence[str]
+    ) -> typing.Dict[str, Film]:
+        return await self._repository.get_by_ids(film_ids)
+
+    async def get_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[Film]:
+        return await self._repository.get_by_title(title, skip, limit, after)
+
+    def iter_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[Film]:
+        return self._repository.iter_by_title(title, skip, limit, after)
+
+    def iter_all(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[Film]:
+        return self._repository.iter_all(skip, limit, after)
+
+    async def search(
+        self,
+        query: str,
+        mode: SearchMode = SearchMode.TEXT,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> typing.List[Film]:
+        return await self._repository.search(query, mode, skip, limit)
+
+    async def get_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[dict]:
+        return await self._repository.get_documents_by_title(title, skip, limit, after)
+
+    def iter_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[dict]:
+        return self._repository.iter_documents_by_title(title, skip, limit, after)
+
+    def iter_all_documents(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        return self._repository.iter_all_documents(skip, limit, after)
+
+    def iter_documents_matching(
+        self,
+        rule: rule_engine.Rule,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        return self._repository.iter_documents_matching(rule, skip, limit, after)
+
+    async def count_matching(self, rule: rule_engine.Rule) -> int:
+        return await self._repository.count_matching(rule)
+
+    async def explain_matching(self, rule: rule_engine.Rule) -> dict:
+        return await self._repository.explain_matching(rule)
+
+    async def release_year_statistics(self) -> ReleaseYearStatistics:
+        return await self._repository.release_year_statistics()
+
+    async def watched_counts(self) -> typing.Tuple[int, int]:
+        return await self._repository.watched_counts()
+
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
+        return await self._repository.update(
+            film_id, update_parameters, expected_version, expected_generation
+        )
+
+    async def delete(self, film_id: str):
+        return await self._repository.delete(film_id)
+
+    async def execute_batch(
+        self, operations: typing.Sequence[WriteOperation]
+    ) -> typing.List[typing.Any]:
+        return await self._repository.execute_batch(operations)
+
+    async def connect(self):
+        return await self._repository.connect()
+
+    async def close(self):
+        return await self._repository.close()
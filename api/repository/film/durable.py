@@ -0,0 +1,516 @@
+"""
+Persistence of the memory repository.
+
+The films are kept in a directory holding generations of two kinds of files:
+
+- `journal-<generation>.ndjson`: the append-only log of the writes, one JSON
+  array per line, `["p", id, title, description, release_year, watched,
+  version, film generation]` puts a film as it is after the write and
+  `["d", id]` deletes one. Records hold whole films, replaying a record twice
+  is harmless. Records written before films had a generation end with the
+  version, their films are at generation 0.
+- `snapshot-<generation>.ndjson`: the compacted films at the start of the
+  journal of the same generation. A header line, `{"format": 1, "films": n}`,
+  is followed by lines holding JSON arrays of up to `SNAPSHOT_CHUNK_SIZE`
+  films, each film shaped like a put record without its tag.
+
+A snapshot is written to a temporary file and renamed once complete, the
+films are recovered from the latest snapshot and the journals of its
+generation and the following ones.
+"""
+
+import asyncio
+import gc
+import logging
+import mmap
+import os
+import re
+import typing
+
+import orjson
+
+from api.entities.film import Film
+from api.repository.film.abstractions import (
+    CreateFilm,
+    DeleteFilm,
+    RepositoryException,
+    UpdateFilm,
+    WriteOperation,
+)
+from api.repository.film.memory import MemoryFilmRepository
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_CHUNK_SIZE = 10000
+
+_FILE_NAME = re.compile(r"^(journal|snapshot)-(\d+)\.ndjson$")
+
+
+def _row(film: Film) -> list:
+    return [
+        film.id,
+        film.title,
+        film.description,
+        film.release_year,
+        film.watched,
+        film.version,
+        film.generation,
+    ]
+
+
+def _film(row: list) -> Film:
+    return Film(
+        film_id=row[0],
+        title=row[1],
+        description=row[2],
+        release_year=row[3],
+        watched=row[4],
+        version=row[5],
+        generation=row[6] if len(row) > 6 else 0,
+    )
+
+
+class DurableMemoryFilmRepository(MemoryFilmRepository):
+    """
+    DurableMemoryFilmRepository is a MemoryFilmRepository whose writes are
+    recorded in a journal, the films are recovered from it by `connect`.
+
+    A write is applied in memory first, then its record is appended to the
+    journal. The records are written by a background task which writes the
+    records of the writes made meanwhile at once, `fsync` tells when they
+    reach the disk:
+
+    - `always`: every batch of records is synced, writes return once their
+      record is synced (group commit).
+    - `interval`: records are written and synced every `fsync_interval`
+      seconds, writes return immediately and the last interval of writes can
+      be lost.
+    - `never`: same as `interval` without syncing, the operating system
+      decides when the records reach the disk.
+
+    Once the journal holds `snapshot_records` records a snapshot is taken and
+    a new journal started, so that the recovery reads a compacted snapshot
+    and a short journal.
+
+    If the journal can't be written, the records written in part are cut
+    from it and the repository turns read only: the writes not recorded are
+    failed, with the `always` policy, and the writes which follow raise
+    RepositoryException. The films in memory may hold writes which aren't in
+    the journal, a restart recovers the films from the journal.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync: str = "always",
+        fsync_interval: float = 0.01,
+        snapshot_records: int = 1_000_000,
+    ):
+        """
+        Parameters
+        ----------
+        path: str
+            The directory holding the journals and the snapshots, it is
+            created if needed.
+        fsync: str
+            When the records are synced to the disk, among `always`,
+            `interval` and `never`.
+        fsync_interval: float
+            The number of seconds between two writes of the journal with the
+            `interval` and `never` policies.
+        snapshot_records: int
+            The number of records of the journal which triggers a snapshot, 0
+            disables the snapshots.
+        """
+        if fsync not in ("always", "interval", "never"):
+            raise ValueError(f"unknown fsync policy: {fsync}")
+        super().__init__()
+        self._path = path
+        self._fsync = fsync
+        self._fsync_interval = fsync_interval
+        self._snapshot_records = snapshot_records
+        self._generation = 0
+        self._fd: typing.Optional[int] = None
+        # Records not written yet and futures of the writes waiting for them.
+        self._records: typing.List[bytes] = []
+        self._waiters: typing.List[asyncio.Future] = []
+        # Number of records of the current journal.
+        self._journal_records = 0
+        self._flusher: typing.Optional[asyncio.Task] = None
+        # Set by `_rotate`, resolved once the next journal is started.
+        self._rotation: typing.Optional[asyncio.Future] = None
+        self._snapshot_task: typing.Optional[asyncio.Task] = None
+        # Set once a write of the journal failed, the repository is read only.
+        self._failure: typing.Optional[RepositoryException] = None
+
+    def _file(self, kind: str, generation: int) -> str:
+        return os.path.join(self._path, f"{kind}-{generation:012d}.ndjson")
+
+    async def connect(self):
+        if self._fd is not None:
+            return
+        # The recovery allocates millions of objects which live as long as the
+        # process, the cyclic garbage collector would scan them over and over
+        # while they are created and then on every full collection.
+        # refer - https://docs.python.org/3/library/gc.html#gc.freeze
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._recover)
+        finally:
+            if enabled:
+                gc.enable()
+        gc.freeze()
+
+    def _recover(self):
+        os.makedirs(self._path, exist_ok=True)
+        generations: typing.Dict[str, typing.List[int]] = {
+            "journal": [],
+            "snapshot": [],
+        }
+        for name in os.listdir(self._path):
+            match = _FILE_NAME.match(name)
+            if match is not None:
+                generations[match.group(1)].append(int(match.group(2)))
+            elif name.endswith(".tmp"):
+                # A snapshot which wasn't completed.
+                os.remove(os.path.join(self._path, name))
+
+        films: typing.Dict[str, Film] = {}
+        start = 0
+        if generations["snapshot"]:
+            start = max(generations["snapshot"])
+            films = self._read_snapshot(self._file("snapshot", start))
+        journals = sorted(
+            generation for generation in generations["journal"] if generation >= start
+        )
+        records = 0
+        for generation in journals:
+            records = self._replay(
+                self._file("journal", generation),
+                films,
+                last=generation == journals[-1],
+            )
+        self._load(films)
+        self._generation = journals[-1] if journals else max(start, 1)
+        self._journal_records = records
+        self._fd = os.open(
+            self._file("journal", self._generation),
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+            0o644,
+        )
+        logger.info(
+            "recovered %d films from %s, generation %d",
+            len(films),
+            self._path,
+            self._generation,
+        )
+
+    @staticmethod
+    def _read_snapshot(file: str) -> typing.Dict[str, Film]:
+        films: typing.Dict[str, Film] = {}
+        with open(file, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped:
+            # The chunks are parsed straight from the mapping, the file isn't
+            # copied in memory.
+            view = memoryview(mapped)
+            try:
+                end = mapped.find(b"\n")
+                header = orjson.loads(view[:end])
+                if header.get("format") != SNAPSHOT_FORMAT:
+                    raise RepositoryException(f"unknown snapshot format: {file}")
+                position = end + 1
+                while position < len(mapped):
+                    end = mapped.find(b"\n", position)
+                    for row in orjson.loads(view[position:end]):
+                        films[row[0]] = _film(row)
+                    position = end + 1
+            finally:
+                view.release()
+        if len(films) != header["films"]:
+            raise RepositoryException(f"incomplete snapshot: {file}")
+        return films
+
+    @staticmethod
+    def _replay(file: str, films: typing.Dict[str, Film], last: bool) -> int:
+        """
+        Applies the records of a journal to `films`, returns their number.
+
+        A record cut short by a crash at the end of the last journal is
+        dropped, any other unreadable record is an error.
+        """
+        with open(file, "rb") as f:
+            data = f.read()
+        records = 0
+        position = 0
+        while position < len(data):
+            end = data.find(b"\n", position)
+            try:
+                if end == -1:
+                    raise orjson.JSONDecodeError("missing end of line", "", 0)
+                record = orjson.loads(data[position:end])
+            except orjson.JSONDecodeError:
+                if last and (end == -1 or data.find(b"\n", end + 1) == -1):
+                    logger.warning("dropping truncated record of %s", file)
+                    os.truncate(file, position)
+                    break
+                raise RepositoryException(f"corrupted journal: {file}")
+            if record[0] == "p":
+                films[record[1]] = _film(record[1:])
+            else:
+                films.pop(record[1], None)
+            records += 1
+            position = end + 1
+        return records
+
+    def _check_writable(self):
+        if self._failure is not None:
+            raise self._failure
+
+    async def create(self, film: Film):
+        self._check_writable()
+        await super().create(film)
+        await self._append([["p", *_row(film)]])
+
+    async def create_many(self, films: typing.Sequence[Film]) -> typing.Dict[int, str]:
+        self._check_writable()
+        await super().create_many(films)
+        await self._append([["p", *_row(film)] for film in films])
+        return {}
+
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
+        self._check_writable()
+        film = await super().update(
+            film_id, update_parameters, expected_version, expected_generation
+        )
+        await self._append([["p", *_row(film)]])
+        return film
+
+    async def delete(self, film_id: str):
+        self._check_writable()
+        if film_id in self._storage:
+            await super().delete(film_id)
+            await self._append([["d", film_id]])
+
+    async def execute_batch(
+        self, operations: typing.Sequence[WriteOperation]
+    ) -> typing.List[typing.Any]:
+        # The records of the batch are appended together, the batch waits for
+        # a single sync of the journal.
+        self._check_writable()
+        results: typing.List[typing.Any] = []
+        records: typing.List[list] = []
+        for operation in operations:
+            try:
+                if isinstance(operation, CreateFilm):
+                    await super().create(operation.film)
+                    records.append(["p", *_row(operation.film)])
+                    results.append(None)
+                elif isinstance(operation, UpdateFilm):
+                    film = await super().update(
+                        operation.film_id, operation.update_parameters
+                    )
+                    records.append(["p", *_row(film)])
+                    results.append(film)
+                elif isinstance(operation, DeleteFilm):
+                    if operation.film_id in self._storage:
+                        await super().delete(operation.film_id)
+                        records.append(["d", operation.film_id])
+                    results.append(None)
+                else:
+                    raise RepositoryException(
+                        f"unsupported write: {type(operation).__name__}"
+                    )
+            except Exception as e:
+                results.append(e)
+        if records:
+            await self._append(records)
+        return results
+
+    async def _append(self, records: typing.List[list]):
+        """
+        Appends the records of writes applied in memory to the journal, with
+        the `always` policy returns once they are synced.
+        """
+        if self._fd is None:
+            raise RepositoryException("the film repository isn't connected")
+        self._check_writable()
+        for record in records:
+            self._records.append(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+        self._journal_records += len(records)
+        loop = asyncio.get_running_loop()
+        if self._flusher is None:
+            self._flusher = loop.create_task(self._flush())
+        if (
+            self._snapshot_records
+            and self._journal_records >= self._snapshot_records
+            and self._snapshot_task is None
+        ):
+            self._snapshot_task = loop.create_task(self._snapshot())
+        if self._fsync == "always":
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+    async def _flush(self):
+        """
+        Writes the records until there are none left.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while self._records or self._rotation is not None:
+                if self._fsync != "always":
+                    await asyncio.sleep(self._fsync_interval)
+                records, self._records = self._records, []
+                waiters, self._waiters = self._waiters, []
+                try:
+                    await loop.run_in_executor(None, self._write, b"".join(records))
+                except OSError as e:
+                    self._fail(e, waiters)
+                    return
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+                if self._rotation is not None:
+                    self._start_journal()
+        finally:
+            self._flusher = None
+
+    def _fail(self, error: OSError, waiters: typing.List[asyncio.Future]):
+        """
+        Turns the repository read only, fails the writes waiting for their
+        records and the rotation of the journal.
+        """
+        logger.error("film journal write failed, the films are read only: %s", error)
+        self._failure = RepositoryException(f"journal write failed: {error}")
+        waiters += self._waiters
+        self._records, self._waiters = [], []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_exception(self._failure)
+        rotation, self._rotation = self._rotation, None
+        if rotation is not None:
+            rotation.set_exception(self._failure)
+
+    def _write(self, data: bytes):
+        offset = os.lseek(self._fd, 0, os.SEEK_END)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view) :]
+            if self._fsync != "never":
+                os.fsync(self._fd)
+        except OSError:
+            # Cuts the records written in part, the journal must end with a
+            # whole record for the following ones to be readable.
+            try:
+                os.ftruncate(self._fd, offset)
+            except OSError as e:
+                # The records which follow aren't written, a record cut short
+                # at the end of the journal is dropped by the recovery.
+                logger.error("film journal truncation failed: %s", e)
+            raise
+
+    def _start_journal(self):
+        rotation, self._rotation = self._rotation, None
+        try:
+            fd = os.open(
+                self._file("journal", self._generation + 1),
+                os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                0o644,
+            )
+        except OSError as e:
+            rotation.set_exception(e)
+            return
+        os.close(self._fd)
+        self._fd = fd
+        self._generation += 1
+        self._journal_records = 0
+        rotation.set_result(self._generation)
+
+    async def _rotate(self) -> int:
+        """
+        Starts a new journal once the records written so far are in the
+        current one, returns its generation.
+        """
+        self._check_writable()
+        if self._rotation is None:
+            self._rotation = asyncio.get_running_loop().create_future()
+            if self._flusher is None:
+                self._flusher = asyncio.get_running_loop().create_task(self._flush())
+        return await asyncio.shield(self._rotation)
+
+    async def snapshot(self):
+        """
+        Writes a snapshot of the films and removes the journals and the
+        snapshots it replaces.
+        """
+        generation = await self._rotate()
+        # Every write made from now on is recorded in the new journal, the
+        # writes made while the snapshot is written are replayed on top of it.
+        films = list(self._storage.values())
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._write_snapshot, generation, films
+        )
+
+    async def _snapshot(self):
+        try:
+            await self.snapshot()
+        except Exception as e:
+            logger.error("film snapshot failed: %s", e)
+        finally:
+            self._snapshot_task = None
+
+    def _write_snapshot(self, generation: int, films: typing.List[Film]):
+        file = self._file("snapshot", generation)
+        with open(file + ".tmp", "wb") as f:
+            f.write(
+                orjson.dumps(
+                    {"format": SNAPSHOT_FORMAT, "films": len(films)},
+                    option=orjson.OPT_APPEND_NEWLINE,
+                )
+            )
+            for start in range(0, len(films), SNAPSHOT_CHUNK_SIZE):
+                f.write(
+                    orjson.dumps(
+                        [
+                            _row(film)
+                            for film in films[start : start + SNAPSHOT_CHUNK_SIZE]
+                        ],
+                        option=orjson.OPT_APPEND_NEWLINE,
+                    )
+                )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(file + ".tmp", file)
+        self._sync_directory()
+        for name in os.listdir(self._path):
+            match = _FILE_NAME.match(name)
+            if match is not None and int(match.group(2)) < generation:
+                os.remove(os.path.join(self._path, name))
+        logger.info("film snapshot %d written: %d films", generation, len(films))
+
+    def _sync_directory(self):
+        # Makes the rename durable.
+        fd = os.open(self._path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    async def close(self):
+        if self._snapshot_task is not None:
+            await asyncio.wait({self._snapshot_task})
+        if self._flusher is not None:
+            await asyncio.wait({self._flusher})
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,117 @@
+"""
+Builds the film repository described by the settings.
+"""
+
+import logging
+
+from api.metrics import application_metrics
+from api.repository.film.abstractions import FilmRepository
+from api.repository.film.batching import BatchingFilmRepository
+from api.repository.film.caching import CachingFilmRepository
+from api.repository.film.coalescing import CoalescingFilmRepository
+from api.repository.film.columnar import ColumnarFilmRepository
+from api.repository.film.delegating import DelegatingFilmRepository
+from api.repository.film.durable import DurableMemoryFilmRepository
+from api.repository.film.instrumented import InstrumentedFilmRepository
+from api.repository.film.memory import MemoryFilmRepository
+from api.repository.film.mongo import MongoFilmRepository
+from api.repository.film.single_flight import SingleFlightFilmRepository
+from api.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def mongo_client_options(settings: Settings) -> dict:
+    """
+    Returns the options of the Motor client, the connection pool and the wire
+    compression.
+
+    Refer - https://pymongo.readthedocs.io/en/4.3.3/api/pymongo/mongo_client.html
+    """
+    options = {
+        "maxPoolSize": settings.mongo_max_pool_size or None,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "maxIdleTimeMS": settings.mongo_max_idle_time_ms,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+    }
+    if settings.mongo_compressors:
+        options["compressors"] = settings.mongo_compressors
+    if settings.enable_metrics:
+        options["event_listeners"] = [application_metrics().mongo_pool]
+    return options
+
+
+def create_film_repository(settings: Settings) -> FilmRepository:
+    """
+    Creates the film repository with the wrappers enabled by the settings,
+    see `open_film_repository` to get it ready to serve requests.
+    """
+    if settings.film_repository_backend == "memory" and settings.film_memory_path:
+        repo = DurableMemoryFilmRepository(
+            settings.film_memory_path,
+            fsync=settings.film_journal_fsync,
+            fsync_interval=settings.film_journal_fsync_interval_ms / 1000,
+            snapshot_records=settings.film_snapshot_journal_records,
+        )
+    elif settings.film_repository_backend == "memory":
+        repo = MemoryFilmRepository()
+    elif settings.film_repository_backend == "columnar":
+        repo = ColumnarFilmRepository()
+    else:
+        repo = MongoFilmRepository(
+            connection_string=settings.mongo_connection_string,
+            database=settings.mongo_database_name,
+            cursor_batch_size=settings.mongo_cursor_batch_size,
+            **mongo_client_options(settings),
+        )
+    if settings.enable_metrics:
+        repo = InstrumentedFilmRepository(repo, application_metrics())
+    if settings.film_write_batching_enabled:
+        repo = BatchingFilmRepository(
+            repo,
+            window=settings.film_write_batch_window_ms / 1000,
+            max_batch_size=settings.film_write_batch_max_size,
+        )
+    if settings.film_coalesce_reads:
+        repo = CoalescingFilmRepository(
+            repo, max_batch_size=settings.film_coalesce_max_batch_size
+        )
+    if settings.film_single_flight_enabled:
+        repo = SingleFlightFilmRepository(repo)
+    if settings.film_cache_enabled:
+        repo = CachingFilmRepository(
+            repo,
+            max_entries=settings.film_cache_max_entries,
+            max_bytes=settings.film_cache_max_bytes,
+            ttl=settings.film_cache_ttl,
+        )
+    return repo
+
+
+def innermost_repository(repo: FilmRepository) -> FilmRepository:
+    """
+    Returns the repository wrapped by `repo` and its wrappers, if any.
+    """
+    while isinstance(repo, DelegatingFilmRepository):
+        repo = repo.repository
+    return repo
+
+
+async def open_film_repository(settings: Settings) -> FilmRepository:
+    """
+    Creates the film repository, connects it and starts building the indexes
+    it needs, the build doesn't delay the startup.
+
+    Raises RepositoryException if the storage can't be reached.
+    """
+    repo = create_film_repository(settings)
+    storage = innermost_repository(repo)
+    try:
+        await repo.connect()
+        if settings.mongo_ensure_indexes and isinstance(storage, MongoFilmRepository):
+            storage.build_indexes()
+    except BaseException:
+        await repo.close()
+        raise
+    logger.info("film repository ready: %s", type(storage).__name__)
+    return repo
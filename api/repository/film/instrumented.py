@@ -0,0 +1,241 @@
+import time
+import typing
+
+import rule_engine
+
+from api.entities.film import Film
+from api.metrics import ApplicationMetrics
+from api.repository.film.abstractions import FilmRepository, SearchMode, WriteOperation
+from api.repository.film.delegating import DelegatingFilmRepository
+from api.repository.film.statistics import ReleaseYearStatistics
+
+OPERATIONS = (
+    "create",
+    "create_many",
+    "get_by_id",
+    "get_by_ids",
+    "get_by_title",
+    "iter_by_title",
+    "iter_all",
+    "search",
+    "get_documents_by_title",
+    "iter_documents_by_title",
+    "iter_all_documents",
+    "iter_documents_matching",
+    "count_matching",
+    "release_year_statistics",
+    "watched_counts",
+    "update",
+    "delete",
+    "execute_batch",
+)
+
+
+class _OperationMetrics:
+    __slots__ = ("duration", "errors")
+
+    def __init__(self, metrics: ApplicationMetrics, operation: str):
+        self.duration = metrics.repository_duration.labels(operation)
+        self.errors = metrics.repository_errors.labels(operation)
+
+
+class InstrumentedFilmRepository(DelegatingFilmRepository):
+    """
+    InstrumentedFilmRepository records the duration and the failures of every
+    operation of the repository it wraps.
+
+    The time of the `iter_*` operations is the time spent waiting for the
+    wrapped iterator, the time the caller spends between two items isn't
+    counted.
+    """
+
+    def __init__(self, repository: FilmRepository, metrics: ApplicationMetrics):
+        """
+        Parameters
+        ----------
+        repository: FilmRepository
+            The repository whose operations are measured.
+        metrics: ApplicationMetrics
+            The metrics the measures are recorded in.
+        """
+        super().__init__(repository)
+        self._operations = {
+            operation: _OperationMetrics(metrics, operation) for operation in OPERATIONS
+        }
+
+    async def _timed(self, operation: str, awaitable: typing.Awaitable):
+        operation_metrics = self._operations[operation]
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        except BaseException:
+            operation_metrics.errors.inc()
+            raise
+        finally:
+            operation_metrics.duration.observe(time.perf_counter() - start)
+
+    async def _timed_iter(
+        self, operation: str, iterator: typing.AsyncIterator
+    ) -> typing.AsyncIterator:
+        operation_metrics = self._operations[operation]
+        iterator = iterator.__aiter__()
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    elapsed += time.perf_counter() - start
+                    return
+                elapsed += time.perf_counter() - start
+                yield item
+        except GeneratorExit:
+            # The caller stopped iterating early.
+            raise
+        except BaseException:
+            operation_metrics.errors.inc()
+            raise
+        finally:
+            operation_metrics.duration.observe(elapsed)
+
+    async def create(self, film: Film):
+        return await self._timed("create", self._repository.create(film))
+
+    async def create_many(self, films: typing.Sequence[Film]) -> typing.Dict[int, str]:
+        return await self._timed("create_many", self._repository.create_many(films))
+
+    async def get_by_id(self, film_id: str) -> typing.Optional[Film]:
+        return await self._timed("get_by_id", self._repository.get_by_id(film_id))
+
+    async def get_by_ids(
+        self, film_ids: typing.Sequence[str]
+    ) -> typing.Dict[str, Film]:
+        return await self._timed("get_by_ids", self._repository.get_by_ids(film_ids))
+
+    async def get_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[Film]:
+        return await self._timed(
+            "get_by_title", self._repository.get_by_title(title, skip, limit, after)
+        )
+
+    def iter_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[Film]:
+        return self._timed_iter(
+            "iter_by_title", self._repository.iter_by_title(title, skip, limit, after)
+        )
+
+    def iter_all(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[Film]:
+        return self._timed_iter(
+            "iter_all", self._repository.iter_all(skip, limit, after)
+        )
+
+    async def search(
+        self,
+        query: str,
+        mode: SearchMode = SearchMode.TEXT,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> typing.List[Film]:
+        return await self._timed(
+            "search", self._repository.search(query, mode, skip, limit)
+        )
+
+    async def get_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[dict]:
+        return await self._timed(
+            "get_documents_by_title",
+            self._repository.get_documents_by_title(title, skip, limit, after),
+        )
+
+    def iter_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[dict]:
+        return self._timed_iter(
+            "iter_documents_by_title",
+            self._repository.iter_documents_by_title(title, skip, limit, after),
+        )
+
+    def iter_all_documents(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        return self._timed_iter(
+            "iter_all_documents",
+            self._repository.iter_all_documents(skip, limit, after),
+        )
+
+    def iter_documents_matching(
+        self,
+        rule: rule_engine.Rule,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        return self._timed_iter(
+            "iter_documents_matching",
+            self._repository.iter_documents_matching(rule, skip, limit, after),
+        )
+
+    async def count_matching(self, rule: rule_engine.Rule) -> int:
+        return await self._timed(
+            "count_matching", self._repository.count_matching(rule)
+        )
+
+    async def release_year_statistics(self) -> ReleaseYearStatistics:
+        return await self._timed(
+            "release_year_statistics", self._repository.release_year_statistics()
+        )
+
+    async def watched_counts(self) -> typing.Tuple[int, int]:
+        return await self._timed("watched_counts", self._repository.watched_counts())
+
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
+        return await self._timed(
+            "update",
+            self._repository.update(
+                film_id, update_parameters, expected_version, expected_generation
+            ),
+        )
+
+    async def delete(self, film_id: str):
+        return await self._timed("delete", self._repository.delete(film_id))
+
+    async def execute_batch(
+        self, operations: typing.Sequence[WriteOperation]
+    ) -> typing.List[typing.Any]:
+        return await self._timed(
+            "execute_batch", self._repository.execute_batch(operations)
+        )
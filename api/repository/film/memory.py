@@ -1,7 +1,25 @@
+import bisect
+import itertools
 import typing
 
-from api.entities.film import Film
-from api.repository.film.abstractions import FilmRepository, RepositoryException
+from api.entities.film import Film, intern_value
+from api.repository.film.abstractions import (
+    FilmNotFoundException,
+    FilmRepository,
+    RepositoryException,
+    SearchMode,
+    VersionConflictException,
+    new_generation,
+)
+from api.repository.film.search import FilmSearchIndex
+from api.repository.film.statistics import (
+    COUNTED_FIELDS,
+    FilmCounters,
+    ReleaseYearStatistics,
+)
+
+# Number of films from which `create_many` merges the new titles at once.
+DEFERRED_TITLES_MIN_FILMS = 64
 
 
 class MemoryFilmRepository(FilmRepository):
@@ -13,35 +31,258 @@ class MemoryFilmRepository(FilmRepository):
     def __init__(self):
         # in-memory database
         self._storage = {}
+        # Secondary index: title -> sorted ids of the films sharing that title.
+        self._title_index: typing.Dict[str, typing.List[str]] = {}
+        # Sorted distinct titles, together with the sorted ids of each title
+        # this orders the films by (title, id) for keyset pagination.
+        self._titles: typing.List[str] = []
+        # Built by the first search, see `_searchable`, so that catalogues
+        # which are never searched don't pay for it.
+        self._search_index: typing.Optional[FilmSearchIndex] = None
+        # New titles not inserted in `_titles` yet, see `create_many`.
+        self._deferred_titles: typing.Optional[typing.Set[str]] = None
+        # Aggregates of the films, see `release_year_statistics`.
+        self._counters = FilmCounters()
+
+    def _index(self, film: Film):
+        ids = self._title_index.get(film.title)
+        if ids is None:
+            ids = self._title_index[film.title] = []
+            if self._deferred_titles is not None:
+                self._deferred_titles.add(film.title)
+            else:
+                bisect.insort(self._titles, film.title)
+        bisect.insort(ids, film.id)
+
+    def _unindex(self, film: Film):
+        ids = self._title_index.get(film.title)
+        if ids is None:
+            return
+        position = bisect.bisect_left(ids, film.id)
+        if position < len(ids) and ids[position] == film.id:
+            del ids[position]
+        if not ids:
+            del self._title_index[film.title]
+            if (
+                self._deferred_titles is not None
+                and film.title in self._deferred_titles
+            ):
+                self._deferred_titles.discard(film.title)
+            else:
+                del self._titles[bisect.bisect_left(self._titles, film.title)]
+
+    def _load(self, storage: typing.Dict[str, Film]):
+        """
+        Replaces the films of the repository with `storage`, films by id, the
+        indexes are built once instead of film by film.
+        """
+        title_index: typing.Dict[str, typing.List[str]] = {}
+        counters = FilmCounters()
+        for film in storage.values():
+            counters.add(film.title, film.release_year, film.watched)
+            ids = title_index.get(film.title)
+            if ids is None:
+                ids = title_index[film.title] = []
+            ids.append(film.id)
+        for ids in title_index.values():
+            ids.sort()
+        self._storage = storage
+        self._title_index = title_index
+        self._titles = sorted(title_index)
+        self._search_index = None
+        self._counters = counters
+
+    def _searchable(self) -> FilmSearchIndex:
+        if self._search_index is None:
+            search_index = FilmSearchIndex()
+            for film in self._storage.values():
+                search_index.add(film)
+            self._search_index = search_index
+        return self._search_index
 
     async def create(self, film: Film):
+        self._create(film)
+
+    def _create(self, film: Film):
+        existing = self._storage.get(film.id)
+        if existing is not None:
+            film._version = existing.version + 1
+            film._generation = existing.generation
+        else:
+            film._generation = new_generation()
         self._storage[film.id] = film
+        if existing is not None:
+            self._counters.remove(
+                existing.title, existing.release_year, existing.watched
+            )
+        self._counters.add(film.title, film.release_year, film.watched)
+        if self._search_index is not None:
+            if existing is not None:
+                self._search_index.remove(existing)
+            self._search_index.add(film)
+        if existing is not None and existing.title == film.title:
+            return
+        if existing is not None:
+            self._unindex(existing)
+        self._index(film)
+
+    async def create_many(self, films: typing.Sequence[Film]) -> typing.Dict[int, str]:
+        # Inserting titles one by one in the sorted `_titles` moves half of
+        # the list every time, past a few new titles they are merged at once.
+        if len(films) > DEFERRED_TITLES_MIN_FILMS:
+            self._deferred_titles = set()
+        try:
+            for film in films:
+                self._create(film)
+        finally:
+            deferred, self._deferred_titles = self._deferred_titles, None
+            if deferred:
+                # Sorting two sorted runs merges them in linear time.
+                self._titles.extend(sorted(deferred))
+                self._titles.sort()
+        return {}
 
     async def get_by_id(self, film_id: str) -> typing.Optional[Film]:
         return self._storage.get(film_id)
 
+    async def get_by_ids(
+        self, film_ids: typing.Sequence[str]
+    ) -> typing.Dict[str, Film]:
+        storage = self._storage
+        return {film_id: storage[film_id] for film_id in film_ids if film_id in storage}
+
     async def get_by_title(
-        self, title: str, skip: int = 0, limit: int = 1000
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[Film]:
+        return [film async for film in self.iter_by_title(title, skip, limit, after)]
+
+    async def iter_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[Film]:
+        ids = self._title_index.get(title, [])
+        # Seek to the page with a binary search, only the page is copied so the
+        # index can change while it is being consumed.
+        start = skip if after is None else bisect.bisect_right(ids, after) + skip
+        stop = None if limit == 0 else start + limit
+        for film_id in ids[start:stop]:
+            film = self._storage.get(film_id)
+            if film is not None:
+                yield film
+
+    def _ids_after(
+        self, after: typing.Optional[typing.Tuple[str, str]]
+    ) -> typing.Iterator[str]:
+        """
+        Yields the ids ordered by (title, id) which come after the `after` key.
+
+        Ids are read one title at a time and the next title is searched again
+        from the last one, so the index can change while ids are consumed.
+        """
+        title, film_id = after if after is not None else (None, None)
+        position = 0 if title is None else bisect.bisect_left(self._titles, title)
+        while position < len(self._titles):
+            current = self._titles[position]
+            ids = self._title_index[current]
+            start = bisect.bisect_right(ids, film_id) if current == title else 0
+            yield from ids[start:]
+            position = bisect.bisect_right(self._titles, current)
+
+    async def iter_all(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[Film]:
+        stop = None if limit == 0 else skip + limit
+        for film_id in itertools.islice(self._ids_after(after), skip, stop):
+            film = self._storage.get(film_id)
+            if film is not None:
+                yield film
+
+    async def search(
+        self,
+        query: str,
+        mode: SearchMode = SearchMode.TEXT,
+        skip: int = 0,
+        limit: int = 100,
     ) -> typing.List[Film]:
-        return_value = []
-        for _, value in self._storage.items():
-            if title == value.title:
-                return_value.append(value)
-        if limit == 0:
-            return return_value[skip:]
-        return return_value[skip : skip + limit]
-
-    async def update(self, film_id: str, update_parameters: dict):
+        search_index = self._searchable()
+        stop = None if limit == 0 else skip + limit
+        if mode == SearchMode.PREFIX:
+            ids = search_index.prefix(query)
+        elif mode == SearchMode.EXACT:
+            ids = iter(search_index.exact(query))
+        else:
+            ids = iter(search_index.text(query, count=stop or 0))
+        return [self._storage[film_id] for film_id in itertools.islice(ids, skip, stop)]
+
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
         film = self._storage.get(film_id)
         if film is None:
-            raise RepositoryException(f"film: {film_id} not found")
+            raise FilmNotFoundException(f"film: {film_id} not found")
+        if (expected_version is not None and film.version != expected_version) or (
+            expected_generation is not None and film.generation != expected_generation
+        ):
+            raise VersionConflictException(
+                film_id, expected_version, expected_generation
+            )
+        if "id" in update_parameters:
+            raise RepositoryException(f"can't update film id.")
+        search_index = None
+        if "title" in update_parameters or "description" in update_parameters:
+            search_index = self._search_index
+        if search_index is not None:
+            search_index.remove(film)
+        counted = not COUNTED_FIELDS.isdisjoint(update_parameters)
+        if counted:
+            self._counters.remove(film.title, film.release_year, film.watched)
+        try:
+            self._update(film, update_parameters)
+        finally:
+            if search_index is not None:
+                search_index.add(film)
+            if counted:
+                self._counters.add(film.title, film.release_year, film.watched)
+        film._version += 1
+        return film
+
+    def _update(self, film: Film, update_parameters: dict):
         for key, value in update_parameters.items():
-            if key == "id":
-                raise RepositoryException(f"can't update film id.")
             # Check that update_parameters are fields from Film entity.
             if hasattr(film, key):
-                # Update the Film entity field.
+                # Update the Film entity field, keeping the title index in sync.
+                if key == "title":
+                    self._unindex(film)
+                if key in ("title", "release_year"):
+                    value = intern_value(value)
                 setattr(film, f"_{key}", value)
+                if key == "title":
+                    self._index(film)
 
     async def delete(self, film_id: str):
-        self._storage.pop(film_id, None)
+        film = self._storage.pop(film_id, None)
+        if film is not None:
+            self._unindex(film)
+            self._counters.remove(film.title, film.release_year, film.watched)
+            if self._search_index is not None:
+                self._search_index.remove(film)
+
+    async def release_year_statistics(self) -> ReleaseYearStatistics:
+        return self._counters.release_years()
+
+    async def watched_counts(self) -> typing.Tuple[int, int]:
+        return self._counters.watched_counts()
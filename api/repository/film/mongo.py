@@ -1,9 +1,45 @@
+import asyncio
+import logging
 import typing
 
 import motor.motor_asyncio
+import pymongo
+import rule_engine
+from pymongo.collation import Collation, CollationStrength
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
 
 from api.entities.film import Film
-from api.repository.film.abstractions import FilmRepository, RepositoryException
+from api.repository.film.abstractions import (
+    CreateFilm,
+    DeleteFilm,
+    FilmNotFoundException,
+    FilmRepository,
+    RepositoryException,
+    SearchMode,
+    UpdateFilm,
+    VersionConflictException,
+    WriteOperation,
+    film_document,
+    new_generation,
+)
+from api.repository.film.rule_query import rule_query
+from api.repository.film.search import TITLE_WEIGHT
+from api.repository.film.statistics import ReleaseYearStatistics
+
+logger = logging.getLogger(__name__)
+
+# Compares strings ignoring case but not diacritics.
+# refer - https://www.mongodb.com/docs/manual/reference/collation/
+CASE_INSENSITIVE = Collation(locale="en", strength=CollationStrength.SECONDARY)
+
+
+def _log_index_build(task: asyncio.Task):
+    if task.cancelled():
+        logger.info("films index build cancelled")
+    elif task.exception() is not None:
+        logger.error("films index build failed: %s", task.exception())
+    else:
+        logger.info("films index build completed")
 
 
 class MongoFilmRepository(FilmRepository):
@@ -19,19 +55,137 @@ class MongoFilmRepository(FilmRepository):
     Refer - https://motor.readthedocs.io/en/stable/
     """
 
+    # Indexes required by the queries of this repository.
+    # - `id` backs the upsert in `create`, `get_by_id`, `update` and `delete`.
+    # - `title` + `id` backs `get_by_title` and gives a stable sort order
+    #   to paginate on.
+    # - `title_ci` is the same index compared case insensitively, it backs the
+    #   prefix and exact searches which use the same collation.
+    # - `release_year_title` covers the release year statistics, they are
+    #   computed from the index without reading the documents.
+    # - `title_description_text` backs the text search, a collection holds a
+    #   single text index.
+    # Since MongoDB 4.2 every build only locks the collection at its start and
+    # end, the former `background` option is ignored.
+    INDEXES = [
+        pymongo.IndexModel([("id", pymongo.ASCENDING)], name="id_unique", unique=True),
+        pymongo.IndexModel(
+            [("title", pymongo.ASCENDING), ("id", pymongo.ASCENDING)],
+            name="title_id",
+        ),
+        pymongo.IndexModel(
+            [("title", pymongo.ASCENDING), ("id", pymongo.ASCENDING)],
+            name="title_ci",
+            collation=CASE_INSENSITIVE,
+        ),
+        pymongo.IndexModel(
+            [("release_year", pymongo.ASCENDING), ("title", pymongo.ASCENDING)],
+            name="release_year_title",
+        ),
+        pymongo.IndexModel(
+            [("title", pymongo.TEXT), ("description", pymongo.TEXT)],
+            name="title_description_text",
+            weights={"title": TITLE_WEIGHT, "description": 1},
+        ),
+    ]
+
+    # Fields read from the film documents, `_id` is left out so documents
+    # can be serialized as they are.
+    PROJECTION = {
+        "_id": False,
+        "id": True,
+        "title": True,
+        "description": True,
+        "release_year": True,
+        "watched": True,
+        "version": True,
+    }
+    # Single films are read with their generation as well, see `Film.generation`.
+    FILM_PROJECTION = {**PROJECTION, "generation": True}
+
     def __init__(
         self,
         connection_string: str = "mongodb://localhost:27017",
         database: str = "film_track_db",
+        bulk_write_batch_size: int = 1000,
+        cursor_batch_size: int = 1000,
+        **client_kwargs,
     ):
         # TODO
         # refer -
         # https://motor.readthedocs.io/en/stable/tutorial-asyncio.html#creating-a-client
-        self._client = motor.motor_asyncio.AsyncIOMotorClient(connection_string)
+        # `client_kwargs` are passed to the client as they are, e.g. the
+        # `event_listeners` reporting the connection pool metrics.
+        self._client = motor.motor_asyncio.AsyncIOMotorClient(
+            connection_string, **client_kwargs
+        )
         self._database = self._client[database]
         # Film collection which holds our film documents.
         # https://motor.readthedocs.io/en/stable/tutorial-asyncio.html#getting-a-collection
         self._films = self._database["films"]
+        # Maximum number of operations sent in a single `bulk_write` call.
+        self._bulk_write_batch_size = bulk_write_batch_size
+        # Number of documents fetched per round trip when iterating a cursor.
+        self._cursor_batch_size = cursor_batch_size
+        # Number of connections opened by `connect`.
+        self._warm_connections = client_kwargs.get("minPoolSize") or 1
+        # Task running `ensure_indexes`, see `build_indexes`.
+        self._index_build: typing.Optional[asyncio.Task] = None
+
+    async def connect(self):
+        """
+        Checks the server is reachable and opens `minPoolSize` connections
+        (at least one) so the first requests don't wait for connections to be
+        established.
+
+        Refer - https://www.mongodb.com/docs/manual/reference/command/ping/
+        """
+        try:
+            await asyncio.gather(
+                *(self._database.command("ping") for _ in range(self._warm_connections))
+            )
+        except PyMongoError as e:
+            raise RepositoryException(f"MongoDB is unreachable: {e}")
+
+    async def close(self):
+        if self._index_build is not None and not self._index_build.done():
+            # The server carries on with the builds it started.
+            self._index_build.cancel()
+            await asyncio.wait([self._index_build])
+        self._client.close()
+
+    def build_indexes(self) -> asyncio.Task:
+        """
+        Starts `ensure_indexes` in a task and returns it, requests are served
+        while the indexes are built. The outcome of the build is logged and
+        `close` cancels a build still in progress.
+        """
+        if self._index_build is None:
+            self._index_build = asyncio.create_task(self.ensure_indexes())
+            self._index_build.add_done_callback(_log_index_build)
+        return self._index_build
+
+    async def ensure_indexes(self) -> dict:
+        """
+        Creates the indexes declared in `INDEXES` if they don't exist yet and
+        returns the index information of the films collection.
+
+        The collection stays available while an index is built. Creating an
+        index which already exists is a no-op on the server.
+        """
+        try:
+            await self._films.create_indexes(self.INDEXES)
+        except OperationFailure as e:
+            # e.g. duplicated ids prevent the unique index from being built.
+            logger.error("films index creation failed: %s", e)
+        index_information = await self._films.index_information()
+        for name in (index.document["name"] for index in self.INDEXES):
+            logger.info(
+                "films index %s: %s",
+                name,
+                "ready" if name in index_information else "missing",
+            )
+        return index_information
 
     async def create(self, film: Film):
         # We are using `update_one` function to avoid duplicates
@@ -39,62 +193,434 @@ class MongoFilmRepository(FilmRepository):
         # TODO
         # refer -
         # https://motor.readthedocs.io/en/stable/tutorial-asyncio.html#updating-documents
-        await self._films.update_one(
-            {"id": film.id},
-            {
-                "$set": {
-                    "id": film.id,
-                    "title": film.title,
-                    "description": film.description,
-                    "release_year": film.release_year,
-                    "watched": film.watched,
-                }
-            },
-            upsert=True,
+        await self._films.update_one({"id": film.id}, self._upsert(film), upsert=True)
+
+    async def create_many(self, films: typing.Sequence[Film]) -> typing.Dict[int, str]:
+        # Same upsert as `create`, sent as unordered `bulk_write` batches so the
+        # server can apply the operations of a batch in parallel and a failing
+        # operation doesn't stop the rest of the batch.
+        # TODO
+        # refer -
+        # https://pymongo.readthedocs.io/en/stable/examples/bulk.html#unordered-bulk-write-operations
+        errors: typing.Dict[int, str] = {}
+        for offset in range(0, len(films), self._bulk_write_batch_size):
+            operations = [
+                pymongo.UpdateOne({"id": film.id}, self._upsert(film), upsert=True)
+                for film in films[offset : offset + self._bulk_write_batch_size]
+            ]
+            try:
+                await self._films.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    errors[offset + write_error["index"]] = write_error["errmsg"]
+            except PyMongoError as e:
+                # Some writes of the batch may have been applied, their outcome
+                # is unknown. The next batches are still sent.
+                for index in range(offset, offset + len(operations)):
+                    errors[index] = str(e)
+        return errors
+
+    @staticmethod
+    def _to_document(film: Film) -> dict:
+        document = film_document(film)
+        # The version is maintained by the server, see `_upsert` and `update`.
+        del document["version"]
+        return document
+
+    @classmethod
+    def _upsert(cls, film: Film) -> dict:
+        """
+        Returns the update writing `film`, a new film is at version 1 and a
+        replaced film gets the next version. The generation is only set when
+        the film is inserted, a replaced film keeps it.
+        """
+        return {
+            "$set": cls._to_document(film),
+            "$inc": {"version": 1},
+            "$setOnInsert": {"generation": new_generation()},
+        }
+
+    @staticmethod
+    def _to_film(document: dict) -> Film:
+        return Film(
+            film_id=document.get("id"),
+            title=document.get("title"),
+            description=document.get("description"),
+            release_year=document.get("release_year"),
+            watched=document.get("watched"),
+            # Films written before versions existed are at version 0.
+            version=document.get("version", 0),
+            generation=document.get("generation", 0),
         )
 
     async def get_by_id(self, film_id: str) -> typing.Optional[Film]:
         # TODO
         # refer
         # https://motor.readthedocs.io/en/stable/tutorial-asyncio.html#getting-a-single-document-with-find-one
-        document = await self._films.find_one({"id": film_id})
+        document = await self._films.find_one({"id": film_id}, self.FILM_PROJECTION)
         if document:
-            return Film(
-                film_id=document.get("id"),
-                title=document.get("title"),
-                description=document.get("description"),
-                release_year=document.get("release_year"),
-                watched=document.get("watched"),
-            )
+            return self._to_film(document)
         return None
 
+    async def get_by_ids(
+        self, film_ids: typing.Sequence[str]
+    ) -> typing.Dict[str, Film]:
+        # A single round trip served by the `id_unique` index.
+        # refer - https://www.mongodb.com/docs/manual/reference/operator/query/in/
+        if not film_ids:
+            return {}
+        cursor = self._films.find(
+            {"id": {"$in": list(set(film_ids))}},
+            self.FILM_PROJECTION,
+            batch_size=self._cursor_batch_size,
+        )
+        return {document["id"]: self._to_film(document) async for document in cursor}
+
+    def _search(
+        self, query: str, mode: SearchMode, skip: int, limit: int
+    ) -> motor.motor_asyncio.AsyncIOMotorCursor:
+        if mode == SearchMode.TEXT:
+            # refer - https://www.mongodb.com/docs/manual/reference/operator/query/text/
+            score = {"$meta": "textScore"}
+            return (
+                self._films.find(
+                    {"$text": {"$search": query}},
+                    {**self.PROJECTION, "score": score},
+                    batch_size=self._cursor_batch_size,
+                )
+                .sort([("score", score), ("id", pymongo.ASCENDING)])
+                .skip(skip)
+                .limit(limit)
+            )
+        if mode == SearchMode.PREFIX:
+            # U+FFFF sorts after every character in the collation, the range
+            # holds the titles starting with the query.
+            # refer - https://unicode.org/reports/tr35/tr35-collation.html#tailored_noncharacter_weights
+            condition = {"$gte": query, "$lt": query + "\uffff"}
+        else:
+            condition = query
+        return (
+            self._films.find(
+                {"title": condition},
+                self.PROJECTION,
+                batch_size=self._cursor_batch_size,
+                collation=CASE_INSENSITIVE,
+            )
+            .sort([("title", pymongo.ASCENDING), ("id", pymongo.ASCENDING)])
+            .skip(skip)
+            .limit(limit)
+        )
+
+    async def search(
+        self,
+        query: str,
+        mode: SearchMode = SearchMode.TEXT,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> typing.List[Film]:
+        return [
+            self._to_film(document)
+            async for document in self._search(query, mode, skip, limit)
+        ]
+
+    def _find_by_title(
+        self, title: str, skip: int, limit: int, after: typing.Optional[str]
+    ) -> motor.motor_asyncio.AsyncIOMotorCursor:
+        query: dict = {"title": title}
+        if after is not None:
+            # Keyset pagination, the `title_id` index seeks straight to the page.
+            query["id"] = {"$gt": after}
+        return (
+            self._films.find(query, self.PROJECTION, batch_size=self._cursor_batch_size)
+            .sort("id", pymongo.ASCENDING)
+            .skip(skip)
+            .limit(limit)
+        )
+
+    def _find_all(
+        self,
+        skip: int,
+        limit: int,
+        after: typing.Optional[typing.Tuple[str, str]],
+        query: typing.Optional[dict] = None,
+    ) -> motor.motor_asyncio.AsyncIOMotorCursor:
+        query = query or {}
+        if after is not None:
+            title, film_id = after
+            keyset = {
+                "$or": [
+                    {"title": {"$gt": title}},
+                    {"title": title, "id": {"$gt": film_id}},
+                ]
+            }
+            query = {"$and": [keyset, query]} if query else keyset
+        return (
+            self._films.find(query, self.PROJECTION, batch_size=self._cursor_batch_size)
+            .sort([("title", pymongo.ASCENDING), ("id", pymongo.ASCENDING)])
+            .skip(skip)
+            .limit(limit)
+        )
+
     async def get_by_title(
-        self, title: str, skip: int = 0, limit: int = 1000
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
     ) -> typing.List[Film]:
-        return_value: typing.List[Film] = []
-        # Get cursor from db.
-        documents_cursor = self._films.find({"title": title}).skip(skip).limit(limit)
-        # Iterate though documents
-        async for document in documents_cursor:
-            return_value.append(
-                Film(
-                    film_id=document.get("id"),
-                    title=document.get("title"),
-                    description=document.get("description"),
-                    release_year=document.get("release_year"),
-                    watched=document.get("watched"),
-                )
+        return [film async for film in self.iter_by_title(title, skip, limit, after)]
+
+    async def iter_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[Film]:
+        # Iterate though documents, the cursor fetches them batch by batch.
+        async for document in self._find_by_title(title, skip, limit, after):
+            yield self._to_film(document)
+
+    async def iter_all(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[Film]:
+        async for document in self._find_all(skip, limit, after):
+            yield self._to_film(document)
+
+    # The documents returned by the projection are already shaped like
+    # `FilmResponse`, they are handed out as they come from the driver.
+
+    async def get_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[dict]:
+        return await self._find_by_title(title, skip, limit, after).to_list(None)
+
+    def iter_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[str] = None,
+    ) -> typing.AsyncIterator[dict]:
+        return self._find_by_title(title, skip, limit, after)
+
+    def iter_all_documents(
+        self,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        return self._find_all(skip, limit, after)
+
+    async def iter_documents_matching(
+        self,
+        rule: rule_engine.Rule,
+        skip: int = 0,
+        limit: int = 0,
+        after: typing.Optional[typing.Tuple[str, str]] = None,
+    ) -> typing.AsyncIterator[dict]:
+        # The translated part of the rule is evaluated by the server, with its
+        # indexes, only the films it returns are matched in process.
+        query = rule_query(rule)
+        if not query.residual:
+            async for document in self._find_all(skip, limit, after, query.filter):
+                yield document
+            return
+        count = 0
+        async for document in self._find_all(0, 0, after, query.filter):
+            if not query.matches(document):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            yield document
+            count += 1
+            if count == limit:
+                return
+
+    async def count_matching(self, rule: rule_engine.Rule) -> int:
+        query = rule_query(rule)
+        if not query.residual:
+            return await self._films.count_documents(query.filter)
+        return await super().count_matching(rule)
+
+    async def explain_matching(self, rule: rule_engine.Rule) -> dict:
+        return rule_query(rule).explain()
+
+    # Aggregation pipelines.
+    # Refer - https://www.mongodb.com/docs/manual/core/aggregation-pipeline/
+
+    RELEASE_YEAR_PIPELINE = [
+        # Sorting on the `release_year_title` keys and projecting them only
+        # lets the server read the index instead of the documents.
+        {"$sort": {"release_year": 1, "title": 1}},
+        {"$project": {"_id": False, "release_year": True, "title": True}},
+        {
+            "$group": {
+                "_id": {"release_year": "$release_year", "title": "$title"},
+                "films": {"$sum": 1},
+            }
+        },
+        {
+            "$group": {
+                "_id": "$_id.release_year",
+                "films": {"$sum": "$films"},
+                "titles": {"$sum": 1},
+            }
+        },
+        {"$sort": {"_id": 1}},
+    ]
+
+    WATCHED_PIPELINE = [{"$group": {"_id": "$watched", "films": {"$sum": 1}}}]
+
+    async def release_year_statistics(self) -> ReleaseYearStatistics:
+        return {
+            document["_id"]: (document["films"], document["titles"])
+            async for document in self._films.aggregate(
+                self.RELEASE_YEAR_PIPELINE, allowDiskUse=True
             )
-        return return_value
+        }
+
+    async def watched_counts(self) -> typing.Tuple[int, int]:
+        counts = {
+            document["_id"]: document["films"]
+            async for document in self._films.aggregate(self.WATCHED_PIPELINE)
+        }
+        return counts.get(True, 0), counts.get(False, 0)
+
+    @staticmethod
+    def _update_document(update_parameters: dict) -> dict:
+        update: dict = {"$inc": {"version": 1}}
+        if update_parameters:
+            update["$set"] = update_parameters
+        return update
 
-    async def update(self, film_id: str, update_parameters: dict):
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
         if "id" in update_parameters.keys():
             raise RepositoryException("can't update film id.")
-        result = await self._films.update_one(
-            {"id": film_id}, {"$set": update_parameters}
+        query: dict = {"id": film_id}
+        # Films written before versions and generations existed have no such
+        # fields.
+        if expected_version is not None:
+            query["version"] = expected_version if expected_version else None
+        if expected_generation is not None:
+            query["generation"] = expected_generation if expected_generation else None
+        update = self._update_document(update_parameters)
+        # The version check, the update and the read of the updated film are
+        # a single atomic operation.
+        # TODO
+        # refer -
+        # https://pymongo.readthedocs.io/en/stable/api/pymongo/collection.html#pymongo.collection.Collection.find_one_and_update
+        document = await self._films.find_one_and_update(
+            query,
+            update,
+            projection=self.FILM_PROJECTION,
+            return_document=pymongo.ReturnDocument.AFTER,
         )
-        if result.modified_count == 0:
-            raise RepositoryException(f"film: {film_id} not updated")
+        if document is not None:
+            return self._to_film(document)
+        expected = expected_version is not None or expected_generation is not None
+        if expected and await self._films.count_documents({"id": film_id}, limit=1):
+            raise VersionConflictException(
+                film_id, expected_version, expected_generation
+            )
+        raise FilmNotFoundException(f"film: {film_id} not found")
 
     async def delete(self, film_id: str):
         await self._films.delete_one({"id": film_id})
+
+    async def execute_batch(
+        self, operations: typing.Sequence[WriteOperation]
+    ) -> typing.List[typing.Any]:
+        # The writes are sent as unordered `bulk_write` batches, see
+        # `create_many`. The films updated are read back with a single `$in`
+        # query once the batch is written, the read isn't atomic with the
+        # update, another writer could have changed them meanwhile.
+        # TODO
+        # refer -
+        # https://pymongo.readthedocs.io/en/stable/api/pymongo/collection.html#pymongo.collection.Collection.bulk_write
+        results: typing.List[typing.Any] = [None] * len(operations)
+        requests: list = []
+        # Position in `operations` of each request.
+        positions: typing.List[int] = []
+        for position, operation in enumerate(operations):
+            if isinstance(operation, CreateFilm):
+                request = pymongo.UpdateOne(
+                    {"id": operation.film_id},
+                    self._upsert(operation.film),
+                    upsert=True,
+                )
+            elif isinstance(operation, UpdateFilm):
+                if "id" in operation.update_parameters:
+                    results[position] = RepositoryException("can't update film id.")
+                    continue
+                request = pymongo.UpdateOne(
+                    {"id": operation.film_id},
+                    self._update_document(operation.update_parameters),
+                )
+            elif isinstance(operation, DeleteFilm):
+                request = pymongo.DeleteOne({"id": operation.film_id})
+            else:
+                results[position] = RepositoryException(
+                    f"unsupported write: {type(operation).__name__}"
+                )
+                continue
+            requests.append(request)
+            positions.append(position)
+
+        failed: typing.Set[int] = set()
+        for offset in range(0, len(requests), self._bulk_write_batch_size):
+            batch_positions = positions[offset : offset + self._bulk_write_batch_size]
+            try:
+                await self._films.bulk_write(
+                    requests[offset : offset + self._bulk_write_batch_size],
+                    ordered=False,
+                )
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    position = batch_positions[write_error["index"]]
+                    results[position] = RepositoryException(write_error["errmsg"])
+                    failed.add(position)
+            except PyMongoError as e:
+                # Some writes of the batch may have been applied, their
+                # outcome is unknown.
+                for position in batch_positions:
+                    results[position] = e
+                    failed.add(position)
+
+        updated = [
+            position
+            for position in positions
+            if position not in failed and isinstance(operations[position], UpdateFilm)
+        ]
+        if updated:
+            try:
+                films = await self.get_by_ids(
+                    [operations[position].film_id for position in updated]
+                )
+            except PyMongoError as e:
+                for position in updated:
+                    results[position] = e
+                return results
+            for position in updated:
+                film_id = operations[position].film_id
+                film = films.get(film_id)
+                results[position] = (
+                    film
+                    if film is not None
+                    else FilmNotFoundException(f"film: {film_id} not found")
+                )
+        return results
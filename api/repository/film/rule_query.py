@@ -0,0 +1,257 @@
+"""
+Translation of rule_engine rules into MongoDB queries.
+
+The parts of a rule which have a MongoDB equivalent are pushed down as a
+filter document, the server evaluates them next to the data. The parts which
+don't (arithmetic, attributes, comparisons between fields...) are left to
+be evaluated in process on the documents returned by the filter, a rule is
+only pushed down as far as it can be without changing its meaning.
+
+Refer - https://zerosteiner.github.io/rule-engine/syntax.html
+"""
+
+import decimal
+import re
+import typing
+from functools import lru_cache
+
+import rule_engine
+import rule_engine.ast as ast
+
+# rule_engine operator -> MongoDB operator.
+_COMPARISONS = {
+    "eq": "$eq",
+    "ne": "$ne",
+    "lt": "$lt",
+    "le": "$lte",
+    "gt": "$gt",
+    "ge": "$gte",
+}
+# The operator of a comparison whose symbol is written on the right,
+# `2000 <= release_year` is `release_year >= 2000`.
+_SWAPPED = {"eq": "eq", "ne": "ne", "lt": "gt", "le": "ge", "gt": "lt", "ge": "le"}
+
+_LITERALS = (
+    ast.BooleanExpression,
+    ast.DatetimeExpression,
+    ast.FloatExpression,
+    ast.NullExpression,
+    ast.StringExpression,
+)
+
+
+class _Untranslatable(Exception):
+    pass
+
+
+class RuleQuery:
+    """
+    RuleQuery is a rule split in the MongoDB `filter` and the `residual`
+    expressions, evaluated in process, a document matches the rule if it
+    matches both.
+    """
+
+    def __init__(self, filter: dict, residual: typing.List[ast.ExpressionBase]):
+        self.filter = filter
+        self.residual = residual
+
+    def matches(self, document: dict) -> bool:
+        """
+        Evaluates the residual expressions on a document returned by the filter.
+        """
+        return all(expression.evaluate(document) for expression in self.residual)
+
+    def explain(self) -> dict:
+        return {
+            "filter": self.filter,
+            "residual": " and ".join(render(expression) for expression in self.residual)
+            or None,
+        }
+
+
+@lru_cache(maxsize=1024)
+def rule_query(rule: rule_engine.Rule) -> RuleQuery:
+    """
+    Translates a rule, translations are kept for the rules used last.
+    """
+    filters: typing.List[dict] = []
+    residual: typing.List[ast.ExpressionBase] = []
+    for expression in _conjuncts(rule.statement.expression):
+        try:
+            filters.append(_translate(expression))
+        except _Untranslatable:
+            residual.append(expression)
+    if not filters:
+        return RuleQuery({}, residual)
+    return RuleQuery(filters[0] if len(filters) == 1 else {"$and": filters}, residual)
+
+
+def _conjuncts(expression: ast.ExpressionBase) -> typing.Iterator[ast.ExpressionBase]:
+    """
+    Yields the operands of the `and` expressions at the top of `expression`,
+    they are translated separately so that an operand which can't be doesn't
+    keep the others from being pushed down.
+    """
+    if isinstance(expression, ast.LogicExpression) and expression.type == "and":
+        yield from _conjuncts(expression.left)
+        yield from _conjuncts(expression.right)
+    else:
+        yield expression
+
+
+def _field(expression: ast.ExpressionBase) -> str:
+    if isinstance(expression, ast.SymbolExpression) and expression.scope is None:
+        return expression.name
+    raise _Untranslatable()
+
+
+def _value(expression: ast.ExpressionBase) -> typing.Any:
+    if not isinstance(expression, _LITERALS):
+        raise _Untranslatable()
+    value = expression.value
+    if isinstance(value, decimal.Decimal):
+        # rule_engine numbers are decimals, BSON has no such type.
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def _regex(expression: ast.FuzzyComparisonExpression) -> typing.Tuple[str, str]:
+    field = _field(expression.left)
+    if not isinstance(expression.right, ast.StringExpression):
+        raise _Untranslatable()
+    pattern = expression.right.value
+    if expression.type.endswith("fzm"):
+        # `=~` matches at the beginning of the value like `re.match`.
+        pattern = f"^(?:{pattern})"
+    return field, pattern
+
+
+def _regex_options(expression: ast.ExpressionBase) -> str:
+    flags = expression.context.regex_flags
+    return "".join(
+        option
+        for flag, option in (
+            (re.IGNORECASE, "i"),
+            (re.MULTILINE, "m"),
+            (re.DOTALL, "s"),
+        )
+        if flags & flag
+    )
+
+
+def _translate(expression: ast.ExpressionBase) -> dict:
+    """
+    Returns the filter document matching the same documents as `expression`,
+    raises _Untranslatable if there is none.
+    """
+    if isinstance(expression, ast.LogicExpression):
+        operator = "$and" if expression.type == "and" else "$or"
+        return {operator: [_translate(expression.left), _translate(expression.right)]}
+
+    if isinstance(expression, ast.UnaryExpression) and expression.type == "not":
+        return {"$nor": [_translate(expression.right)]}
+
+    if isinstance(expression, ast.SymbolExpression):
+        field = _field(expression)
+        if expression.result_type != rule_engine.DataType.BOOLEAN:
+            raise _Untranslatable()
+        return {field: True}
+
+    if isinstance(expression, ast.FuzzyComparisonExpression):
+        field, pattern = _regex(expression)
+        regex = {"$regex": pattern}
+        options = _regex_options(expression)
+        if options:
+            regex["$options"] = options
+        if expression.type.startswith("eq"):
+            return {field: regex}
+        # $not accepts $regex from MongoDB 4.0.7.
+        return {field: {"$not": regex}}
+
+    if isinstance(
+        expression, (ast.ComparisonExpression, ast.ArithmeticComparisonExpression)
+    ):
+        operator = expression.type
+        try:
+            field, value = _field(expression.left), _value(expression.right)
+        except _Untranslatable:
+            field, value = _field(expression.right), _value(expression.left)
+            operator = _SWAPPED[operator]
+        if operator not in _COMPARISONS:
+            raise _Untranslatable()
+        if value is None and operator not in ("eq", "ne"):
+            raise _Untranslatable()
+        return {field: {_COMPARISONS[operator]: value}}
+
+    if isinstance(expression, ast.ContainsExpression):
+        if isinstance(expression.container, ast.ArrayExpression):
+            # `title in ["A", "B"]`
+            field = _field(expression.member)
+            return {
+                field: {"$in": [_value(item) for item in expression.container.value]}
+            }
+        # `"word" in description`
+        field = _field(expression.container)
+        value = _value(expression.member)
+        if not isinstance(value, str):
+            raise _Untranslatable()
+        return {field: {"$regex": re.escape(value)}}
+
+    if isinstance(expression, ast.BooleanExpression):
+        return {} if expression.value else {"$expr": False}
+
+    raise _Untranslatable()
+
+
+_OPERATORS = {
+    "eq": "==",
+    "ne": "!=",
+    "lt": "<",
+    "le": "<=",
+    "gt": ">",
+    "ge": ">=",
+    "eq_fzm": "=~",
+    "eq_fzs": "=~~",
+    "ne_fzm": "!~",
+    "ne_fzs": "!~~",
+    "add": "+",
+    "sub": "-",
+    "mul": "*",
+    "tdiv": "/",
+    "fdiv": "//",
+    "mod": "%",
+    "pow": "**",
+    "and": "and",
+    "or": "or",
+}
+
+
+def render(expression: ast.ExpressionBase) -> str:
+    """
+    Renders an expression back to the rule language, for explanations.
+    """
+    if isinstance(expression, ast.SymbolExpression):
+        return expression.name if expression.scope is None else f"${expression.name}"
+    if isinstance(expression, ast.StringExpression):
+        return '"' + expression.value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    if isinstance(expression, ast.NullExpression):
+        return "null"
+    if isinstance(expression, ast.BooleanExpression):
+        return "true" if expression.value else "false"
+    if isinstance(expression, ast.FloatExpression):
+        return str(_value(expression))
+    if isinstance(expression, ast.DatetimeExpression):
+        return f'd"{expression.value.isoformat()}"'
+    if isinstance(expression, ast.ArrayExpression):
+        return "[" + ", ".join(render(item) for item in expression.value) + "]"
+    if isinstance(expression, ast.UnaryExpression):
+        prefix = "not " if expression.type == "not" else "-"
+        return prefix + render(expression.right)
+    if isinstance(expression, ast.ContainsExpression):
+        return f"{render(expression.member)} in {render(expression.container)}"
+    if isinstance(expression, ast.GetAttributeExpression):
+        return f"{render(expression.object)}.{expression.name}"
+    if isinstance(expression, ast.LeftOperatorRightExpressionBase):
+        operator = _OPERATORS.get(expression.type, expression.type)
+        return f"({render(expression.left)} {operator} {render(expression.right)})"
+    return f"<{type(expression).__name__}>"
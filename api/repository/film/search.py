@@ -0,0 +1,127 @@
+"""
+In memory search indexes of the film repository.
+"""
+
+import bisect
+import collections
+import heapq
+import re
+import typing
+
+from api.entities.film import Film
+
+_WORD = re.compile(r"\w+")
+
+# Weight of a word of the title relative to a word of the description.
+TITLE_WEIGHT = 10
+
+
+def words(text: str) -> typing.List[str]:
+    """
+    Splits a text in case folded words.
+    """
+    return _WORD.findall(text.casefold())
+
+
+class FilmSearchIndex:
+    """
+    FilmSearchIndex indexes films for `FilmRepository.search`.
+
+    - Case folded titles are kept sorted with the sorted ids of their films,
+      a prefix is found with a binary search and its matches are contiguous,
+      like in a trie, so a lookup costs O(log n + matches).
+    - Words of the titles and descriptions map to the ids holding them with a
+      score (an inverted index), a text query only reads the postings of its
+      words.
+
+    Words are neither stemmed nor filtered, unlike MongoDB text indexes.
+    """
+
+    def __init__(self):
+        # case folded title -> sorted ids of the films with that title.
+        self._folded_ids: typing.Dict[str, typing.List[str]] = {}
+        # Sorted case folded titles.
+        self._folded_titles: typing.List[str] = []
+        # word -> film id -> score of the word in the film.
+        self._postings: typing.Dict[str, typing.Dict[str, int]] = {}
+
+    @staticmethod
+    def _scores(film: Film) -> typing.Dict[str, int]:
+        scores: typing.Dict[str, int] = collections.Counter(words(film.description))
+        for word in words(film.title):
+            scores[word] = scores.get(word, 0) + TITLE_WEIGHT
+        return scores
+
+    def add(self, film: Film):
+        folded = film.title.casefold()
+        ids = self._folded_ids.get(folded)
+        if ids is None:
+            ids = self._folded_ids[folded] = []
+            bisect.insort(self._folded_titles, folded)
+        bisect.insort(ids, film.id)
+        for word, score in self._scores(film).items():
+            self._postings.setdefault(word, {})[film.id] = score
+
+    def remove(self, film: Film):
+        """
+        Removes a film, `film` must hold the values it was added with.
+        """
+        folded = film.title.casefold()
+        ids = self._folded_ids.get(folded)
+        if ids is not None:
+            position = bisect.bisect_left(ids, film.id)
+            if position < len(ids) and ids[position] == film.id:
+                del ids[position]
+            if not ids:
+                del self._folded_ids[folded]
+                del self._folded_titles[bisect.bisect_left(self._folded_titles, folded)]
+        for word in self._scores(film):
+            postings = self._postings.get(word)
+            if postings is None:
+                continue
+            postings.pop(film.id, None)
+            if not postings:
+                del self._postings[word]
+
+    def exact(self, query: str) -> typing.Sequence[str]:
+        """
+        Returns the sorted ids of the films whose title is `query`, ignoring
+        case. The sequence belongs to the index, it must not be modified nor
+        kept across writes.
+        """
+        return self._folded_ids.get(query.casefold(), ())
+
+    def prefix(self, query: str) -> typing.Iterator[str]:
+        """
+        Yields the ids of the films whose title starts with `query`, ignoring
+        case, ordered by title.
+        """
+        folded = query.casefold()
+        titles = self._folded_titles
+        position = bisect.bisect_left(titles, folded)
+        while position < len(titles) and titles[position].startswith(folded):
+            yield from self._folded_ids[titles[position]]
+            position += 1
+
+    def text(self, query: str, count: int = 0) -> typing.List[str]:
+        """
+        Returns the ids of the `count` best films holding any word of `query`
+        (all of them if `count` is 0), by decreasing score then id.
+        """
+        postings = [self._postings.get(word, {}) for word in set(words(query))]
+        if len(postings) == 1:
+            scores = postings[0]
+        else:
+            scores = {}
+            for word_postings in postings:
+                for film_id, score in word_postings.items():
+                    scores[film_id] = scores.get(film_id, 0) + score
+
+        def rank(film_id: str) -> tuple:
+            return -scores[film_id], film_id
+
+        if count:
+            # Only the requested page is sorted, the words shared by most films
+            # can match a large part of the catalogue.
+            return heapq.nsmallest(count, scores, key=rank)
+        return sorted(scores, key=rank)
@@ -0,0 +1,109 @@
+import typing
+
+from api.entities.film import Film
+from api.repository.film.abstractions import FilmRepository, SearchMode, WriteOperation
+from api.repository.film.delegating import DelegatingFilmRepository
+from api.single_flight import SingleFlight
+
+
+class SingleFlightFilmRepository(DelegatingFilmRepository):
+    """
+    SingleFlightFilmRepository runs identical concurrent reads of the
+    repository it wraps once, the other callers wait for the read in flight
+    and get a copy of its result.
+
+    A read only joins the reads which started after the last write made
+    through this repository completed, so that a read following a write
+    never returns the data from before it.
+    """
+
+    def __init__(self, repository: FilmRepository):
+        super().__init__(repository)
+        self.reads = SingleFlight("film_reads")
+        # Bumped once every write completes, part of the keys of the reads.
+        self._generation = 0
+
+    async def create(self, film: Film):
+        try:
+            return await self._repository.create(film)
+        finally:
+            self._generation += 1
+
+    async def create_many(self, films: typing.Sequence[Film]) -> typing.Dict[int, str]:
+        try:
+            return await self._repository.create_many(films)
+        finally:
+            self._generation += 1
+
+    async def get_by_id(self, film_id: str) -> typing.Optional[Film]:
+        return await self.reads.do(
+            ("get_by_id", self._generation, film_id),
+            lambda: self._repository.get_by_id(film_id),
+        )
+
+    async def get_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[Film]:
+        films = await self.reads.do(
+            ("get_by_title", self._generation, title, skip, limit, after),
+            lambda: self._repository.get_by_title(title, skip, limit, after),
+        )
+        return list(films)
+
+    async def search(
+        self,
+        query: str,
+        mode: SearchMode = SearchMode.TEXT,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> typing.List[Film]:
+        films = await self.reads.do(
+            ("search", self._generation, query, mode, skip, limit),
+            lambda: self._repository.search(query, mode, skip, limit),
+        )
+        return list(films)
+
+    async def get_documents_by_title(
+        self,
+        title: str,
+        skip: int = 0,
+        limit: int = 1000,
+        after: typing.Optional[str] = None,
+    ) -> typing.List[dict]:
+        documents = await self.reads.do(
+            ("get_documents_by_title", self._generation, title, skip, limit, after),
+            lambda: self._repository.get_documents_by_title(title, skip, limit, after),
+        )
+        return list(documents)
+
+    async def update(
+        self,
+        film_id: str,
+        update_parameters: dict,
+        expected_version: typing.Optional[int] = None,
+        expected_generation: typing.Optional[int] = None,
+    ) -> Film:
+        try:
+            return await self._repository.update(
+                film_id, update_parameters, expected_version, expected_generation
+            )
+        finally:
+            self._generation += 1
+
+    async def delete(self, film_id: str):
+        try:
+            return await self._repository.delete(film_id)
+        finally:
+            self._generation += 1
+
+    async def execute_batch(
+        self, operations: typing.Sequence[WriteOperation]
+    ) -> typing.List[typing.Any]:
+        try:
+            return await self._repository.execute_batch(operations)
+        finally:
+            self._generation += 1
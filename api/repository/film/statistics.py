@@ -0,0 +1,78 @@
+"""
+Aggregates of the film catalogue kept up to date as films are written.
+"""
+
+import typing
+
+# Fields of the films the counters depend on, other writes leave them as they are.
+COUNTED_FIELDS = frozenset(("title", "release_year", "watched"))
+
+# release year -> (number of films, number of distinct titles).
+ReleaseYearStatistics = typing.Dict[int, typing.Tuple[int, int]]
+
+
+class FilmCounters:
+    """
+    FilmCounters counts the films by release year, by title within a release
+    year and the watched films. The in memory repositories add and remove the
+    films as they are written so that statistics are read without reading
+    every film.
+    """
+
+    __slots__ = ("films", "watched", "_years", "_totals")
+
+    def __init__(self):
+        self.films = 0
+        self.watched = 0
+        # release year -> title -> number of films.
+        self._years: typing.Dict[int, typing.Dict[str, int]] = {}
+        # release year -> [number of films, number of distinct titles].
+        self._totals: typing.Dict[int, typing.List[int]] = {}
+
+    def add(self, title: str, release_year: int, watched: bool):
+        self.films += 1
+        if watched:
+            self.watched += 1
+        titles = self._years.get(release_year)
+        if titles is None:
+            titles = self._years[release_year] = {}
+            self._totals[release_year] = [0, 0]
+        totals = self._totals[release_year]
+        totals[0] += 1
+        count = titles.get(title, 0)
+        if not count:
+            totals[1] += 1
+        titles[title] = count + 1
+
+    def remove(self, title: str, release_year: int, watched: bool):
+        self.films -= 1
+        if watched:
+            self.watched -= 1
+        titles = self._years[release_year]
+        totals = self._totals[release_year]
+        totals[0] -= 1
+        count = titles[title] - 1
+        if count:
+            titles[title] = count
+        else:
+            del titles[title]
+            totals[1] -= 1
+            if not titles:
+                del self._years[release_year]
+                del self._totals[release_year]
+
+    def release_years(self) -> ReleaseYearStatistics:
+        """
+        Returns the number of films and of distinct titles of every release
+        year, ordered by year, in O(release years).
+        """
+        return {
+            year: (films, titles)
+            for year, (films, titles) in sorted(self._totals.items())
+        }
+
+    def watched_counts(self) -> typing.Tuple[int, int]:
+        """
+        Returns the number of watched and unwatched films.
+        """
+        return self.watched, self.films - self.watched
@@ -0,0 +1,77 @@
+"""
+Rules filtering films, written in the rule_engine language over the fields
+of the film documents, e.g. `release_year >= 2000 and not watched`.
+
+Refer - https://zerosteiner.github.io/rule-engine/syntax.html
+"""
+
+import re
+from functools import lru_cache
+
+import rule_engine
+
+from api.cache import TTLCache
+from api.settings import settings_instance
+
+# The fields a rule can refer to and their types, rules referring to other
+# symbols or comparing fields to values of another type are rejected when
+# they are parsed instead of failing on the first film.
+FILM_FIELD_TYPES = {
+    "id": rule_engine.DataType.STRING,
+    "title": rule_engine.DataType.STRING,
+    "description": rule_engine.DataType.STRING,
+    "release_year": rule_engine.DataType.FLOAT,
+    "watched": rule_engine.DataType.BOOLEAN,
+    "version": rule_engine.DataType.FLOAT,
+}
+
+RuleError = rule_engine.EngineError
+
+# String literals, their content is kept as it is by `normalize`.
+_STRING = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """
+    Collapses the runs of whitespace outside the string literals of a rule,
+    rules differing only by their layout share the same text.
+    """
+    parts = _STRING.split(text.strip())
+    # Odd parts are the string literals.
+    return "".join(
+        part if i % 2 else _SPACES.sub(" ", part) for i, part in enumerate(parts)
+    )
+
+
+@lru_cache()
+def film_rule_context() -> rule_engine.Context:
+    return rule_engine.Context(
+        type_resolver=rule_engine.type_resolver_from_dict(FILM_FIELD_TYPES),
+        default_timezone="UTC",
+    )
+
+
+@lru_cache()
+def compiled_rules() -> TTLCache:
+    """
+    Cache of the parsed rules, keyed by their normalized text.
+    """
+    return TTLCache("compiled_rules", maxsize=settings_instance().film_rule_cache_size)
+
+
+def compile_rule(text: str) -> rule_engine.Rule:
+    """
+    Returns the parsed rule of `text`, parsing it once for all the requests
+    using it.
+
+    Raises RuleError if the rule is invalid.
+    """
+    key = normalize(text)
+    cache = compiled_rules()
+    rule = cache.get(key)
+    if rule is None:
+        rule = rule_engine.Rule(key, context=film_rule_context())
+        if cache.maxsize:
+            cache.set(key, rule)
+    return rule
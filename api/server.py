@@ -0,0 +1,340 @@
+"""
+Production server, runs the API in worker processes configured by the
+settings (see the `server_*` settings).
+
+    python main.py
+
+The supervisor process starts the workers, replaces the ones which exit and
+stops them gracefully. The workers run with the settings given to `run`,
+they don't read them from their environment again:
+
+- With `server_reuse_port` every worker listens on its own socket bound with
+  SO_REUSEPORT, the kernel spreads the incoming connections between the
+  workers instead of waking all of them up on a shared socket. The
+  supervisor only binds the address, without listening, to reserve it.
+- A worker exits once it served `server_max_requests` requests, after the
+  requests in progress are done, and is replaced by a new one.
+- SIGTERM and SIGINT drain the workers: they stop accepting connections,
+  close the idle keep-alive ones and finish the requests in progress. The
+  workers still running after `server_graceful_timeout` are killed.
+- SIGHUP replaces the workers one after the other.
+
+The workers are separate processes which share nothing but the address, the
+state kept in memory is kept by each worker:
+
+- `/metrics` reports the metrics of all the workers, they share them
+  through the directory named by `PROMETHEUS_MULTIPROC_DIR`. The
+  supervisor creates and removes one unless the variable is set. The
+  gauges of the workers which exited are left out.
+- `/api/v1/stats/*` report the worker which serves them, a request sees a
+  single worker.
+- The film and JWT caches are filled and invalidated by each worker, with
+  `film_cache_enabled` a film written through a worker is served as it was
+  by the other workers, with its previous ETag, until `film_cache_ttl`
+  expires. A warning is logged when the cache is enabled with more than one
+  worker.
+- The `memory` and `columnar` backends keep the films and the counters of
+  `/api/v1/films/statistics/*` in the process, they always run a single
+  worker.
+
+Refer - https://www.uvicorn.org/deployment/
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import typing
+
+import uvicorn
+from prometheus_client import multiprocess
+
+from api.metrics import MULTIPROCESS_DIR_ENV
+from api.settings import Settings, override_settings, settings_instance
+
+logger = logging.getLogger(__name__)
+
+# The factory of the ASGI application served by the workers.
+APP = "api.api:create_app"
+
+# Backends keeping the films in the process, a worker each would hold a
+# different catalogue.
+IN_PROCESS_BACKENDS = ("memory", "columnar")
+
+# Seconds a worker which exited right after it started waits to be replaced,
+# so that a worker failing at startup isn't restarted in a busy loop.
+RESTART_DELAY = 1.0
+
+
+def worker_count(settings: Settings) -> int:
+    """
+    Returns the number of workers to start.
+    """
+    if settings.film_repository_backend in IN_PROCESS_BACKENDS:
+        if settings.server_workers > 1:
+            logger.warning(
+                "the %s backend runs a single worker",
+                settings.film_repository_backend,
+            )
+        return 1
+    workers = settings.server_workers or os.cpu_count() or 1
+    if workers > 1 and settings.film_cache_enabled:
+        logger.warning(
+            "every worker has its own film cache, a film written through a worker "
+            "can be served as it was by the others for up to %s seconds",
+            settings.film_cache_ttl,
+        )
+    return workers
+
+
+def bind_socket(
+    host: str, port: int, reuse_port: bool, backlog: typing.Optional[int] = None
+) -> socket.socket:
+    """
+    Binds a TCP socket, it listens if a `backlog` is given.
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        if backlog is not None:
+            sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker_config(settings: Settings, max_requests: int) -> uvicorn.Config:
+    return uvicorn.Config(
+        APP,
+        factory=True,
+        loop=settings.server_loop,
+        http=settings.server_http,
+        backlog=settings.server_backlog,
+        timeout_keep_alive=settings.server_keep_alive_timeout,
+        limit_max_requests=max_requests or None,
+        access_log=settings.server_access_log,
+        # The supervisor handles the workers, a worker never reloads.
+        reload=False,
+        workers=1,
+    )
+
+
+class _WorkerServer(uvicorn.Server):
+    """
+    Sets `ready` once the worker accepts connections.
+    """
+
+    def __init__(self, config: uvicorn.Config, ready: typing.Any):
+        super().__init__(config)
+        self._ready = ready
+
+    async def startup(
+        self, sockets: typing.Optional[typing.List[socket.socket]] = None
+    ):
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self._ready.set()
+
+
+def _serve(
+    settings: Settings,
+    port: int,
+    sockets: typing.Optional[typing.List[socket.socket]],
+    max_requests: int,
+    ready: typing.Any,
+):
+    """
+    Runs a worker, in its own process, with the settings of the supervisor.
+    """
+    override_settings(settings)
+    if sockets is None:
+        sockets = [
+            bind_socket(
+                settings.server_host,
+                port,
+                reuse_port=True,
+                backlog=settings.server_backlog,
+            )
+        ]
+    _WorkerServer(worker_config(settings, max_requests), ready).run(sockets=sockets)
+
+
+class Supervisor:
+    """
+    Supervisor starts and replaces the worker processes of the server, see
+    the module documentation.
+    """
+
+    def __init__(self, settings: Settings):
+        self._settings = settings
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: typing.Dict[int, multiprocessing.process.BaseProcess] = {}
+        self._started: typing.Dict[int, float] = {}
+        # The events are kept until the workers exit, the semaphore of an
+        # event is removed when it is collected, maybe before the worker
+        # opened it.
+        self._ready: typing.Dict[int, typing.Any] = {}
+        self._stopping = threading.Event()
+        self._restart = False
+        self._socket: typing.Optional[socket.socket] = None
+        # The directory of the metrics of the workers, if created by the
+        # supervisor.
+        self._metrics_dir: typing.Optional[str] = None
+        self.port = settings.server_port
+
+    def _max_requests(self) -> int:
+        max_requests = self._settings.server_max_requests
+        if max_requests and self._settings.server_max_requests_jitter:
+            max_requests += random.randint(0, self._settings.server_max_requests_jitter)
+        return max_requests
+
+    def _spawn(self) -> typing.Any:
+        """
+        Starts a worker, returns the event it sets once it is ready.
+        """
+        sockets = None if self._settings.server_reuse_port else [self._socket]
+        ready = self._context.Event()
+        process = self._context.Process(
+            target=_serve,
+            args=(self._settings, self.port, sockets, self._max_requests(), ready),
+            name="api-worker",
+        )
+        process.start()
+        self._workers[process.sentinel] = process
+        self._started[process.sentinel] = time.monotonic()
+        self._ready[process.sentinel] = ready
+        return ready
+
+    def _share_metrics(self):
+        """
+        Gives the workers a directory to share their metrics through, before
+        they are started, see `api.metrics`.
+        """
+        if not self._settings.enable_metrics or os.environ.get(MULTIPROCESS_DIR_ENV):
+            return
+        self._metrics_dir = tempfile.mkdtemp(prefix="api-metrics-")
+        os.environ[MULTIPROCESS_DIR_ENV] = self._metrics_dir
+
+    def _unshare_metrics(self):
+        if self._metrics_dir is not None:
+            del os.environ[MULTIPROCESS_DIR_ENV]
+            shutil.rmtree(self._metrics_dir, ignore_errors=True)
+            self._metrics_dir = None
+
+    def _exited(self, process: multiprocessing.process.BaseProcess):
+        """
+        Forgets the live gauges of a worker which exited.
+        """
+        if self._settings.enable_metrics and os.environ.get(MULTIPROCESS_DIR_ENV):
+            multiprocess.mark_process_dead(process.pid)
+
+    def _handle_stop(self, signum: int, frame):
+        self._stopping.set()
+
+    def _handle_restart(self, signum: int, frame):
+        self._restart = True
+
+    def _restart_workers(self):
+        """
+        Replaces the workers one after the other, a worker is only stopped
+        once its replacement runs.
+        """
+        for sentinel in list(self._workers):
+            if self._stopping.is_set():
+                return
+            process = self._workers.pop(sentinel)
+            self._started.pop(sentinel)
+            self._ready.pop(sentinel)
+            replacement = self._spawn()
+            replacement.wait(self._settings.server_graceful_timeout)
+            process.terminate()
+            process.join(self._settings.server_graceful_timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            self._exited(process)
+
+    def _stop(self):
+        for process in self._workers.values():
+            process.terminate()
+        deadline = time.monotonic() + self._settings.server_graceful_timeout
+        for process in self._workers.values():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning("killing worker %d", process.pid)
+                process.kill()
+                process.join()
+
+    def run(self):
+        """
+        Runs the server until it receives SIGTERM or SIGINT.
+        """
+        reuse_port = self._settings.server_reuse_port
+        self._socket = bind_socket(
+            self._settings.server_host,
+            self.port,
+            reuse_port=reuse_port,
+            backlog=None if reuse_port else self._settings.server_backlog,
+        )
+        # Port 0 binds any free port, the workers bind the same.
+        self.port = self._socket.getsockname()[1]
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_restart)
+
+        workers = worker_count(self._settings)
+        logger.info(
+            "starting %d workers on %s:%d",
+            workers,
+            self._settings.server_host,
+            self.port,
+        )
+        self._share_metrics()
+        try:
+            for _ in range(workers):
+                self._spawn()
+            while not self._stopping.is_set():
+                if self._restart:
+                    self._restart = False
+                    self._restart_workers()
+                exited = multiprocessing.connection.wait(list(self._workers), 0.5)
+                for sentinel in exited:
+                    process = self._workers.pop(sentinel)
+                    started = self._started.pop(sentinel)
+                    self._ready.pop(sentinel)
+                    process.join()
+                    self._exited(process)
+                    if self._stopping.is_set():
+                        break
+                    logger.info(
+                        "worker %d exited with %s, starting a new one",
+                        process.pid,
+                        process.exitcode,
+                    )
+                    if time.monotonic() - started < RESTART_DELAY:
+                        if self._stopping.wait(RESTART_DELAY):
+                            break
+                    self._spawn()
+        finally:
+            self._stop()
+            self._socket.close()
+            self._unshare_metrics()
+
+
+def run(settings: typing.Optional[Settings] = None):
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    Supervisor(settings or settings_instance()).run()
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal, Optional
 
 from pydantic import BaseSettings, Field
 
@@ -8,9 +9,273 @@ class Settings(BaseSettings):
     enable_metrics: bool = Field(
         True,
         title="Enable metrics",
-        description="Expose prometheus metrics if set to True. Default: True",
+        description="Expose prometheus metrics if set to True. The server workers "
+        "report the metrics of all of them, see `api.server`. Default: True",
         env="ENABLE_METRICS",
     )
+    # Server Settings, see `api.server`.
+    server_host: str = Field(
+        "127.0.0.1",
+        title="Server host",
+        description="The address the server listens on. Default: 127.0.0.1",
+        env="SERVER_HOST",
+    )
+    server_port: int = Field(
+        8080,
+        title="Server port",
+        description="The port the server listens on. Default: 8080",
+        env="SERVER_PORT",
+    )
+    server_workers: int = Field(
+        0,
+        title="Server workers",
+        description="The number of worker processes serving requests, 0 starts "
+        "one per CPU. The `memory` and `columnar` backends keep the films in "
+        "the process and always run a single worker. The caches and the runtime "
+        "statistics are kept by each worker, see `api.server`. "
+        "Default: 0",
+        env="SERVER_WORKERS",
+    )
+    server_loop: Literal["auto", "asyncio", "uvloop"] = Field(
+        "uvloop",
+        title="Server event loop",
+        description="The event loop of the workers, `auto` uses uvloop if it is "
+        "installed. Default: uvloop",
+        env="SERVER_LOOP",
+    )
+    server_http: Literal["auto", "h11", "httptools"] = Field(
+        "httptools",
+        title="Server HTTP parser",
+        description="The HTTP/1.1 implementation of the workers, `auto` uses "
+        "httptools if it is installed. Default: httptools",
+        env="SERVER_HTTP",
+    )
+    server_reuse_port: bool = Field(
+        True,
+        title="Server SO_REUSEPORT",
+        description="Every worker listens on its own socket bound with "
+        "SO_REUSEPORT and the kernel spreads the connections between them "
+        "if set to True, otherwise the workers accept from a single shared "
+        "socket. Default: True",
+        env="SERVER_REUSE_PORT",
+    )
+    server_backlog: int = Field(
+        2048,
+        title="Server backlog",
+        description="The maximum number of connections waiting to be accepted "
+        "by a worker, capped by net.core.somaxconn. Default: 2048",
+        env="SERVER_BACKLOG",
+    )
+    server_keep_alive_timeout: int = Field(
+        5,
+        title="Server keep-alive timeout",
+        description="The number of seconds an idle HTTP keep-alive connection "
+        "is kept open, it should exceed the idle timeout of a load balancer in "
+        "front of the server. Default: 5",
+        env="SERVER_KEEP_ALIVE_TIMEOUT",
+    )
+    server_graceful_timeout: float = Field(
+        30,
+        title="Server graceful shutdown timeout",
+        description="The number of seconds a stopping worker is given to finish "
+        "the requests in progress before it is killed. Default: 30",
+        env="SERVER_GRACEFUL_TIMEOUT",
+    )
+    server_max_requests: int = Field(
+        0,
+        title="Server max requests",
+        description="The number of requests after which a worker is drained "
+        "and replaced by a new one, 0 never replaces workers. Default: 0",
+        env="SERVER_MAX_REQUESTS",
+    )
+    server_max_requests_jitter: int = Field(
+        0,
+        title="Server max requests jitter",
+        description="A random number of requests up to this one is added to "
+        "the max requests of every worker, so that they aren't all replaced "
+        "at once. Default: 0",
+        env="SERVER_MAX_REQUESTS_JITTER",
+    )
+    server_access_log: bool = Field(
+        False,
+        title="Server access log",
+        description="Log every request if set to True. Default: False",
+        env="SERVER_ACCESS_LOG",
+    )
+    # Compression Settings
+    compression_enabled: bool = Field(
+        True,
+        title="Enable response compression",
+        description="Compress the responses with the best encoding the client "
+        "accepts if set to True. Default: True",
+        env="COMPRESSION_ENABLED",
+    )
+    compression_encodings: str = Field(
+        "zstd,br,gzip",
+        title="Compression encodings",
+        description="Comma separated response encodings by order of preference, "
+        "among zstd, br and gzip. zstd requires the zstandard package and br the "
+        "brotli package, the encodings which aren't available are skipped.",
+        env="COMPRESSION_ENCODINGS",
+    )
+    compression_minimum_size: int = Field(
+        1024,
+        title="Compression minimum size",
+        description="Responses smaller than this number of bytes are sent "
+        "uncompressed, streamed responses are always compressed.",
+        env="COMPRESSION_MINIMUM_SIZE",
+    )
+    compression_cache_max_entries: int = Field(
+        0,
+        title="Compressed bodies cache max entries",
+        description="The maximum number of compressed response bodies kept to "
+        "serve identical responses without compressing them again, 0 disables "
+        "the cache.",
+        env="COMPRESSION_CACHE_MAX_ENTRIES",
+    )
+    compression_cache_max_bytes: int = Field(
+        64 * 1024 * 1024,
+        title="Compressed bodies cache max bytes",
+        description="The maximum number of bytes held by the compressed bodies "
+        "cache, 0 means no limit.",
+        env="COMPRESSION_CACHE_MAX_BYTES",
+    )
+    # Authentication Settings
+    jwt_cache_size: int = Field(
+        10000,
+        title="JWT cache size",
+        description="The maximum number of verified tokens kept in memory, 0 "
+        "disables the cache.",
+        env="JWT_CACHE_SIZE",
+    )
+    jwt_cache_ttl: float = Field(
+        300,
+        title="JWT cache TTL",
+        description="The number of seconds a verified token is cached for. A token "
+        "is never cached past its expiration time.",
+        env="JWT_CACHE_TTL",
+    )
+    # Film cache Settings
+    film_cache_enabled: bool = Field(
+        False,
+        title="Enable film cache",
+        description="Cache film lookups by id and by title in memory if set to "
+        "True. Every server worker has its own cache, a write served by a worker "
+        "leaves the films cached by the others until `film_cache_ttl` expires. "
+        "Default: False",
+        env="FILM_CACHE_ENABLED",
+    )
+    film_cache_max_entries: int = Field(
+        10000,
+        title="Film cache max entries",
+        description="The maximum number of entries of each film cache, 0 means no "
+        "limit.",
+        env="FILM_CACHE_MAX_ENTRIES",
+    )
+    film_cache_max_bytes: int = Field(
+        0,
+        title="Film cache max bytes",
+        description="The maximum number of bytes held by each film cache, 0 means no "
+        "limit.",
+        env="FILM_CACHE_MAX_BYTES",
+    )
+    film_cache_ttl: float = Field(
+        60,
+        title="Film cache TTL",
+        description="The number of seconds a film lookup is cached for.",
+        env="FILM_CACHE_TTL",
+    )
+    # Film repository Settings
+    film_repository_backend: Literal["mongo", "memory", "columnar"] = Field(
+        "mongo",
+        title="Film repository backend",
+        description="Where films are stored, `memory` keeps them in the process "
+        "and loses them on restart. `columnar` keeps them in the process too, "
+        "stored by columns so that filters don't read every film. "
+        "Default: mongo",
+        env="FILM_REPOSITORY_BACKEND",
+    )
+    film_memory_path: str = Field(
+        "",
+        title="Memory backend data directory",
+        description="The directory where the `memory` backend records its "
+        "journal and snapshots, the films are recovered from it at startup. "
+        "Empty keeps the films in memory only.",
+        env="FILM_MEMORY_PATH",
+    )
+    film_journal_fsync: Literal["always", "interval", "never"] = Field(
+        "always",
+        title="Film journal fsync policy",
+        description="`always` returns from a write once its journal record is "
+        "synced to the disk, the writes made meanwhile share the sync. "
+        "`interval` syncs the journal every fsync interval and can lose the "
+        "writes of the last interval. `never` leaves it to the operating "
+        "system. Default: always",
+        env="FILM_JOURNAL_FSYNC",
+    )
+    film_journal_fsync_interval_ms: float = Field(
+        10,
+        title="Film journal fsync interval",
+        description="The number of milliseconds between two writes of the "
+        "journal with the `interval` and `never` policies.",
+        env="FILM_JOURNAL_FSYNC_INTERVAL_MS",
+    )
+    film_snapshot_journal_records: int = Field(
+        1_000_000,
+        title="Film snapshot journal records",
+        description="The number of journal records which triggers a snapshot of "
+        "the films, 0 disables the snapshots.",
+        env="FILM_SNAPSHOT_JOURNAL_RECORDS",
+    )
+    film_single_flight_enabled: bool = Field(
+        True,
+        title="Enable single flight film reads",
+        description="Run identical concurrent film reads once and share their "
+        "result if set to True. Default: True",
+        env="FILM_SINGLE_FLIGHT_ENABLED",
+    )
+    film_coalesce_reads: bool = Field(
+        True,
+        title="Coalesce film reads",
+        description="Merge the lookups of films by id made concurrently into "
+        "batched lookups if set to True. Default: True",
+        env="FILM_COALESCE_READS",
+    )
+    film_coalesce_max_batch_size: int = Field(
+        1000,
+        title="Coalesced film reads max batch size",
+        description="The maximum number of films looked up by a batched lookup.",
+        env="FILM_COALESCE_MAX_BATCH_SIZE",
+    )
+    film_write_batching_enabled: bool = Field(
+        False,
+        title="Batch film writes",
+        description="Group the film creates, updates and deletes made within "
+        "the write batch window into a single bulk write if set to True. Trades "
+        "up to the window of latency for write throughput. Default: False",
+        env="FILM_WRITE_BATCHING_ENABLED",
+    )
+    film_write_batch_window_ms: float = Field(
+        2,
+        title="Film write batch window",
+        description="The number of milliseconds a film write waits for other "
+        "writes to join its batch.",
+        env="FILM_WRITE_BATCH_WINDOW_MS",
+    )
+    film_write_batch_max_size: int = Field(
+        500,
+        title="Film write batch max size",
+        description="The maximum number of film writes of a batch, a full batch "
+        "is written without waiting for the end of its window.",
+        env="FILM_WRITE_BATCH_MAX_SIZE",
+    )
+    film_rule_cache_size: int = Field(
+        1024,
+        title="Film rule cache size",
+        description="The maximum number of parsed film filter rules kept in "
+        "memory, 0 disables the cache.",
+        env="FILM_RULE_CACHE_SIZE",
+    )
     # MongoDB Settings
     mongo_connection_string: str = Field(
         "mongodb://localhost:27017",
@@ -24,6 +289,58 @@ class Settings(BaseSettings):
         description="The database name for the MongoDB Films database.",
         env="MONGODB_DATABASE_NAME",
     )
+    mongo_cursor_batch_size: int = Field(
+        1000,
+        title="MongoDB cursor batch size",
+        description="The number of documents fetched per round trip when streaming "
+        "films from MongoDB.",
+        env="MONGODB_CURSOR_BATCH_SIZE",
+    )
+    mongo_max_pool_size: int = Field(
+        100,
+        title="MongoDB max pool size",
+        description="The maximum number of connections of the connection pool of "
+        "each server, 0 means no limit.",
+        env="MONGODB_MAX_POOL_SIZE",
+    )
+    mongo_min_pool_size: int = Field(
+        0,
+        title="MongoDB min pool size",
+        description="The number of connections the pool of each server keeps "
+        "open, they are opened at startup.",
+        env="MONGODB_MIN_POOL_SIZE",
+    )
+    mongo_max_idle_time_ms: Optional[int] = Field(
+        None,
+        title="MongoDB max idle time",
+        description="The number of milliseconds a connection can stay idle in the "
+        "pool before being closed, unset means no limit.",
+        env="MONGODB_MAX_IDLE_TIME_MS",
+    )
+    mongo_wait_queue_timeout_ms: Optional[int] = Field(
+        None,
+        title="MongoDB wait queue timeout",
+        description="The number of milliseconds an operation waits for a "
+        "connection when the pool is exhausted before failing, unset means no "
+        "limit.",
+        env="MONGODB_WAIT_QUEUE_TIMEOUT_MS",
+    )
+    mongo_compressors: str = Field(
+        "",
+        title="MongoDB compressors",
+        description="Comma separated wire protocol compressors offered to the "
+        "server by order of preference, among zstd, snappy and zlib. zstd "
+        "requires the zstandard package and snappy the python-snappy package. "
+        "Empty disables compression.",
+        env="MONGODB_COMPRESSORS",
+    )
+    mongo_ensure_indexes: bool = Field(
+        True,
+        title="Ensure MongoDB indexes",
+        description="Create the indexes required by the film repository in the "
+        "background from startup if set to True. Default: True",
+        env="MONGODB_ENSURE_INDEXES",
+    )
 
     def __hash__(self) -> int:
         # NOTE - we are having to override `hash` function because `Settings`
@@ -39,3 +356,14 @@ def settings_instance():
     Settings instance to used as a Fast API dependency.
     """
     return Settings()
+
+
+def override_settings(settings: Settings):
+    """
+    Gives the settings instance the values of `settings`, e.g. in the worker
+    processes of the server which run with the settings of the supervisor
+    rather than the ones read from their environment.
+    """
+    instance = settings_instance()
+    for name in settings.__fields__:
+        setattr(instance, name, getattr(settings, name))
@@ -0,0 +1,100 @@
+"""
+Deduplication of identical concurrent calls.
+
+Every group registers itself by name so its statistics can be reported, see
+`groups()`.
+"""
+
+import asyncio
+import typing
+import weakref
+
+T = typing.TypeVar("T")
+
+_registry: "weakref.WeakValueDictionary[str, SingleFlight]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    SingleFlight runs a single call per key at a time, the callers asking for a
+    key while its call is in flight wait for that call and share its result or
+    its exception.
+
+    The call runs in its own task: a caller being cancelled doesn't cancel it
+    as long as other callers wait for it, it is cancelled once its last caller
+    is. Results aren't kept once the call is done, see `TTLCache` for that.
+
+    The group isn't thread safe, it is meant to be used from the event loop.
+
+    Refer - https://pkg.go.dev/golang.org/x/sync/singleflight
+    """
+
+    def __init__(self, name: str):
+        """
+        Parameters
+        ----------
+        name: str
+            The name the group statistics are reported under.
+        """
+        self.name = name
+        self._calls: typing.Dict[typing.Hashable, _Call] = {}
+        self.calls = 0
+        self.executions = 0
+        _registry[name] = self
+
+    async def do(
+        self, key: typing.Hashable, function: typing.Callable[[], typing.Awaitable[T]]
+    ) -> T:
+        """
+        Returns the result of `function()`, or of the call in flight for `key`.
+        """
+        self.calls += 1
+        call = self._calls.get(key)
+        if call is None:
+            self.executions += 1
+            call = self._calls[key] = _Call(asyncio.ensure_future(function()))
+            call.task.add_done_callback(lambda task: self._done(key, call))
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                # The callers coming next start a new call rather than join
+                # the cancelled one, its `_done` callback runs later.
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.task.cancel()
+
+    def _done(self, key: typing.Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            # Marks the exception as retrieved if every caller went away.
+            call.task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "executions": self.executions,
+            "deduplicated": self.calls - self.executions,
+            "in_flight": len(self._calls),
+        }
+
+
+def groups() -> typing.List[SingleFlight]:
+    """
+    Returns the single flight groups alive in this process.
+    """
+    return list(_registry.values())
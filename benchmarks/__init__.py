@@ -0,0 +1,3 @@
+"""
+Performance benchmarks of the project, see `python -m benchmarks --help`.
+"""
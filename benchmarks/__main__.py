@@ -0,0 +1,113 @@
+"""
+Runs the benchmark suites and compares their results between commits.
+
+    python -m benchmarks run --output benchmarks/results/$(git rev-parse --short HEAD).json
+    python -m benchmarks compare benchmarks/results/base.json benchmarks/results/head.json
+
+Suites:
+
+- `repository`: micro-benchmarks of every `FilmRepository` method, for the
+  memory and columnar repositories and for MongoDB when `--mongo` is given.
+- `http`: in process load runs of the API routes.
+- `serialization`: CPU time spent serializing the list endpoints responses.
+- `film_memory`: bytes held by the memory repository per film.
+"""
+
+import argparse
+import os
+import sys
+import typing
+
+from benchmarks import film_memory, http, repository, serialization
+from benchmarks.results import compare, load, print_results, save
+
+SUITES = ["repository", "http", "serialization", "film_memory"]
+
+
+def run(args: argparse.Namespace) -> int:
+    results = []
+    suites = SUITES if "all" in args.suite else args.suite
+    for suite in suites:
+        print(f"# {suite}", file=sys.stderr)
+        if suite == "repository":
+            results += repository.run(args.sizes, args.repeat, args.mongo)
+        elif suite == "http":
+            results += http.run(args.sizes, args.requests, args.concurrency)
+        elif suite == "serialization":
+            results += serialization.run([10, 100, 1000], args.repeat)
+        elif suite == "film_memory":
+            results += film_memory.run([max(args.sizes)])
+    print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        save(results, args.output)
+        print(f"results written to {args.output}", file=sys.stderr)
+    return 0
+
+
+def compare_reports(args: argparse.Namespace) -> int:
+    base, head = load(args.base), load(args.head)
+    rows, regressions = compare(base, head, args.threshold)
+    print(f"base {base['commit']} -> head {head['commit']}")
+    for row in rows:
+        flag = " REGRESSION" if row in regressions else ""
+        print(
+            f"{row['benchmark']:<14} {row['case']:<60} {row['base']:>12.1f} "
+            f"{row['head']:>12.1f} {row['unit']:<6} {row['change']:>+8.1%}{flag}"
+        )
+    return 1 if regressions else 0
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__.splitlines()[1]
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run benchmark suites")
+    run_parser.add_argument(
+        "--suite", nargs="+", choices=SUITES + ["all"], default=["all"]
+    )
+    run_parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="the numbers of films loaded before measuring",
+    )
+    run_parser.add_argument(
+        "--repeat", type=int, default=200, help="timed calls per repository method"
+    )
+    run_parser.add_argument(
+        "--requests", type=int, default=2000, help="requests sent per route"
+    )
+    run_parser.add_argument(
+        "--concurrency", type=int, default=32, help="concurrent HTTP clients"
+    )
+    run_parser.add_argument(
+        "--mongo",
+        default=None,
+        help="MongoDB connection string, e.g. mongodb://localhost:27017",
+    )
+    run_parser.add_argument("--output", help="JSON file the results are written to")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="compare two JSON result files"
+    )
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="relative change above which a case is reported as a regression",
+    )
+    compare_parser.set_defaults(handler=compare_reports)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
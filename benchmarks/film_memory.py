@@ -0,0 +1,71 @@
+"""
+Measures the memory held by `MemoryFilmRepository` per film.
+
+Each size is measured in a fresh process: the resident set size is read
+before and after loading the films, the difference divided by the number of
+films includes the entities, their strings and the repository indexes.
+
+    python -m benchmarks.film_memory --sizes 1000000 10000000
+    python -m benchmarks run --suite film_memory
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import typing
+import uuid
+
+from api.entities.film import Film
+from api.repository.film.memory import MemoryFilmRepository
+from benchmarks.results import print_results, result
+
+# Number of distinct titles, a catalogue has many films sharing a title.
+TITLES = 50000
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(size: int) -> dict:
+    repo = MemoryFilmRepository()
+    titles = [f"My Film {i}" for i in range(TITLES)]
+    before = rss_bytes()
+
+    async def load():
+        for i in range(size):
+            await repo.create(
+                Film(
+                    film_id=str(uuid.uuid4()),
+                    title=titles[i % TITLES],
+                    description=f"The description of the film number {i}.",
+                    release_year=1900 + i % 120,
+                    watched=i % 2 == 0,
+                )
+            )
+
+    asyncio.run(load())
+    used = rss_bytes() - before
+    return result("film_memory", f"{size}/bytes_per_film", used / size, "bytes")
+
+
+def run(sizes: typing.Sequence[int]) -> typing.List[dict]:
+    results = []
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for size in sizes:
+            results.append(pool.apply(measure, (size,)))
+    return results
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000000])
+    args = parser.parse_args(argv)
+
+    print_results(run(args.sizes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+In process load runs against `create_app()`.
+
+Requests go through the whole ASGI application (routing, validation,
+serialization) without a network, a number of concurrent clients send
+requests to each route and the throughput and latency percentiles of every
+route are reported. The films are served by a `MemoryFilmRepository` so the
+numbers measure the application itself.
+"""
+
+import asyncio
+import time
+import typing
+
+import httpx
+
+from api.api import create_app
+from api.handlers.film_v1 import authenticate_jwt, film_repository
+from api.repository.film.memory import MemoryFilmRepository
+from api.settings import settings_instance
+from benchmarks.repository import TITLES, make_film
+from benchmarks.results import percentile, result
+
+
+def _routes(size: int) -> typing.Dict[str, typing.Callable[[int], dict]]:
+    """
+    Route name -> function building the arguments of the i-th request.
+    """
+
+    def film_id(i: int) -> str:
+        return f"film-{(i * 7919) % size:09d}"
+
+    return {
+        "GET /api/v1/films/{film_id}": lambda i: {
+            "method": "GET",
+            "url": f"/api/v1/films/{film_id(i)}",
+        },
+        "GET /api/v1/films/?title": lambda i: {
+            "method": "GET",
+            "url": "/api/v1/films/",
+            "params": {"title": f"My Film {i % TITLES}", "limit": 100},
+        },
+        "GET /api/v1/films/?title ndjson": lambda i: {
+            "method": "GET",
+            "url": "/api/v1/films/",
+            "params": {"title": f"My Film {i % TITLES}", "limit": 100},
+            "headers": {"accept": "application/x-ndjson"},
+        },
+        "GET /api/v1/films/all": lambda i: {
+            "method": "GET",
+            "url": "/api/v1/films/all",
+            "params": {"limit": 100},
+        },
+        "POST /api/v1/films/": lambda i: {
+            "method": "POST",
+            "url": "/api/v1/films/",
+            "json": {
+                "title": "My Film",
+                "description": "My description",
+                "release_year": 2000,
+            },
+        },
+        "PATCH /api/v1/films/{film_id}": lambda i: {
+            "method": "PATCH",
+            "url": f"/api/v1/films/{film_id(i)}",
+            "json": {"watched": i % 2 == 0},
+        },
+    }
+
+
+async def _load(
+    client: httpx.AsyncClient,
+    request: typing.Callable[[int], dict],
+    requests: int,
+    concurrency: int,
+) -> typing.Tuple[float, typing.List[float]]:
+    counter = iter(range(requests))
+    latencies: typing.List[float] = []
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            response = await client.request(**request(i))
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{response.status_code}: {response.text}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+async def _run(size: int, requests: int, concurrency: int) -> typing.List[dict]:
+    settings_instance().enable_metrics = False
+    app = create_app()
+    repo = MemoryFilmRepository()
+    await repo.create_many([make_film(i) for i in range(size)])
+    app.dependency_overrides[film_repository] = lambda: repo
+    app.dependency_overrides[authenticate_jwt] = lambda: None
+
+    results = []
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        for route, request in _routes(size).items():
+            elapsed, latencies = await _load(client, request, requests, concurrency)
+            case = f"{route}/{size}"
+            results.append(
+                result(
+                    "http",
+                    f"{case}/throughput",
+                    len(latencies) / elapsed,
+                    "req/s",
+                    better="higher",
+                )
+            )
+            for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                results.append(
+                    result(
+                        "http",
+                        f"{case}/{name}",
+                        percentile(latencies, fraction) * 1e3,
+                        "ms",
+                    )
+                )
+    return results
+
+
+def run(
+    sizes: typing.Sequence[int], requests: int, concurrency: int
+) -> typing.List[dict]:
+    results = []
+    for size in sizes:
+        results += asyncio.run(_run(size, requests, concurrency))
+    return results
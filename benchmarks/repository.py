@@ -0,0 +1,173 @@
+"""
+Micro-benchmarks of every `FilmRepository` method.
+
+Each repository is loaded with `size` films before its methods are timed,
+`MongoFilmRepository` runs against a local mongod in a throwaway database and
+is skipped if the server can't be reached.
+"""
+
+import asyncio
+import secrets
+import sys
+import time
+import typing
+
+import motor.motor_asyncio
+
+from api.entities.film import Film
+from api.repository.film.abstractions import FilmRepository
+from api.repository.film.columnar import ColumnarFilmRepository
+from api.repository.film.memory import MemoryFilmRepository
+from api.repository.film.mongo import MongoFilmRepository
+from api.rules import compile_rule
+from benchmarks.results import percentile, result
+
+# Number of distinct titles of the benchmark catalogue.
+TITLES = 100
+
+
+def make_film(i: int) -> Film:
+    return Film(
+        film_id=f"film-{i:09d}",
+        title=f"My Film {i % TITLES}",
+        description=f"The description of the film number {i}.",
+        release_year=1900 + i % 120,
+        watched=i % 2 == 0,
+    )
+
+
+async def _time(
+    operation: typing.Callable[[int], typing.Awaitable], repeat: int
+) -> typing.List[float]:
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        await operation(i)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+
+async def _consume(iterator: typing.AsyncIterator) -> int:
+    count = 0
+    async for _ in iterator:
+        count += 1
+    return count
+
+
+def _operations(
+    repo: FilmRepository, size: int
+) -> typing.Dict[str, typing.Callable[[int], typing.Awaitable]]:
+    """
+    The operations timed for a repository loaded with `size` films, the last
+    ones modify the catalogue.
+    """
+
+    def film_id(i: int) -> str:
+        return f"film-{(i * 7919) % size:09d}"
+
+    def title(i: int) -> str:
+        return f"My Film {i % TITLES}"
+
+    return {
+        "get_by_id": lambda i: repo.get_by_id(film_id(i)),
+        "get_by_title": lambda i: repo.get_by_title(title(i), limit=100),
+        "get_by_title_deep_page": lambda i: repo.get_by_title(
+            title(i), skip=size // TITLES // 2, limit=100
+        ),
+        "get_by_title_keyset_page": lambda i: repo.get_by_title(
+            title(i), limit=100, after=film_id(i)
+        ),
+        "get_documents_by_title": lambda i: repo.get_documents_by_title(
+            title(i), limit=100
+        ),
+        "iter_by_title": lambda i: _consume(repo.iter_by_title(title(i), limit=100)),
+        "iter_documents_by_title": lambda i: _consume(
+            repo.iter_documents_by_title(title(i), limit=100)
+        ),
+        "iter_all": lambda i: _consume(repo.iter_all(limit=1000)),
+        "iter_all_documents": lambda i: _consume(repo.iter_all_documents(limit=1000)),
+        "filter": lambda i: _consume(
+            repo.iter_documents_matching(
+                compile_rule(f"release_year >= {1900 + i % 120} and not watched"),
+                limit=100,
+            )
+        ),
+        "count_matching": lambda i: repo.count_matching(
+            compile_rule(f"release_year < {1900 + i % 120} and watched")
+        ),
+        "update": lambda i: repo.update(film_id(i), {"watched": i % 2 == 1}),
+        "create": lambda i: repo.create(make_film(size + i)),
+        "create_many": lambda i: repo.create_many(
+            [make_film(size * 2 + i * 100 + j) for j in range(100)]
+        ),
+        "delete": lambda i: repo.delete(f"film-{size + i:09d}"),
+    }
+
+
+async def benchmark_repository(
+    backend: str, repo: FilmRepository, size: int, repeat: int
+) -> typing.List[dict]:
+    for offset in range(0, size, 1000):
+        await repo.create_many(
+            [make_film(i) for i in range(offset, min(size, offset + 1000))]
+        )
+    results = []
+    for name, operation in _operations(repo, size).items():
+        timings = await _time(operation, repeat)
+        case = f"{backend}/{name}/{size}"
+        mean = sum(timings) / len(timings)
+        results.append(result("repository", f"{case}/mean", mean * 1e6, "us"))
+        results.append(
+            result("repository", f"{case}/p99", percentile(timings, 0.99) * 1e6, "us")
+        )
+    return results
+
+
+async def _mongo_available(connection_string: str) -> bool:
+    client = motor.motor_asyncio.AsyncIOMotorClient(
+        connection_string, serverSelectionTimeoutMS=2000
+    )
+    try:
+        await client.admin.command("ping")
+        return True
+    except Exception:
+        return False
+    finally:
+        client.close()
+
+
+async def _run(
+    sizes: typing.Sequence[int], repeat: int, mongo: typing.Optional[str]
+) -> typing.List[dict]:
+    results = []
+    for size in sizes:
+        results += await benchmark_repository(
+            "memory", MemoryFilmRepository(), size, repeat
+        )
+        results += await benchmark_repository(
+            "columnar", ColumnarFilmRepository(), size, repeat
+        )
+    if mongo is None:
+        return results
+    if not await _mongo_available(mongo):
+        print(
+            f"mongod not reachable at {mongo}, skipping MongoFilmRepository",
+            file=sys.stderr,
+        )
+        return results
+    for size in sizes:
+        database = f"benchmark_{secrets.token_hex(5)}"
+        repo = MongoFilmRepository(connection_string=mongo, database=database)
+        try:
+            await repo.ensure_indexes()
+            results += await benchmark_repository("mongo", repo, size, repeat)
+        finally:
+            # noinspection PyProtectedMember
+            await repo._client.drop_database(database)
+    return results
+
+
+def run(
+    sizes: typing.Sequence[int], repeat: int, mongo: typing.Optional[str]
+) -> typing.List[dict]:
+    return asyncio.run(_run(sizes, repeat, mongo))
@@ -0,0 +1,108 @@
+"""
+Storage and comparison of benchmark results.
+
+A result is a dict with the keys:
+
+- `benchmark`: the suite which produced it.
+- `case`: what has been measured, unique within a suite.
+- `value`: the measurement.
+- `unit`: the unit of `value`.
+- `better`: "lower" or "higher", which direction is an improvement.
+"""
+
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import typing
+
+
+def result(
+    benchmark: str, case: str, value: float, unit: str, better: str = "lower"
+) -> dict:
+    return {
+        "benchmark": benchmark,
+        "case": case,
+        "value": value,
+        "unit": unit,
+        "better": better,
+    }
+
+
+def percentile(values: typing.Sequence[float], fraction: float) -> float:
+    """
+    Returns the nearest rank percentile of sorted `values`.
+    """
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+def print_results(results: typing.List[dict]):
+    for r in results:
+        print(f"{r['benchmark']:<14} {r['case']:<60} {r['value']:>14.1f} {r['unit']}")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save(results: typing.List[dict], path: str):
+    """
+    Writes `results` to `path` along with the environment they were measured in.
+    """
+    report = {
+        "commit": git_revision(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(
+    base: dict, head: dict, threshold: float
+) -> typing.Tuple[typing.List[dict], typing.List[dict]]:
+    """
+    Compares the results of two reports.
+
+    Returns every case measured in both reports, with the relative change of
+    its value, and the cases which got worse by more than `threshold`.
+    """
+    base_results = {(r["benchmark"], r["case"]): r for r in base["results"]}
+    rows, regressions = [], []
+    for head_result in head["results"]:
+        base_result = base_results.get((head_result["benchmark"], head_result["case"]))
+        if base_result is None or not base_result["value"]:
+            continue
+        change = (head_result["value"] - base_result["value"]) / base_result["value"]
+        worse = change if head_result["better"] == "lower" else -change
+        row = {
+            "benchmark": head_result["benchmark"],
+            "case": head_result["case"],
+            "unit": head_result["unit"],
+            "base": base_result["value"],
+            "head": head_result["value"],
+            "change": change,
+        }
+        rows.append(row)
+        if worse > threshold:
+            regressions.append(row)
+    return rows, regressions
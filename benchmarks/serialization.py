@@ -0,0 +1,113 @@
+"""
+Compares the CPU time spent serializing a page of films for the list endpoints.
+
+- `pydantic`: Film entities -> `FilmResponse` models -> response validation and
+  `jsonable_encoder` -> JSON, the path of the list endpoints before the orjson
+  fast path.
+- `orjson_entities`: Film entities -> documents -> orjson, the path of
+  repositories returning entities (memory).
+- `orjson_documents`: projected documents -> orjson, the path of
+  `MongoFilmRepository` which hands out driver documents as they are.
+
+    python -m benchmarks.serialization
+    python -m benchmarks run --suite serialization
+"""
+
+import argparse
+import time
+import typing
+
+import orjson
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from starlette.responses import JSONResponse
+
+from api.dto.film import FilmResponse
+from api.entities.film import Film
+from api.repository.film.abstractions import film_document
+from benchmarks.results import print_results, result
+
+RESPONSE_FIELD = create_response_field(name="films", type_=typing.List[FilmResponse])
+
+
+def make_films(count: int) -> typing.List[Film]:
+    return [
+        Film(
+            film_id=f"00000000-0000-0000-0000-{i:012d}",
+            title=f"My Film {i % 100}",
+            description="A description of a reasonable length for a film.",
+            release_year=1900 + i % 120,
+            watched=i % 2 == 0,
+        )
+        for i in range(count)
+    ]
+
+
+def pydantic_path(films: typing.List[Film]) -> bytes:
+    content = [
+        FilmResponse(
+            id=film.id,
+            title=film.title,
+            description=film.description,
+            release_year=film.release_year,
+            watched=film.watched,
+        )
+        for film in films
+    ]
+    # `serialize_response` never suspends for an `async def` endpoint, drive the
+    # coroutine by hand so no event loop overhead is measured.
+    try:
+        serialize_response(field=RESPONSE_FIELD, response_content=content).send(None)
+    except StopIteration as e:
+        return JSONResponse(e.value).body
+    raise RuntimeError("serialize_response suspended")
+
+
+def orjson_entities_path(films: typing.List[Film]) -> bytes:
+    return orjson.dumps([film_document(film) for film in films])
+
+
+def orjson_documents_path(documents: typing.List[dict]) -> bytes:
+    return orjson.dumps(documents)
+
+
+def cpu_time_per_call(function, argument, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        function(argument)
+    return (time.process_time() - start) / repeat
+
+
+def run(sizes: typing.Sequence[int], repeat: int) -> typing.List[dict]:
+    results = []
+    for size in sizes:
+        films = make_films(size)
+        documents = [film_document(film) for film in films]
+        assert orjson.loads(pydantic_path(films)) == orjson.loads(
+            orjson_documents_path(documents)
+        )
+        timings = {
+            "pydantic": cpu_time_per_call(pydantic_path, films, repeat),
+            "orjson_entities": cpu_time_per_call(orjson_entities_path, films, repeat),
+            "orjson_documents": cpu_time_per_call(
+                orjson_documents_path, documents, repeat
+            ),
+        }
+        for path, seconds in timings.items():
+            results.append(
+                result("serialization", f"{path}/{size}", seconds * 1e6, "us")
+            )
+    return results
+
+
+def main(argv: typing.Optional[typing.Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    print_results(run(args.sizes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
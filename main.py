@@ -1,12 +1,10 @@
-import uvicorn
-
-from api.api import create_app
-
-app = create_app()
+from api.server import run
 
 
 def main():
-    uvicorn.run("main:app", host="127.0.0.1", port=8080, reload=True)
+    # Production server, see `api.server`, the workers create the application.
+    # `make dev` runs the development server which reloads on changes.
+    run()
 
 
 if __name__ == "__main__":